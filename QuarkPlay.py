@@ -21,8 +21,8 @@ a set of coordinates.
 - ???
 - Profit.
 """
-import time, sys, random
-from lib import core, chessboard, engine, movegenerator, pieces, usercontrol
+import time, sys
+from lib import core, chessboard, engine, movegenerator, moves, pieces, usercontrol
 
 # Define globals.
 if len(sys.argv) > 1:
@@ -34,6 +34,8 @@ VERSION = 'alpha 1.00.00'
 if debug: SLEEP_TIME = 0.01
 else: SLEEP_TIME = 1
 USER_OPTIONS = ['hist', 'move', 'exit']
+SEARCH_DEPTH = 6
+THINKING_TIME = 10  # Seconds the computer can think for each move.
 HELPMESSAGE_NOTATION = """
 Each move is written in the following format:
     Symbol + position + movetype + position
@@ -54,6 +56,7 @@ castle queenside use 0-0-0.
 # Initialise the components of the board.
 UI = usercontrol.EngineUI()
 GUI = usercontrol.EngineGUI()
+ENGINE = engine.ChessEngine()
 
 def rest():
     """Pauses a program for the designated time."""
@@ -86,7 +89,7 @@ def letuserpickgametype():
     print "During this alpha you can only play on a normal chess board."
     rest()
     print "Initalising the chessboard..."
-    board = chessboard.ChessBoard
+    board = chessboard.BitBoard
     print "Done!"
     return board
 
@@ -164,30 +167,20 @@ def promptuserforpawnpromotion():
     return None
 
 
-def islegalmove(colour, movetuple, board):
-    """Determine if the move is legal."""
+def findlegalmove(colour, movetuple, board):
+    """Finds the legal move going between the squares of movetuple, asking
+    which piece to promote to if the move is a promotion. Returns None if the
+    move isn't legal."""
     generator = movegenerator.MoveGenerator(board)
     allallowedmoves = generator.generatemovelist(colour)
-    return movetuple in allallowedmoves
+    move = moves.findmove(allallowedmoves, *movetuple)
+    if move is not None and moves.ispromotion(move):
+        move = moves.findmove(
+            allallowedmoves, movetuple[0], movetuple[1],
+            promoteto=promptuserforpawnpromotion())
+    return move
 
 
-def pawnpromotion(movetuple, colour):
-    """Determines if the move was a promotion move."""
-    finalcoord = core.convert(movetuple[1], tocoordinate=True)
-    finalrank = finalcoord[0]
-
-    if colour == 'white' and finalrank == 7: return True
-    elif colour == 'black' and finalrank == 0: return True
-    else: return False
-
-
-def castlingmove(movetuples):
-    """Determine if we have a tuple of tuples or just a simple move."""
-    if isinstance(movetuples[0], tuple) and isinstance(movetuples[1], tuple):
-        return True
-    else:
-        return False
-
 def checkorcheckmatesymbol(colour, board):
     """Determines if the move requires a special symbol."""
     generator = movegenerator.MoveGenerator(board)
@@ -201,13 +194,9 @@ def checkorcheckmatesymbol(colour, board):
     return specialsymbol
 
 
-def makemove(movetuple, board):
+def makemove(move, board):
     """Make the move passed on board."""
-    if isinstance(movetuple[0], tuple) and isinstance(movetuple[1], tuple):
-        board.move(movetuple[0][0], movetuple[0][1], force=True)
-        board.move(movetuple[1][0], movetuple[1][1], force=True)
-    else:
-        board.move(movetuple[0], movetuple[1], force=True)
+    board.makemove(move)
     return None
 
 
@@ -225,8 +214,11 @@ def makebestmove(board):
     """Makes the best move on board."""
     print "\nThe computer is thinking...\n"
     time.sleep(SLEEP_TIME)
-    movelist = movegenerator.MoveGenerator(board).generatemovelist(board.computercolour)
-    makemove(random.choice(movelist), board)
+    result = ENGINE.search(
+        board, board.computercolour, SEARCH_DEPTH,
+        engine.TimeManager(movetime=THINKING_TIME))
+    if result.move is not None:
+        makemove(result.move, board)
     return board
 
 
@@ -305,41 +297,37 @@ def main():
             elif command == 'move':
                 while True:
                     piece, movetuple, movestr = promptuserformove()
-                    if islegalmove(chessboard.playercolour, movetuple, chessboard):
+                    move = findlegalmove(
+                        chessboard.playercolour, movetuple, chessboard)
+                    if move is not None:
                         break
                     else:
                         print "\nThat move is not valid."
                         continue
                 # Make move and add it to the history.
-                makemove(movetuple, board=chessboard)
-                if castlingmove(movetuple):
-                    UI.addmovetohistory(castletuples=movetuple)
+                makemove(move, board=chessboard)
+                if moves.iscastle(move):
+                    UI.addmovetohistory(castlemove=move)
                 else:
-                    # Promote the pawn if required.
-                    if pawnpromotion(movetuple, chessboard.playercolour):
-                        piece = promptuserforpawnpromotion()
-                        initpiece = piece(chessboard.playercolour)
-                        chessboard[movetuple[1]] = initpiece
-                        promotetonotation = initpiece.notationsymbol
-
-                    # Then add the move to history.
                     # REVIEW: Make these few lines neater.
                     specialsym = checkorcheckmatesymbol(
                                     chessboard.playercolour, chessboard)
-                    if pawnpromotion(movetuple, chessboard.playercolour):
-                        specialsym += '=' + promotetonotation
+                    promoteto = moves.promotionpiece(move)
+                    if promoteto is not None:
+                        specialsym += '=' + promoteto('white').notationsymbol
                     UI.addmovetohistory(
                         piece('white').notationsymbol, # HACK.
-                        movetuple[0], movetuple[1],
+                        moves.movestart(move), moves.moveend(move),
+                        capture=moves.iscapture(move),
                         specialsym=specialsym
                     )
                     if specialsym:
                         if specialsym[0] == '#':  # This is checkmate.
                             gameisover = True
-                    # Cleanup.
-                    userturn = False; firstloop = True;
-                    chessboard.enpassantforplayer = None
-                    continue
+                # Cleanup.
+                userturn = False; firstloop = True;
+                chessboard.enpassantforplayer = None
+                continue
             # Quit out of the game.
             elif command == 'exit':
                 resign()
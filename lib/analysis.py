@@ -0,0 +1,261 @@
+# DESCRIPTION: Analyses a file of positions in bulk and writes out the engine's
+# verdict on each.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# The positions are read one line at a time from an EPD or FEN file, shared out
+# to a pool of processes and each result is written as soon as it is ready
+# (so not in the order of the file; the 'number' of each result is its line
+# number). Only a few positions per process are ever in flight at once, so the
+# memory used stays the same however long the file is.
+#
+# A line holds a FEN (the clocks are optional) or an EPD record, which is the
+# first four FEN fields followed by operations such as 'bm e4; id "pos 1";'.
+# The id operation, if there is one, is copied to the result. Blank lines and
+# lines starting with '#' are skipped.
+#
+# Run from the top of the project with:
+#     python -m lib.analysis positions.epd --depth 4 --processes 8
+#     python -m lib.analysis positions.fen --movetime 0.5 --output results.csv
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import argparse, csv, json, multiprocessing, Queue, re, sys, time
+from lib import chessboard, engine, moves
+
+# The fields of each result, in the order of the CSV columns.
+FIELDS = ('number', 'id', 'fen', 'bestmove', 'score', 'depth', 'nodes',
+          'qnodes', 'time', 'error')
+
+# Seconds between checks that the pool processes are alive.
+POLLINTERVAL = 0.1
+
+_EPDID = re.compile(r'\bid\s+"([^"]*)"|\bid\s+([^;\s]+)')
+
+
+def parseline(line):
+    """Splits a line of an EPD or FEN file into (fen, id). The id is None if
+    the line doesn't have one. Returns None for a blank or comment line."""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.split(None, 4)
+    fen = ' '.join(fields[:4])
+    operations = fields[4] if len(fields) > 4 else ''
+    if re.match(r'^\d+\s+\d+\s*$', operations):
+        fen += ' ' + operations  # The move clocks of a FEN.
+        operations = ''
+    match = _EPDID.search(operations)
+    if match is None:
+        return fen, None
+    return fen, match.group(1) if match.group(1) is not None else match.group(2)
+
+def readpositions(lines):
+    """Yields (number, id, fen) for each position of an iterable of lines,
+    numbering them by line from 1."""
+    for number, line in enumerate(lines, 1):
+        parsed = parseline(line)
+        if parsed is not None:
+            yield number, parsed[1], parsed[0]
+
+
+# The engine of each process, kept between positions.
+_searcher = None
+
+
+def _analysisinit(options):
+    """Sets up an analysis process (or the main process if there is no pool)."""
+    global _searcher
+    _searcher = engine.ChessEngine(**options)
+    return None
+
+def _analyseone(task):
+    """Analyses one position, returning its result as a dict. Any error is
+    returned in the result rather than raised, so one bad line doesn't stop
+    the rest (and a pool always gets a result back for every position)."""
+    number, positionid, fen, depth, movetime = task
+    result = dict((field, None) for field in FIELDS)
+    result.update(number=number, id=positionid, fen=fen)
+    starttime = time.time()
+    try:
+        board = chessboard.BitBoard()
+        colour = board.setupfromfen(fen)
+        timemanager = None
+        if movetime is not None:
+            timemanager = engine.TimeManager(movetime=movetime)
+        searchresult = _searcher.search(board, colour, depth, timemanager)
+    except Exception as error:
+        result['error'] = str(error) or error.__class__.__name__
+    else:
+        if searchresult.move is not None:
+            result['bestmove'] = moves.movename(searchresult.move)
+        result.update(score=searchresult.score, depth=searchresult.depth,
+                      nodes=searchresult.nodes, qnodes=searchresult.qnodes)
+    result['time'] = round(time.time() - starttime, 4)
+    return result
+
+def analyse(lines, depth=None, movetime=None, processes=1, inflight=4,
+            options=None):
+    """Analyses every position in the lines of an EPD or FEN file to depth
+    plies or for movetime seconds (or whichever comes first if both are
+    given), yielding the result of each as a dict as soon as it is ready.
+
+    With more than one process the positions are searched by a pool, with at
+    most 'inflight' positions per process read ahead of the results. The
+    options are given to the ChessEngine of each process.
+    """
+    if depth is None and movetime is None:
+        raise ValueError("Give a depth or a move time for the analysis.")
+    if depth is not None and depth < 1:
+        raise ValueError("The search must be at least one ply deep.")
+    options = options or {}
+    if processes > 1:
+        # Bad options would fail in every process of the pool instead, which
+        # would never send back a result.
+        engine.ChessEngine(**options)
+    tasks = ((number, positionid, fen, depth, movetime)
+             for number, positionid, fen in readpositions(lines))
+    return _analyse(tasks, processes, inflight, options)
+
+def _analyse(tasks, processes, inflight, options):
+    """The generator of results for analyse."""
+    if processes <= 1:
+        _analysisinit(options)
+        for task in tasks:
+            yield _analyseone(task)
+        return
+
+    # The pool reads its whole task list straight away, so the tasks are
+    # given to it one at a time to keep only a few read ahead.
+    results = Queue.Queue()
+    pool = multiprocessing.Pool(processes, _analysisinit, (options,))
+    workers = set(process.pid for process in pool._pool)
+    pending = 0
+    try:
+        for task in tasks:
+            while pending >= processes*inflight:
+                yield _nextresult(results, pool, workers)
+                pending -= 1
+            pool.apply_async(_analyseone, (task,), callback=results.put)
+            pending += 1
+        while pending:
+            yield _nextresult(results, pool, workers)
+            pending -= 1
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _nextresult(results, pool, workers):
+    """Waits for the next result from the pool. The pool replaces a process
+    that dies, but not the position it was analysing, so raises an error once
+    the processes aren't the ones it started with."""
+    while True:
+        try:
+            return results.get(timeout=POLLINTERVAL)
+        except Queue.Empty:
+            if set(process.pid for process in pool._pool) != workers:
+                raise RuntimeError("An analysis process died.")
+
+
+class JsonLinesWriter(object):
+    """Writes each result as a line of JSON."""
+
+    def __init__(self, output):
+        self.output = output
+        return None
+
+    def write(self, result):
+        """Writes out one result."""
+        self.output.write(json.dumps(
+            dict((field, result[field]) for field in FIELDS
+                 if result[field] is not None), sort_keys=True) + '\n')
+        self.output.flush()
+        return None
+
+
+class CsvWriter(object):
+    """Writes the results as CSV, one row each under a header row."""
+
+    def __init__(self, output):
+        self.output = output
+        self.writer = csv.DictWriter(output, FIELDS, lineterminator='\n')
+        self.writer.writeheader()
+        return None
+
+    def write(self, result):
+        """Writes out one result."""
+        self.writer.writerow(dict(
+            (field, '' if result[field] is None else result[field])
+            for field in FIELDS))
+        self.output.flush()
+        return None
+
+WRITERS = {'jsonl': JsonLinesWriter, 'csv': CsvWriter}
+
+
+def analysefile(inputfile, output, fileformat='jsonl', **arguments):
+    """Analyses the positions of an open EPD or FEN file, writing the results
+    to output as they finish. The other arguments are those of analyse.
+    Returns the number of positions analysed."""
+    writer = WRITERS[fileformat](output)
+    count = 0
+    for result in analyse(inputfile, **arguments):
+        writer.write(result)
+        count += 1
+    return count
+
+
+ #     #    #    ### #     #
+ ##   ##   # #    #  ##    #
+ # # # #  #   #   #  # #   #
+ #  #  # #     #  #  #  #  #
+ #     # #######  #  #   # #
+ #     # #     #  #  #    ##
+ #     # #     # ### #     #
+
+
+def main(arguments=None):
+    """The command line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Analyses every position of an EPD or FEN file.")
+    parser.add_argument('input', help="the EPD or FEN file ('-' for stdin)")
+    parser.add_argument('--depth', type=int,
+                        help="how many plies deep to search each position")
+    parser.add_argument('--movetime', type=float,
+                        help="how many seconds to search each position")
+    parser.add_argument('--processes', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="how many positions to search at once "
+                             "(default one per core)")
+    parser.add_argument('--hashsize', type=int, default=16,
+                        help="megabytes of transposition table per process")
+    parser.add_argument('--output', default='-',
+                        help="the file to write the results to (default stdout)")
+    parser.add_argument('--format', choices=sorted(WRITERS),
+                        help="how to write the results (default from the "
+                             "output file name, else jsonl)")
+    arguments = parser.parse_args(arguments)
+    if arguments.depth is None and arguments.movetime is None:
+        parser.error("give --depth or --movetime")
+
+    fileformat = arguments.format
+    if fileformat is None:
+        fileformat = 'csv' if arguments.output.endswith('.csv') else 'jsonl'
+    inputfile = sys.stdin if arguments.input == '-' else open(arguments.input)
+    output = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+    try:
+        analysefile(inputfile, output, fileformat, depth=arguments.depth,
+                    movetime=arguments.movetime,
+                    processes=arguments.processes,
+                    options={'hashsize': arguments.hashsize})
+    finally:
+        if inputfile is not sys.stdin: inputfile.close()
+        if output is not sys.stdout: output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
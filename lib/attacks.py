@@ -0,0 +1,250 @@
+# DESCRIPTION: Precomputed tables of where pieces can move from each square.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# Working out a move with vectors means building several objects for every
+# step of every piece, which is far too slow for the inner loops of the move
+# generator. Instead every destination is worked out once, when this module is
+# imported, and the move generator just looks them up by square index.
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import os, random
+from lib import core
+
+# The directions are (rank step, file step), the same as the components of the
+# move unit vectors of the pieces.
+ORTHOGONALS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+DIAGONALS = ((1, 1), (1, -1), (-1, -1), (-1, 1))
+KNIGHTJUMPS = ((2, 1), (1, 2), (2, -1), (1, -2),
+               (-2, -1), (-1, -2), (-2, 1), (-1, 2))
+
+
+def _ray(index, step):
+    """The squares reached by repeatedly taking step from index, in order."""
+    rank_, file_ = index // 8, index % 8
+    squares = list()
+    while True:
+        rank_, file_ = rank_ + step[0], file_ + step[1]
+        if not (0 <= rank_ <= 7 and 0 <= file_ <= 7):
+            return tuple(squares)
+        squares.append(rank_*8 + file_)
+
+def _targets(index, steps):
+    """The squares one step away from index, for each of the steps."""
+    return tuple(ray[0] for ray in (_ray(index, step) for step in steps) if ray)
+
+def _mask(squares):
+    """Turns a list of squares into a bitboard."""
+    bitboard = 0
+    for square in squares:
+        bitboard |= 1 << square
+    return bitboard
+
+
+# RAYS[step][index] is the ordered tuple of squares reached from index by
+# repeating step. Crawling pieces only use the first square of their rays.
+RAYS = dict(
+    (step, tuple(_ray(index, step) for index in range(64)))
+    for step in ORTHOGONALS + DIAGONALS + KNIGHTJUMPS)
+
+KNIGHT_TARGETS = tuple(_targets(index, KNIGHTJUMPS) for index in range(64))
+KING_TARGETS = tuple(
+    _targets(index, ORTHOGONALS + DIAGONALS) for index in range(64))
+
+# PAWN_ATTACKS[colour][index] are the squares a pawn of colour attacks from
+# index. These are also the squares an enemy pawn must be on to attack index.
+PAWN_ATTACKS = {
+    core.COLOURS[0]: tuple(_targets(index, ((1, -1), (1, 1))) for index in range(64)),
+    core.COLOURS[1]: tuple(_targets(index, ((-1, -1), (-1, 1))) for index in range(64))
+}
+
+# The same tables as bitboards.
+KNIGHT_MASKS = tuple(_mask(targets) for targets in KNIGHT_TARGETS)
+KING_MASKS = tuple(_mask(targets) for targets in KING_TARGETS)
+PAWN_MASKS = dict(
+    (colour, tuple(_mask(targets) for targets in PAWN_ATTACKS[colour]))
+    for colour in core.COLOURS)
+
+# FILE_MASKS[file] are the squares of a file. PASSED_MASKS[colour][index] are
+# the squares in front of a pawn of colour on index, on its own file and the
+# files either side: the squares an enemy pawn must be on to stop it.
+FILE_MASKS = tuple(_mask(range(file_, 64, 8)) for file_ in range(8))
+PASSED_MASKS = dict(
+    (colour, tuple(
+        _mask(rank_*8 + file_
+              for rank_ in (range(index // 8 + 1, 8) if colour == core.COLOURS[0]
+                            else range(0, index // 8))
+              for file_ in range(max(index % 8 - 1, 0), min(index % 8 + 2, 8)))
+        for index in range(64)))
+    for colour in core.COLOURS)
+
+
+def _lines():
+    """Builds the BETWEEN and LINE tables for every pair of squares."""
+    between = [[0] * 64 for ii in range(64)]
+    line = [[0] * 64 for ii in range(64)]
+    for index in range(64):
+        for step in ORTHOGONALS + DIAGONALS:
+            backwards = (-step[0], -step[1])
+            fullline = (_mask(RAYS[step][index]) | _mask(RAYS[backwards][index])
+                        | (1 << index))
+            squares = 0
+            for square in RAYS[step][index]:
+                between[index][square] = squares
+                line[index][square] = fullline
+                squares |= 1 << square
+    return (tuple(tuple(row) for row in between),
+            tuple(tuple(row) for row in line))
+
+# BETWEEN[a][b] are the squares strictly between a and b, and LINE[a][b] the
+# whole line (edge to edge) through both, if they share a rank, file or
+# diagonal. Both are 0 if they don't. These are used to find pinned pieces and
+# the squares that block a check.
+BETWEEN, LINE = _lines()
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAGIC BITBOARDS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# The squares a sliding piece attacks depend on which squares along its rays
+# are occupied. Magic bitboards turn the occupied squares that matter into a
+# table index with one multiply and shift: (occupied & mask) * magic >> shift.
+# Finding magic numbers that don't send two different attack sets to the same
+# index is slow in Python (minutes for the rooks), so the numbers are found
+# once with a fixed seed and stored in MAGICS_FILE. The tables themselves are
+# filled in from the numbers when this module is imported.
+
+MASK64 = (1 << 64) - 1
+MAGICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'magics.txt')
+_MAGICSEED = 0x5175617
+
+
+def _slidingattacks(index, occupied, steps):
+    """The slow way to find the squares a slider attacks (its rays up to and
+    including the first occupied square in each direction)."""
+    bitboard = 0
+    for step in steps:
+        for square in RAYS[step][index]:
+            bitboard |= 1 << square
+            if occupied >> square & 1:
+                break
+    return bitboard
+
+def _relevantmask(index, steps):
+    """The squares whose occupancy changes what a slider on index attacks. The
+    last square of each ray never matters since nothing lies beyond it."""
+    return _mask(square for step in steps for square in RAYS[step][index][:-1])
+
+def _subsets(mask):
+    """Yields every subset of the bits of mask (the Carry-Rippler trick)."""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return
+
+def findmagic(index, steps, generator):
+    """Searches for a magic number for a slider on index by trial and error.
+    Random numbers with few set bits make the best candidates."""
+    mask = _relevantmask(index, steps)
+    shift = 64 - core.popcount(mask)
+    occupancies = list(_subsets(mask))
+    references = [_slidingattacks(index, occupied, steps)
+                  for occupied in occupancies]
+    while True:
+        magic = (generator.getrandbits(64) & generator.getrandbits(64)
+                 & generator.getrandbits(64))
+        if core.popcount(((mask * magic) & MASK64) >> 56) < 6:
+            continue  # Can't spread the high bits well enough.
+        table = dict()
+        for occupied, reference in zip(occupancies, references):
+            key = ((occupied * magic) & MASK64) >> shift
+            if table.setdefault(key, reference) != reference:
+                break
+        else:
+            return magic
+
+def findallmagics():
+    """Finds the rook and bishop magic numbers for every square."""
+    generator = random.Random(_MAGICSEED)
+    rookmagics = [findmagic(index, ORTHOGONALS, generator) for index in range(64)]
+    bishopmagics = [findmagic(index, DIAGONALS, generator) for index in range(64)]
+    return rookmagics, bishopmagics
+
+def savemagics(rookmagics, bishopmagics, filename=MAGICS_FILE):
+    """Writes the magic numbers to the cache file, one square per line."""
+    with open(filename, 'w') as cachefile:
+        cachefile.write("# Rook then bishop magic numbers for squares 0 to 63.\n")
+        cachefile.write("# Regenerate with: python -m lib.attacks\n")
+        for magic in rookmagics + bishopmagics:
+            cachefile.write('%016x\n' % magic)
+    return None
+
+def loadmagics(filename=MAGICS_FILE):
+    """Reads the magic numbers from the cache file, or finds (and saves) them
+    if there is no cache file."""
+    try:
+        with open(filename) as cachefile:
+            magics = [int(line, 16) for line in cachefile
+                      if line.strip() and not line.startswith('#')]
+        if len(magics) != 128:
+            raise ValueError("The magics file %r is incomplete." % filename)
+    except IOError:
+        rookmagics, bishopmagics = findallmagics()
+        savemagics(rookmagics, bishopmagics, filename)
+        return rookmagics, bishopmagics
+    return magics[:64], magics[64:]
+
+def _filltables(magics, steps):
+    """Builds the masks, shifts and attack tables for one kind of slider."""
+    masks, shifts, tables = list(), list(), list()
+    for index, magic in enumerate(magics):
+        mask = _relevantmask(index, steps)
+        shift = 64 - core.popcount(mask)
+        table = [0] * (1 << (64 - shift))
+        for occupied in _subsets(mask):
+            key = ((occupied * magic) & MASK64) >> shift
+            attackset = _slidingattacks(index, occupied, steps)
+            if table[key] and table[key] != attackset:
+                raise ValueError("Square %i has a bad magic number." % index)
+            table[key] = attackset
+        masks.append(mask); shifts.append(shift); tables.append(table)
+    return tuple(masks), tuple(shifts), tuple(tables)
+
+
+ROOK_MAGICS, BISHOP_MAGICS = loadmagics()
+ROOK_RELEVANT, ROOK_SHIFTS, ROOK_TABLES = _filltables(ROOK_MAGICS, ORTHOGONALS)
+BISHOP_RELEVANT, BISHOP_SHIFTS, BISHOP_TABLES = _filltables(BISHOP_MAGICS, DIAGONALS)
+
+
+def rookattacks(index, occupied):
+    """The squares a rook on index attacks, given the occupied squares."""
+    return ROOK_TABLES[index][
+        ((occupied & ROOK_RELEVANT[index]) * ROOK_MAGICS[index] & MASK64)
+        >> ROOK_SHIFTS[index]]
+
+def bishopattacks(index, occupied):
+    """The squares a bishop on index attacks, given the occupied squares."""
+    return BISHOP_TABLES[index][
+        ((occupied & BISHOP_RELEVANT[index]) * BISHOP_MAGICS[index] & MASK64)
+        >> BISHOP_SHIFTS[index]]
+
+def queenattacks(index, occupied):
+    """The squares a queen on index attacks, given the occupied squares."""
+    return rookattacks(index, occupied) | bishopattacks(index, occupied)
+
+def pawnattacks(pawns, colour):
+    """The squares attacked by all the pawns of colour on the bitboard pawns
+    at once. The pawns on the edge files only attack inwards."""
+    if colour == core.COLOURS[0]:
+        return (((pawns & ~FILE_MASKS[0]) << 7)
+                | ((pawns & ~FILE_MASKS[7]) << 9)) & MASK64
+    return ((pawns & ~FILE_MASKS[0]) >> 9) | ((pawns & ~FILE_MASKS[7]) >> 7)
+
+
+if __name__ == '__main__':
+    # Find the magic numbers again and rewrite the cache file.
+    savemagics(*findallmagics())
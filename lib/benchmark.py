@@ -0,0 +1,104 @@
+# DESCRIPTION: Compares the size of the search with each of its pruning and
+# ordering features turned off, to check each one pays its way.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# Every position is searched to the same depth once with the engine as it is
+# and once more with each feature turned off. The node counts (quiescence nodes
+# included) are compared: the delta is how many more nodes the search needs
+# without the feature, so a positive delta means the feature saves work.
+# Lazy evaluation saves time rather than nodes, so look at its seconds.
+#
+# Run from the top of the project with:
+#     python -m lib.benchmark --depth 4
+#     python -m lib.benchmark --depth 5 --position kiwipete --features pvs lmr
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import argparse, sys, time
+from lib import engine, perft
+
+# The engine options that turn each feature off.
+FEATURES = (
+    ('nullmove', {'nullmove': False}),
+    ('lmr', {'lmr': False}),
+    ('pvs', {'pvs': False}),
+    ('aspiration', {'aspirationwindow': None}),
+    ('lazyeval', {'lazymargin': None}),
+)
+
+
+def searchnodes(fen, depth, options=None, hashsize=16):
+    """Searches fen to depth with a new engine made with options. Returns the
+    result, the nodes searched (quiescence nodes included) and the seconds."""
+    board, colour = perft.setupposition(fen)
+    chessengine = engine.ChessEngine(hashsize=hashsize, **(options or {}))
+    starttime = time.time()
+    result = chessengine.search(board, colour, depth)
+    return result, result.nodes + result.qnodes, time.time() - starttime
+
+def compare(depth, positions=perft.POSITIONS, features=FEATURES,
+            output=sys.stdout):
+    """Searches each position with every feature and then without each one.
+    Returns a dict of the total node delta of each feature (positive if the
+    feature saves nodes)."""
+    totals = dict((name, 0) for name, options in features)
+    for positionname, fen, counts in positions:
+        result, basenodes, seconds = searchnodes(fen, depth)
+        output.write('%-10s depth %i: %9i nodes %8.2fs (all features on)\n' % (
+            positionname, depth, basenodes, seconds))
+        for name, options in features:
+            result, nodes, seconds = searchnodes(fen, depth, options)
+            delta = nodes - basenodes
+            totals[name] += delta
+            output.write('    without %-11s %9i nodes %8.2fs  delta %+9i '
+                         '(%+.1f%%)\n' % (name, nodes, seconds, delta,
+                                          100.0*delta / basenodes))
+    output.write('Total node deltas: %s\n' % ', '.join(
+        '%s %+i' % (name, totals[name]) for name, options in features))
+    return totals
+
+
+ #     #    #    ### #     #
+ ##   ##   # #    #  ##    #
+ # # # #  #   #   #  # #   #
+ #  #  # #     #  #  #  #  #
+ #     # #######  #  #   # #
+ #     # #     #  #  #    ##
+ #     # #     # ### #     #
+
+
+def main(arguments=None):
+    """The command line entry point."""
+    featurenames = [name for name, options in FEATURES]
+    parser = argparse.ArgumentParser(
+        description="Compares the nodes searched with each feature turned off.")
+    parser.add_argument('--depth', type=int, default=4,
+                        help="how many plies deep to search (default 4)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--fen', help="the position to search")
+    source.add_argument('--position',
+                        choices=[name for name, fen, counts in perft.POSITIONS],
+                        help="a reference position to search (default all)")
+    parser.add_argument('--features', nargs='+', choices=featurenames,
+                        default=featurenames, help="the features to compare")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.fen:
+        positions = [('fen', arguments.fen, ())]
+    elif arguments.position:
+        positions = [position for position in perft.POSITIONS
+                     if position[0] == arguments.position]
+    else:
+        positions = perft.POSITIONS
+    features = [feature for feature in FEATURES
+                if feature[0] in arguments.features]
+    compare(arguments.depth, positions, features)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,17 +5,91 @@
 # 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
 # 7369626c65207461736b732e
 
-# IDEA: Make a method that iterates over occupied squares only.
-
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-from lib import core, vectors, pieces
+import random
+from lib import core, moves, pieces, piecesquare
 from copy import deepcopy
 
+# The piece types in the order used to index the bitboards. White pieces take
+# the indices 0 to 5 while black pieces take 6 to 11.
+PIECETYPES = (
+    pieces.PawnPiece, pieces.KnightPiece, pieces.BishopPiece,
+    pieces.RookPiece, pieces.QueenPiece, pieces.KingPiece
+)
+_TYPEINDEX = dict((piecetype, ii) for ii, piecetype in enumerate(PIECETYPES))
+_COLOURINDEX = {core.COLOURS[0]: 0, core.COLOURS[1]: 1}
+
+# Castling rights are stored as bit flags, with "left" being the castle towards
+# the a-file rook and "right" the castle towards the h-file rook.
+CASTLE_WHITE_LEFT, CASTLE_WHITE_RIGHT = 1, 2
+CASTLE_BLACK_LEFT, CASTLE_BLACK_RIGHT = 4, 8
+CASTLE_ALL = 15
+CASTLINGRIGHTS = {
+    core.COLOURS[0]: (CASTLE_WHITE_LEFT, CASTLE_WHITE_RIGHT),
+    core.COLOURS[1]: (CASTLE_BLACK_LEFT, CASTLE_BLACK_RIGHT)
+}
+
+# The rights that survive a move touching each square. Moving the king or a
+# rook off its starting square (or capturing that rook) loses the right.
+_CASTLEMASK = [CASTLE_ALL] * 64
+_CASTLEMASK[0] = CASTLE_ALL ^ CASTLE_WHITE_LEFT
+_CASTLEMASK[4] = CASTLE_ALL ^ (CASTLE_WHITE_LEFT | CASTLE_WHITE_RIGHT)
+_CASTLEMASK[7] = CASTLE_ALL ^ CASTLE_WHITE_RIGHT
+_CASTLEMASK[56] = CASTLE_ALL ^ CASTLE_BLACK_LEFT
+_CASTLEMASK[60] = CASTLE_ALL ^ (CASTLE_BLACK_LEFT | CASTLE_BLACK_RIGHT)
+_CASTLEMASK[63] = CASTLE_ALL ^ CASTLE_BLACK_RIGHT
+
+# The random numbers used to build the Zobrist key of a position. A fixed seed
+# is used so that keys are the same between runs of the engine. The board key
+# doesn't include whose turn it is; XOR in ZOBRIST_SIDE when black is to move.
+_zobristgenerator = random.Random(0x5175617)
+_ZOBRIST_PIECES = [[_zobristgenerator.getrandbits(64) for ii in range(64)]
+                   for jj in range(12)]
+_ZOBRIST_CASTLING = [_zobristgenerator.getrandbits(64) for ii in range(16)]
+_ZOBRIST_ENPASSANT = [_zobristgenerator.getrandbits(64) for ii in range(8)]
+ZOBRIST_SIDE = _zobristgenerator.getrandbits(64)
+del _zobristgenerator
+_PAWNKINDS = (0, 6)  # The white and black pawns, as kinds of piece.
+
+# The material value and game phase weight of each of the twelve kinds of
+# piece. The material is negative for black so the board's totals are from
+# white's side.
+_MATERIAL = tuple(
+    sign*piecesquare.PIECEVALUES[piecetype]
+    for sign in (1, -1) for piecetype in PIECETYPES)
+_PHASE = tuple(
+    piecesquare.PHASEWEIGHTS[piecetype] for piecetype in PIECETYPES) * 2
+
 
-class _ChessBoardCore:
+def boardtables(tables):
+    """Turns piece-square tables (as read by piecesquare.readtables) into the
+    (middlegame, endgame) values of each kind of piece on each square index,
+    negative for black."""
+    return tuple(
+        tuple(tuple(sign*value for value in piecesquare.squarevalues(
+            tables[piecetype, stage], colour))
+              for sign, colour in zip((1, -1), core.COLOURS)
+              for piecetype in PIECETYPES)
+        for stage in (piecesquare.MIDDLEGAME, piecesquare.ENDGAME))
+
+_PIECESQUARE = boardtables(piecesquare.TABLES)
+
+# The FEN string of the normal starting position, and the letters used for the
+# pieces in FEN strings (upper case for white).
+STARTFEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+_FENPIECES = dict(zip('PNBRQK', PIECETYPES))
+_FENCASTLING = {'Q': CASTLE_WHITE_LEFT, 'K': CASTLE_WHITE_RIGHT,
+                'q': CASTLE_BLACK_LEFT, 'k': CASTLE_BLACK_RIGHT}
+
+
+class _ChessBoardCore(object):
     """Contains the core methods, plus the __init__ method."""
 
+    # The (middlegame, endgame) piece-square values the board is scored by,
+    # shared by every board unless it is given its own with usetables.
+    piecesquaretables = _PIECESQUARE
+
     def __init__(self):
         """Initialises the board."""
         self._board = [None] * 64
@@ -23,10 +97,19 @@ class _ChessBoardCore:
         self.playercolour, self.computercolour = self._colours
 
         # Define initial states
-        self.cancastleleft = True
-        self.cancastleright = True
-        self.enpassantforplayer = None
-        self.enpassantforcomputer = None
+        self.key = _ZOBRIST_CASTLING[CASTLE_ALL]
+        self.pawnkey = 0  # The key of the pawns alone (see computepawnkey).
+        self._castlingrights = CASTLE_ALL
+        self._enpassantforplayer = None
+        self._enpassantforcomputer = None
+        self._history = list()  # The undo records of the moves made.
+
+        # The evaluation totals, kept up to date as pieces come and go.
+        self.piececounts = [0] * 12
+        self.material = 0
+        self.middlegame = 0  # The piece-square totals of each stage.
+        self.endgame = 0
+        self.phase = 0
 
     def __getitem__(self, pos):
         """Controls calling the piece at a position on the board like a list."""
@@ -49,7 +132,10 @@ class _ChessBoardCore:
             if piece != None:
                 assert isinstance(piece, pieces.BasePiece), errormsg
             position = core.convert(pos, toindex=True)
-            self._board[position] = piece
+            if self._board[position] != None:
+                self._removepiece(position)
+            if piece != None:
+                self._putpiece(position, piece)
         except AssertionError:
             raise TypeError(errormsg)
         except IndexError:
@@ -80,6 +166,132 @@ class _ChessBoardCore:
             if other == None: return True
             else: raise TypeError("Other must be chessboard.")
 
+    @property
+    def castlingrights(self):
+        """The castling rights still held, as CASTLE_* bit flags."""
+        return self._castlingrights
+
+    @castlingrights.setter
+    def castlingrights(self, rights):
+        self.key ^= (_ZOBRIST_CASTLING[self._castlingrights]
+                     ^ _ZOBRIST_CASTLING[rights])
+        self._castlingrights = rights
+
+    @property
+    def enpassantforplayer(self):
+        """The file the player can capture en passant on, if any."""
+        return self._enpassantforplayer
+
+    @enpassantforplayer.setter
+    def enpassantforplayer(self, whichfile):
+        if self._enpassantforplayer is not None:
+            self.key ^= _ZOBRIST_ENPASSANT[self._enpassantforplayer]
+        if whichfile is not None:
+            self.key ^= _ZOBRIST_ENPASSANT[whichfile]
+        self._enpassantforplayer = whichfile
+
+    @property
+    def enpassantforcomputer(self):
+        """The file the computer can capture en passant on, if any."""
+        return self._enpassantforcomputer
+
+    @enpassantforcomputer.setter
+    def enpassantforcomputer(self, whichfile):
+        if self._enpassantforcomputer is not None:
+            self.key ^= _ZOBRIST_ENPASSANT[self._enpassantforcomputer]
+        if whichfile is not None:
+            self.key ^= _ZOBRIST_ENPASSANT[whichfile]
+        self._enpassantforcomputer = whichfile
+
+    def _putpiece(self, index, piece):
+        """Places piece on the empty square at index. Every change to the board
+        goes through this method and _removepiece so that any other state kept
+        about the board (like the key and evaluation totals) can be updated
+        alongside it."""
+        self._board[index] = piece
+        kind = 6*_COLOURINDEX[piece.colour] + _TYPEINDEX[piece.__class__]
+        self.key ^= _ZOBRIST_PIECES[kind][index]
+        if kind in _PAWNKINDS:
+            self.pawnkey ^= _ZOBRIST_PIECES[kind][index]
+        self.piececounts[kind] += 1
+        self.material += _MATERIAL[kind]
+        self.phase += _PHASE[kind]
+        middlegame, endgame = self.piecesquaretables
+        self.middlegame += middlegame[kind][index]
+        self.endgame += endgame[kind][index]
+        return None
+
+    def _removepiece(self, index):
+        """Takes the piece off the square at index and returns it."""
+        piece = self._board[index]
+        self._board[index] = None
+        kind = 6*_COLOURINDEX[piece.colour] + _TYPEINDEX[piece.__class__]
+        self.key ^= _ZOBRIST_PIECES[kind][index]
+        if kind in _PAWNKINDS:
+            self.pawnkey ^= _ZOBRIST_PIECES[kind][index]
+        self.piececounts[kind] -= 1
+        self.material -= _MATERIAL[kind]
+        self.phase -= _PHASE[kind]
+        middlegame, endgame = self.piecesquaretables
+        self.middlegame -= middlegame[kind][index]
+        self.endgame -= endgame[kind][index]
+        return piece
+
+    def computekey(self):
+        """Works out the Zobrist key of the board from scratch. The board keeps
+        its key attribute up to date as it changes, so this is only needed to
+        check that the two agree."""
+        key = _ZOBRIST_CASTLING[self._castlingrights]
+        for index, square in enumerate(self._board):
+            if square is not None:
+                key ^= _ZOBRIST_PIECES[
+                    6*_COLOURINDEX[square.colour] + _TYPEINDEX[square.__class__]][index]
+        for whichfile in (self._enpassantforplayer, self._enpassantforcomputer):
+            if whichfile is not None:
+                key ^= _ZOBRIST_ENPASSANT[whichfile]
+        return key
+
+    @property
+    def piecesquare(self):
+        """The piece-square score, the middlegame and endgame totals blended by
+        the game phase."""
+        return piecesquare.taper(self.middlegame, self.endgame, self.phase)
+
+    def usetables(self, tables):
+        """Scores the pieces by other piece-square tables (as read by
+        piecesquare.readtables or loadtables) from now on."""
+        self.piecesquaretables = boardtables(tables)
+        (self.piececounts, self.material, self.middlegame, self.endgame,
+         self.phase) = self.computeevaluationtotals()
+        return None
+
+    def computepawnkey(self):
+        """Works out the pawn key from scratch: the Zobrist key of the pawns
+        alone, which only changes when a pawn moves, is taken or promotes. It
+        indexes the pawn hash table of the evaluation."""
+        pawnkey = 0
+        for index, square in enumerate(self._board):
+            if square is not None:
+                kind = 6*_COLOURINDEX[square.colour] + _TYPEINDEX[square.__class__]
+                if kind in _PAWNKINDS:
+                    pawnkey ^= _ZOBRIST_PIECES[kind][index]
+        return pawnkey
+
+    def computeevaluationtotals(self):
+        """Works out (piececounts, material, middlegame, endgame, phase) from
+        scratch, to check the totals the board keeps up to date as it changes."""
+        piececounts, material, middlegame, endgame, phase = [0] * 12, 0, 0, 0, 0
+        middlegametable, endgametable = self.piecesquaretables
+        for index, square in enumerate(self._board):
+            if square is not None:
+                kind = 6*_COLOURINDEX[square.colour] + _TYPEINDEX[square.__class__]
+                piececounts[kind] += 1
+                material += _MATERIAL[kind]
+                middlegame += middlegametable[kind][index]
+                endgame += endgametable[kind][index]
+                phase += _PHASE[kind]
+        return piececounts, material, middlegame, endgame, phase
+
     def duplicateboard(self):
         """Creates an instance of the chess board exactly as it is now."""
         return deepcopy(self)
@@ -95,6 +307,22 @@ class _ChessBoardCore:
                 piecepositions.append(ii)
         return piecepositions
 
+    def occupiedsquares(self, colour=None):
+        """Finds the squares that have a piece on them, optionally only the
+        squares holding the pieces of one side."""
+        return [ii for ii, square in enumerate(self._board)
+                if square is not None
+                and (colour is None or square.colour == colour)]
+
+    def cancastle(self, colour):
+        """Returns if colour still has the right to castle (left, right)."""
+        try:
+            leftright, rightright = CASTLINGRIGHTS[colour]
+        except KeyError:
+            raise core.ColourError()
+        return (bool(self.castlingrights & leftright),
+                bool(self.castlingrights & rightright))
+
     def setplayercolour(self, colour):
         """Assigns a colour to the player."""
         try:
@@ -119,7 +347,9 @@ class ChessBoard(_ChessBoardCore):
 
     This class creates a chessboard, much like you have a physical board when
     you play chess. It is a pretty dumb class however; it doesn't have many
-    checks in place for moves and it can't do anything special like make moves.
+    checks in place for moves. It can play (and take back) a move by the rules
+    with makemove and unmakemove, but it is up to the move generator to decide
+    what moves are allowed.
     """
 
     def setupnormalboard(self):
@@ -132,17 +362,74 @@ class ChessBoard(_ChessBoardCore):
 
         # Add the white pieces.
         for index in range(0, 7+1):
-            self._board[index] = backline[index](colour='white')
+            self._putpiece(index, backline[index](colour='white'))
         for index in range(8, 15+1):
-            self._board[index] = pieces.PawnPiece(colour='white')
+            self._putpiece(index, pieces.PawnPiece(colour='white'))
 
         # Add the black pieces.
         for index in range(48,55+1):
-            self._board[index] = pieces.PawnPiece(colour='black')
+            self._putpiece(index, pieces.PawnPiece(colour='black'))
         for index in range(56, 63+1):
-            self._board[index] = backline[index-56](colour='black')
+            self._putpiece(index, backline[index-56](colour='black'))
         return None
 
+    def setupfromfen(self, fen):
+        """Sets up the position described by a FEN string, replacing whatever
+        is on the board. Returns the colour whose turn it is. The move clocks
+        are optional and ignored."""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise core.FenError("%r doesn't have four fields." % fen)
+        placement, tomove, castling, enpassant = fields[:4]
+        ranks = placement.split('/')
+        if len(ranks) != 8:
+            raise core.FenError("%r doesn't have eight ranks." % placement)
+        if tomove not in ('w', 'b'):
+            raise core.FenError("%r isn't a side to move." % tomove)
+
+        # Clear the board and the move history.
+        for index in self.occupiedsquares():
+            self._removepiece(index)
+        self._history = list()
+
+        for rankindex, rankstring in enumerate(reversed(ranks)):
+            file_ = 0
+            for symbol in rankstring:
+                if symbol.isdigit():
+                    file_ += int(symbol)
+                    continue
+                try:
+                    piecetype = _FENPIECES[symbol.upper()]
+                except KeyError:
+                    raise core.FenError("%r isn't a piece." % symbol)
+                if file_ > 7:
+                    raise core.FenError(
+                        "%r is more than eight squares long." % rankstring)
+                colour = core.COLOURS[0] if symbol.isupper() else core.COLOURS[1]
+                self._putpiece(rankindex*8 + file_, piecetype(colour))
+                file_ += 1
+            if file_ != 8:
+                raise core.FenError("%r isn't eight squares long." % rankstring)
+
+        rights = 0
+        if castling != '-':
+            for symbol in castling:
+                try:
+                    rights |= _FENCASTLING[symbol]
+                except KeyError:
+                    raise core.FenError("%r isn't a castling right." % symbol)
+        self.castlingrights = rights
+
+        colour = core.COLOURS[0] if tomove == 'w' else core.COLOURS[1]
+        self.enpassantforplayer = None
+        self.enpassantforcomputer = None
+        if enpassant != '-':
+            try:
+                self.setenpassantfor(colour, core.squareindex(enpassant) % 8)
+            except ValueError:
+                raise core.FenError("%r isn't a square." % enpassant)
+        return colour
+
     def setenpassantfor(self, colour, whichfile):
         """Sets enpassant for a colour"""
         if colour not in core.COLOURS:
@@ -177,8 +464,91 @@ class ChessBoard(_ChessBoardCore):
                 start.coordinate[1])
 
         # Finally alter the board state.
-        self._board[end.index] = self._board[start.index]
-        self._board[start.index] = None
+        piece = self._removepiece(start.index)
+        if self._board[end.index] != None:
+            self._removepiece(end.index)
+        self._putpiece(end.index, piece)
+        return None
+
+    def makemove(self, move):
+        """Plays a move, remembering how to take it back with unmakemove.
+
+        Unlike move, this method plays the whole move by the rules, as given
+        by the flags of the move (see the moves module): the rook is moved when
+        castling, the pawn is taken during en passant, pawns are promoted and
+        the castling and en passant states are updated. The undo record kept
+        is small (the pieces moved and captured and the old states) so a move
+        can be made and unmade without copying the board.
+        """
+        start, end, flags = move & 63, (move >> 6) & 63, move >> 12
+        piece = self._board[start]
+        if piece is None:
+            raise core.IllegalMoveError("There is no piece at %s" % start)
+
+        capturedat = end
+        if flags == moves.ENPASSANT:
+            capturedat = (start & ~7) | (end & 7)
+        captured = self._board[capturedat]
+
+        self._history.append((
+            move, piece, captured, capturedat, self.key,
+            self._castlingrights, self._enpassantforplayer,
+            self._enpassantforcomputer))
+
+        # Move the pieces.
+        self._removepiece(start)
+        if captured is not None:
+            self._removepiece(capturedat)
+        if flags & moves.PROMOTION:
+            self._putpiece(end, moves.PROMOTIONPIECES[flags & 3](piece.colour))
+        else:
+            self._putpiece(end, piece)
+        if flags == moves.CASTLERIGHT or flags == moves.CASTLELEFT:
+            rookstart, rookend = moves.castlingrook(move)
+            self._putpiece(rookend, self._removepiece(rookstart))
+
+        # Update the states of the board.
+        self.castlingrights &= _CASTLEMASK[start] & _CASTLEMASK[end]
+        self.enpassantforplayer = None
+        self.enpassantforcomputer = None
+        if flags == moves.DOUBLEPUSH:
+            self.setenpassantfor(
+                core.oppositecolour(piece.colour), start & 7)
+        return None
+
+    def makenullmove(self):
+        """Passes the turn without moving a piece (which the search uses to
+        see how strong a position is). Only the en passant state changes; the
+        side to move is kept by the caller. Take it back with unmakemove."""
+        self._history.append((
+            moves.NOMOVE, None, None, None, self.key,
+            self._castlingrights, self._enpassantforplayer,
+            self._enpassantforcomputer))
+        self.enpassantforplayer = None
+        self.enpassantforcomputer = None
+        return None
+
+    def unmakemove(self):
+        """Takes back the last move played by makemove (or makenullmove)."""
+        try:
+            (move, piece, captured, capturedat, key,
+             self._castlingrights, self._enpassantforplayer,
+             self._enpassantforcomputer) = self._history.pop()
+        except IndexError:
+            raise core.IllegalMoveError("There is no move to take back.")
+        if piece is None:  # A null move.
+            self.key = key
+            return None
+
+        start, end, flags = move & 63, (move >> 6) & 63, move >> 12
+        self._removepiece(end)
+        self._putpiece(start, piece)
+        if captured is not None:
+            self._putpiece(capturedat, captured)
+        if flags == moves.CASTLERIGHT or flags == moves.CASTLELEFT:
+            rookstart, rookend = moves.castlingrook(move)
+            self._putpiece(rookstart, self._removepiece(rookend))
+        self.key = key
         return None
 
     def promotepawn(self, pos, promoteto):
@@ -186,8 +556,108 @@ class ChessBoard(_ChessBoardCore):
         position = core.Position(pos)
         pawnpiece = self._board[position.index]
         if pawnpiece == None:
-            raise IndexError("There is no piece at %i" % pos.index)
+            raise IndexError("There is no piece at %i" % position.index)
         else:
             colour = pawnpiece.colour
-            self._board[position] = promoteto(colour)
+            self._removepiece(position.index)
+            self._putpiece(position.index, promoteto(colour))
+        return None
+
+
+class BitBoard(ChessBoard):
+    """A chessboard that also stores the position as bitboards.
+
+    Alongside the 64 squares of the normal board, this class keeps a 64-bit
+    integer for each of the twelve kinds of piece (bit n is set if the piece is
+    on square n) plus occupancy masks for each side and the whole board. These
+    are kept up to date by every change made to the board so that the rest of
+    the engine can count and find pieces with bit operations rather than by
+    scanning all 64 squares.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :pieceboards:  The twelve piece bitboards, indexed as in PIECETYPES with
+                   black's pieces offset by six.
+    :colourboards: The occupancy of white and black, in that order.
+    :occupied:     The occupancy of the whole board.
+    """
+
+    def __init__(self):
+        ChessBoard.__init__(self)
+        self.pieceboards = [0] * 12
+        self.colourboards = [0, 0]
+        self.occupied = 0
         return None
+
+    @classmethod
+    def fromboard(cls, board):
+        """Creates a bitboard with the same position and state as board."""
+        newboard = cls()
+        if board.piecesquaretables is not newboard.piecesquaretables:
+            newboard.piecesquaretables = board.piecesquaretables
+        for index, square in enumerate(board):
+            if square is not None:
+                newboard._putpiece(index, square)
+        newboard.playercolour = board.playercolour
+        newboard.computercolour = board.computercolour
+        newboard.castlingrights = board.castlingrights
+        newboard.enpassantforplayer = board.enpassantforplayer
+        newboard.enpassantforcomputer = board.enpassantforcomputer
+        return newboard
+
+    def _putpiece(self, index, piece):
+        """Places piece on the empty square at index."""
+        ChessBoard._putpiece(self, index, piece)
+        colourindex = _COLOURINDEX[piece.colour]
+        bit = 1 << index
+        self.pieceboards[6*colourindex + _TYPEINDEX[piece.__class__]] |= bit
+        self.colourboards[colourindex] |= bit
+        self.occupied |= bit
+        return None
+
+    def _removepiece(self, index):
+        """Takes the piece off the square at index and returns it."""
+        piece = ChessBoard._removepiece(self, index)
+        colourindex = _COLOURINDEX[piece.colour]
+        bit = ~(1 << index)
+        self.pieceboards[6*colourindex + _TYPEINDEX[piece.__class__]] &= bit
+        self.colourboards[colourindex] &= bit
+        self.occupied &= bit
+        return piece
+
+    def pieceboard(self, piecetype, colour):
+        """Returns the bitboard of one side's pieces of piecetype."""
+        try:
+            return self.pieceboards[6*_COLOURINDEX[colour] + _TYPEINDEX[piecetype]]
+        except KeyError:
+            if colour not in _COLOURINDEX: raise core.ColourError()
+            else: raise core.UnknownPieceError()
+
+    def colourboard(self, colour):
+        """Returns the bitboard of all of one side's pieces."""
+        try:
+            return self.colourboards[_COLOURINDEX[colour]]
+        except KeyError:
+            raise core.ColourError()
+
+    def piececount(self, piecetype, colour):
+        """Counts how many of piecetype one side has on the board."""
+        return core.popcount(self.pieceboard(piecetype, colour))
+
+    def hasnonpawnmaterial(self, colour):
+        """Determine if one side has any pieces besides its pawns and king."""
+        offset = 6*_COLOURINDEX[colour]
+        pieceboards = self.pieceboards
+        return bool(pieceboards[offset + 1] | pieceboards[offset + 2]
+                    | pieceboards[offset + 3] | pieceboards[offset + 4])
+
+    def findpiece(self, piecetype, colour):
+        """Finds all instances of piece on the board that belong to one side."""
+        return list(core.iterbits(self.pieceboard(piecetype, colour)))
+
+    def occupiedsquares(self, colour=None):
+        """Finds the squares that have a piece on them, optionally only the
+        squares holding the pieces of one side."""
+        if colour is None:
+            return list(core.iterbits(self.occupied))
+        return list(core.iterbits(self.colourboard(colour)))
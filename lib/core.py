@@ -163,6 +163,37 @@ def readablelistof(lst):
         string += str(item) + ', '
     return '[' + string[:-2] + ']'
 
+def squarename(index):
+    """Returns the algebraic name of the square at index (e.g. 12 is 'e2')."""
+    return 'abcdefgh'[index % 8] + str(index // 8 + 1)
+
+def squareindex(name):
+    """Returns the index of the square with the algebraic name (e.g. 'e2')."""
+    try:
+        file_, rank_ = 'abcdefgh'.index(name[0]), int(name[1:]) - 1
+    except (ValueError, IndexError, TypeError):
+        raise ValueError("%r isn't the name of a square." % (name,))
+    if not 0 <= rank_ <= 7:
+        raise ValueError("%r isn't the name of a square." % (name,))
+    return rank_*8 + file_
+
+def popcount(bitboard):
+    """Counts the number of set bits (i.e. occupied squares) in a bitboard."""
+    return bin(bitboard).count('1')
+
+def bitscan(bitboard):
+    """Returns the index of the least significant set bit in a bitboard."""
+    if not bitboard:
+        raise ValueError("An empty bitboard has no set bits.")
+    return (bitboard & -bitboard).bit_length() - 1
+
+def iterbits(bitboard):
+    """Yields the index of each set bit, from the least significant upwards."""
+    while bitboard:
+        leastbit = bitboard & -bitboard
+        yield leastbit.bit_length() - 1
+        bitboard ^= leastbit
+
 
  ######  #######  #####  ### ####### ### ####### #     #
  #     # #     # #     #  #     #     #  #     # ##    #
@@ -503,6 +534,15 @@ class UnknownPieceError(TypeError):
         TypeError.__init__(self, errormsg)
 
 
+class FenError(ValueError):
+    """Raised if a FEN string doesn't describe a valid position."""
+
+    def __init__(self, errormsg=None):
+        if errormsg == None:
+            errormsg = "The FEN string isn't valid."
+        ValueError.__init__(self, errormsg)
+
+
 class BadVectorError(NotImplementedError):
     """Called if the vector isn't valid (like being non-straight)"""
 
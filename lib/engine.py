@@ -5,8 +5,10 @@
 # 7369626c65207461736b732e
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import time
 from copy import copy, deepcopy
-from lib import chessboard, core, movegenerator, pieces
+from lib import attacks, chessboard, core, movegenerator, moves, ordering
+from lib import pieces, piecesquare, transposition
 
 
 class Node(object):
@@ -29,29 +31,151 @@ class Node(object):
         return self.moves == other.moves
 
 
+class _SearchAborted(Exception):
+    """Raised inside the search when the time manager says to stop."""
+    pass
+
+
+class TimeManager(object):
+    """Decides how long the engine is allowed to think for a move.
+
+    The budget can be set in three ways, which can be combined:
+      - 'movetime' gives a fixed number of seconds for the move.
+      - 'remaining' and 'increment' give the seconds left on the clock and the
+        seconds added after each move. A share of the remaining time is used,
+        assuming 'movestogo' more moves must be played with it.
+      - 'maxnodes' is a hard limit on the number of nodes searched.
+
+    The deadline is a hard limit: the search stops as soon as it passes. Since
+    each iteration of the search takes a few times longer than the last, a
+    new iteration isn't started once half the budget is used up.
+    """
+
+    def __init__(self, movetime=None, remaining=None, increment=0,
+                 movestogo=30, maxnodes=None):
+        if movetime is None and remaining is None and maxnodes is None:
+            raise ValueError("Give a move time, clock time or node limit.")
+        self.movetime = movetime
+        self.remaining = remaining
+        self.increment = increment
+        self.movestogo = movestogo
+        self.maxnodes = maxnodes
+        self.budget = self.allocatetime()
+        self.start()
+        return None
+
+    def allocatetime(self):
+        """Works out how many seconds can be spent on this move (or None if
+        there is no limit on time)."""
+        budget = None
+        if self.remaining is not None:
+            # Never use more than half the clock, or run it right down.
+            budget = min(self.remaining / float(self.movestogo)
+                         + 0.75*self.increment,
+                         0.5*self.remaining)
+            budget = max(budget - 0.05, 0.01)
+        if self.movetime is not None:
+            if budget is None: budget = self.movetime
+            else: budget = min(budget, self.movetime)
+        return budget
+
+    def start(self):
+        """Starts the clock for the move."""
+        self.starttime = time.time()
+        return None
+
+    def elapsed(self):
+        """The seconds since the clock was started."""
+        return time.time() - self.starttime
+
+    def timeup(self, nodes):
+        """Returns true if the search must stop now. The clock is only read
+        every 256 nodes since it is slow compared to searching a node."""
+        if self.maxnodes is not None and nodes >= self.maxnodes:
+            return True
+        if self.budget is None or nodes & 255:
+            return False
+        return self.elapsed() >= self.budget
+
+    def canstartiteration(self):
+        """Returns true if there is time to search another ply deeper."""
+        if self.budget is None:
+            return True
+        return self.elapsed() < 0.5*self.budget
+
+
+class SearchResult(object):
+    """The outcome of a search: the best move found, its score (from the point
+    of view of the side to move), the principal variation (the line of best
+    play expected from both sides), the depth searched and the nodes visited.
+    The nodes of the quiescence search are counted apart in qnodes."""
+
+    def __init__(self, move, score, pv, depth, nodes, qnodes=0):
+        self.move = move
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.qnodes = qnodes
+        return None
+
+    def __str__(self):
+        """Prints the result of the search."""
+        return "depth %i score %i nodes %i qnodes %i pv %s" % (
+            self.depth, self.score, self.nodes, self.qnodes, self.pv)
+
+
 class Evaluator:
-    """Evaluate a board as a "chess score" in order to pick the best moves."""
+    """Evaluate a board as a "chess score" in order to pick the best moves.
+
+    The terms are added up cheapest first: the material and piece-square
+    scores (read off the board), then the pawn structure (usually found in
+    the pawn hash table) and last the mobility. Given the alpha-beta window
+    the score is needed for, evaluate stops early once the score is more
+    than 'lazymargin' outside the window, and returns the score moved by
+    the margin towards the window: the most (or least) the terms left are
+    taken to be able to make it. That is still a bound on the far side of
+    the window, but no tighter a one than the margin allows, so the search
+    prunes no more than it would on the full score. A smaller margin skips
+    more, but then trusts the terms left to be smaller than they may be. A
+    lazymargin of None always evaluates in full.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :pawntable:    The pawn hash table, of 'pawnhashsize' megabytes.
+    :evaluations:  The number of evaluations made.
+    :skipped:      How many times each term ('pawnstructure', 'mobility')
+                   was skipped by stopping early.
+    """
+
+    # The value of each piece in the material score.
+    PIECEVALUES = piecesquare.PIECEVALUES
+    MOBILITYVALUE = 100  # The value of each safe square a piece attacks.
+    LAZYMARGIN = 3000  # How much the terms left are taken to add, at most.
+
+    def __init__(self, pawnhashsize=1, lazymargin=LAZYMARGIN):
+        # The pawn structures already scored, with a memory budget in MB.
+        self.pawntable = transposition.PawnHashTable(pawnhashsize)
+        self.lazymargin = lazymargin
+        self.resetstatistics()
+        return None
 
-    def __init__(self):
+    def resetstatistics(self):
+        """Starts counting the evaluations and skipped terms from nothing."""
+        self.evaluations = 0
+        self.skipped = {'pawnstructure': 0, 'mobility': 0}
         return None
 
     def materialscore(self, board):
-        """Looks at the material advantage present on the board."""
-        def piecediff(piecetype):
-            """Find if one side is up pieces (+ for white, - for black)"""
-            whitepieces = len(board.findpiece(piecetype, 'white'))
-            blackpieces = len(board.findpiece(piecetype, 'black'))
-            return whitepieces - blackpieces
-
-        positionvalue = (
-            piecediff(pieces.KingPiece)*100000 +
-            piecediff(pieces.QueenPiece)*9000 +
-            piecediff(pieces.RookPiece)*5000 +
-            piecediff(pieces.BishopPiece)*2500 +
-            piecediff(pieces.KnightPiece)*2500 +
-            piecediff(pieces.PawnPiece)*1000
-        )
-        return positionvalue
+        """Looks at the material advantage present on the board. The board
+        keeps this summed up as pieces come and go, so it is only read."""
+        return board.material
+
+    def positionalscore(self, board):
+        """Looks at how well placed the pieces are, by the middlegame and
+        endgame piece-square tables blended by the game phase (see
+        lib/piecesquare.py). The board keeps both totals summed up too."""
+        return board.piecesquare
 
     def pawnstructurescore(self, board):
         """Looks at the pawn structure and gives a net score.
@@ -69,7 +193,26 @@ class Evaluator:
             Trippled pawns = -600
             Protected by two pawns = +150
             Protected by one pawn = +75
+
+        The pawns change far less often than the rest of the board, so the
+        score is kept in the pawn hash table (see pawnentry).
         """
+        return self.pawnentry(board)[0]
+
+    def pawnentry(self, board):
+        """The pawn structure of the board as (score, passedpawns, pawnfiles),
+        looked up by its pawn key and only worked out if it isn't in the pawn
+        hash table. The passed pawns are bitboards and the pawn files 8-bit
+        masks, each a (white, black) pair."""
+        entry = self.pawntable.probe(board.pawnkey)
+        if entry is None:
+            entry = self.computepawnstructure(board)
+            self.pawntable.store(board.pawnkey, *entry)
+        return entry
+
+    def computepawnstructure(self, board):
+        """Works out (score, passedpawns, pawnfiles) for the pawns of the board
+        from scratch, as described in pawnstructurescore and pawnentry."""
         # Define the pawn structure calculator (to remove duplicate code.)
         def pawnstructurevalue(pawnpositions, colour):
             """Gets the value of the pawn structure."""
@@ -120,92 +263,508 @@ class Evaluator:
             netscore += pawnstructurevalue(whitepawns, 'white')
         if blackpawns:
             netscore += pawnstructurevalue(blackpawns, 'black')
-        return netscore
+
+        # A pawn is passed if no enemy pawn is in front of it on its own file
+        # or the files either side.
+        whiteboard = sum(1 << index for index in whitepawns)
+        blackboard = sum(1 << index for index in blackpawns)
+        passedpawns = (
+            sum(1 << index for index in whitepawns
+                if not attacks.PASSED_MASKS['white'][index] & blackboard),
+            sum(1 << index for index in blackpawns
+                if not attacks.PASSED_MASKS['black'][index] & whiteboard))
+        pawnfiles = (sum(set(1 << index % 8 for index in whitepawns)),
+                     sum(set(1 << index % 8 for index in blackpawns)))
+        return netscore, passedpawns, pawnfiles
 
     def mobilityscore(self, board):
-        """Determines how mobile each side is and returns a net score."""
-        generator = movegenerator.MoveGenerator(board)
-        whitemobility = len(generator.generatemovelist('white'))*100
-        blackmobility = len(generator.generatemovelist('black'))*100
-        return whitemobility - blackmobility
-
-    def evaluate(self, board):
-        """Evaluates the board passed, considering lots of factors."""
+        """Determines how mobile each side is and returns a net score.
+
+        A side's mobility is the number of squares its knights, bishops, rooks
+        and queens attack, leaving out the squares of its own pieces and those
+        an enemy pawn attacks (which a piece can't safely go to), worth
+        MOBILITYVALUE each. It is counted straight from the attack bitboards,
+        without generating (or checking the legality of) any moves.
+        """
+        if not isinstance(board, chessboard.BitBoard):
+            board = chessboard.BitBoard.fromboard(board)
+        pieceboards, occupied = board.pieceboards, board.occupied
+        mobility = [0, 0]
+        for side in (0, 1):  # White, then black.
+            own, enemy = 6*side, 6 - 6*side  # Offsets into pieceboards.
+            safe = ~(board.colourboards[side] | attacks.pawnattacks(
+                pieceboards[enemy], core.COLOURS[1 - side])) & attacks.MASK64
+            squares = 0
+            for index in core.iterbits(pieceboards[own + 1]):
+                squares += core.popcount(attacks.KNIGHT_MASKS[index] & safe)
+            for index in core.iterbits(pieceboards[own + 2]):
+                squares += core.popcount(
+                    attacks.bishopattacks(index, occupied) & safe)
+            for index in core.iterbits(pieceboards[own + 3]):
+                squares += core.popcount(
+                    attacks.rookattacks(index, occupied) & safe)
+            for index in core.iterbits(pieceboards[own + 4]):
+                squares += core.popcount(
+                    attacks.queenattacks(index, occupied) & safe)
+            mobility[side] = squares
+        return (mobility[0] - mobility[1])*self.MOBILITYVALUE
+
+    def evaluate(self, board, alpha=None, beta=None):
+        """Evaluates the board passed, considering lots of factors.
+
+        If the window (alpha, beta) the score is wanted for is given, from
+        white's point of view like the score, the expensive terms are skipped
+        once the score is too far outside it for them to matter, and the
+        bound on the score the margin gives is returned instead.
+        """
+        self.evaluations += 1
         netscore = 0
         netscore += self.materialscore(board)
-        netscore += self.mobilityscore(board)
+        netscore += self.positionalscore(board)
+        bound = self._lazybound(netscore, alpha, beta)
+        if bound is not None:
+            self.skipped['pawnstructure'] += 1
+            self.skipped['mobility'] += 1
+            return bound
         netscore += self.pawnstructurescore(board)
+        bound = self._lazybound(netscore, alpha, beta)
+        if bound is not None:
+            self.skipped['mobility'] += 1
+            return bound
+        netscore += self.mobilityscore(board)
         return netscore
 
+    def _lazybound(self, score, alpha, beta):
+        """The score moved by the margin towards the window if that still
+        leaves it outside, otherwise (or with no margin) None."""
+        if self.lazymargin is None:
+            return None
+        if alpha is not None and score + self.lazymargin <= alpha:
+            return score + self.lazymargin
+        if beta is not None and score - self.lazymargin >= beta:
+            return score - self.lazymargin
+        return None
 
-class ChessEngine:
-    """The brains of the computer. It searches and evaluates positions."""
 
-    def __init__(self):
+class ChessEngine:
+    """The brains of the computer. It searches and evaluates positions.
+
+    The search is a negamax alpha-beta search: every position is scored from
+    the point of view of the side to move, so one side's best score is the
+    negative of the other's, and lines that can't change the result are cut
+    off. The engine remembers the positions it has searched in a transposition
+    table, whose memory budget is set in megabytes by 'hashsize' (or which
+    is given ready made as 'transpositiontable', to share one). The pawn
+    hash table of the evaluation has a budget of its own, 'pawnhashsize', and
+    the evaluation's 'lazymargin' is as described for the Evaluator.
+
+    At the end of the main search a quiescence search plays out the captures
+    and promotions, so a position isn't scored in the middle of an exchange.
+    It counts its nodes in 'qnodes', apart from the main search's 'nodes'. It
+    can be turned off with 'quiescence' to score the leaves as they stand.
+
+    Two kinds of selectivity cut the tree down further, each of which can be
+    turned off to compare the searches:
+      - 'nullmove': the side to move passes, and if a shallower search still
+        fails high the position is too good to need searching properly. This
+        is wrong in zugzwang, where passing would be the best move, so it is
+        only tried when the side to move has pieces other than pawns.
+      - 'lmr' (late move reductions): quiet moves ordered late are searched
+        a ply shallower, and only searched again at full depth if they turn
+        out better than expected.
+    The times they pay off are counted in 'nullcutoffs', 'reductions' and
+    'researches'.
+
+    Two more cut the cost of the moves that aren't best:
+      - 'pvs' (principal variation search): the moves after the first are
+        only searched with a null window, to prove they are no better, and
+        searched again with the full window if one is.
+      - 'aspirationwindow': each iteration searches a window this wide either
+        side of the last score rather than an infinite one. A score outside
+        the window widens that side by 'aspirationwidening' times and searches
+        again. A window of None searches every iteration in full.
+    Their re-searches are counted in 'pvsresearches' and 'aspirationresearches'.
+    """
+
+    MATESCORE = 10000000  # Mate in n plies scores MATESCORE - n.
+    MAXPLY = 100
+    INFINITY = MATESCORE + 1
+    DELTAMARGIN = 2000  # How much a capture may gain beyond the piece taken.
+    NULLREDUCTION = 2  # How many plies shallower the null move is searched.
+    LMRFULLMOVES = 3  # How many moves are searched at full depth before LMR.
+    LMRMINDEPTH = 3  # The least depth left at which moves are reduced.
+
+    def __init__(self, hashsize=16, quiescence=True, nullmove=True, lmr=True,
+                 pvs=True, aspirationwindow=500, aspirationwidening=4,
+                 pawnhashsize=1, lazymargin=Evaluator.LAZYMARGIN,
+                 transpositiontable=None):
         self.movegenerator = movegenerator.MoveGenerator
-        self.evaluate = Evaluator.evaluate
+        self.evaluator = Evaluator(pawnhashsize, lazymargin)
+        self.evaluate = self.evaluator.evaluate
+        if transpositiontable is None:
+            transpositiontable = transposition.TranspositionTable(hashsize)
+        self.transpositiontable = transpositiontable
+        self.ordering = ordering.MoveOrderer(self.MAXPLY)
+        self.quiescence = quiescence
+        self.nullmove = nullmove
+        self.lmr = lmr
+        self.pvs = pvs
+        self.aspirationwindow = aspirationwindow
+        self.aspirationwidening = aspirationwidening
+        self.resetcounters()
+        self._timemanager = None
         return None
 
+    def resetcounters(self):
+        """Zeroes the counts of nodes and re-searches."""
+        self.nodes = 0
+        self.qnodes = 0
+        self.nullcutoffs = 0
+        self.reductions = 0
+        self.researches = 0
+        self.pvsresearches = 0
+        self.aspirationresearches = 0
+        self.evaluator.resetstatistics()
+        return None
+
+    @staticmethod
+    def positionkey(board, colour):
+        """The key of the position on board with colour to move."""
+        if colour == 'black':
+            return board.key ^ chessboard.ZOBRIST_SIDE
+        return board.key
+
     def search_single(self, board, maxdepth, startcolour):
         """Looks only one move deep (used as placeholder until proper search
         function is complete)."""
         results = list()
 
         generator = self.movegenerator(board)
-        moves = generator.generatemovelist(startcolour)
-        for move in moves:
-            newboard = board.duplicateboard()
-            newboard.move(*move)
+        board = generator.board  # Make the moves on the board it looks at.
+        movelist = generator.generatemovelist(startcolour)
+        for move in movelist:
+            board.makemove(move)
             parentnode = Node(move)
 
-            newgenerator = self.movegenerator(newboard)
             newmoves = generator.generatemovelist(core.oppositecolour(startcolour))
-            print move, newmoves
+            board.unmakemove()
 
             for newmove in newmoves:
                 results.append(Node(newmove, parentnode))
         return results
 
-    def search(self, board, maxdepth, startcolour, _depth=0, _parent=None, nodes=list()):
-        """Generates the moves up to depth for colour."""
-        while _depth < maxdepth:
-            # Find moves for board state.
-            generator = self.movegenerator(board)
-            moves = generator.generatemovelist(startcolour)
-            print moves
-
-            # Make move recursively
-            for move in moves:
-                newboard = board.duplicateboard()
-                newboard.move(*move)
-                parentnode = Node(move, parent=_parent)
-                print parentnode
-
-                if _depth == maxdepth:
-                    nodes.append(parentnode)
-                    continue
+    def search(self, board, colour, depth=None, timemanager=None):
+        """Finds the best move for colour by searching up to depth plies ahead.
+
+        The search is iteratively deepened: it searches one ply deep, then two
+        and so on, with each iteration ordering its moves using the results of
+        the last. If a time manager is given the search stops when it runs out
+        of time (or nodes) and the result of the deepest completed iteration is
+        returned; the depth is then optional.
+        """
+        if depth is None:
+            if timemanager is None:
+                raise ValueError("Give a depth or a time manager for the search.")
+            depth = self.MAXPLY
+        elif depth < 1:
+            raise ValueError("The search must be at least one ply deep.")
+        if not isinstance(board, chessboard.BitBoard):
+            board = chessboard.BitBoard.fromboard(board)  # Copy once, not per node.
+        self.resetcounters()
+        self._pvtable = [list() for ii in range(self.MAXPLY + 1)]
+        self._timemanager = timemanager
+        self.transpositiontable.newsearch()
+        self.ordering.newsearch()
+        if timemanager is not None:
+            timemanager.start()
+
+        result = None
+        for iterationdepth in range(1, depth + 1):
+            try:
+                if result is None or self.aspirationwindow is None:
+                    score = self._negamax(
+                        board, colour, iterationdepth,
+                        -self.INFINITY, self.INFINITY, 0)
                 else:
-                    return self.search(
-                        newboard,
-                        maxdepth, core.oppositecolour(startcolour),
-                        _depth+0.5,  # HACK: Half step so we measure both black's and white's moves.
-                        parentnode, nodes
-                    )
-        return nodes
-
-    def netattackers(self, board, position):
-        """Looks at the position on the board and sees the number of attackers
-        and defenders. This is used to see if there is a possibiliy of exchange."""
+                    score = self._aspiration(
+                        board, colour, iterationdepth, result.score)
+            except _SearchAborted:
+                break
+            pv = self._pvtable[0]
+            if pv: move = pv[0]
+            else: move = None  # There are no legal moves.
+            result = SearchResult(
+                move, score, pv, iterationdepth, self.nodes, self.qnodes)
+
+            if move is None or abs(score) >= self.MATESCORE - self.MAXPLY:
+                break  # Searching deeper won't change the result.
+            if timemanager is not None and not timemanager.canstartiteration():
+                break
+        self._timemanager = None
+
+        if result is None:
+            # Stopped before even one ply was searched; take any legal move.
+            movelist = self.movegenerator(board).generatemovelist(colour)
+            if self._pvtable[0]: move = self._pvtable[0][0]
+            elif movelist: move = movelist[0]
+            else: move = None
+            result = SearchResult(move, 0, [move] if move is not None else [],
+                                  0, self.nodes, self.qnodes)
+        return result
+
+    def searchmove(self, board, colour, move, depth, alpha=None, beta=None):
+        """Searches the single root move 'move' of colour, depth plies deep in
+        all (the move included), within the window alpha to beta. The plies
+        below the move are searched once, straight to that depth: the caller
+        deepens the root an iteration at a time, and the transposition table
+        keeps the move ordering of the shallower searches. Returns its
+        SearchResult, whose score is exact only if it lies inside the window
+        (at or below alpha it is an upper bound). Used to split the root moves
+        of a search between processes."""
+        if alpha is None: alpha = -self.INFINITY
+        if beta is None: beta = self.INFINITY
+        if not isinstance(board, chessboard.BitBoard):
+            board = chessboard.BitBoard.fromboard(board)
+        self.resetcounters()
+        self._pvtable = [list() for ii in range(self.MAXPLY + 1)]
+        self._timemanager = None
+        opposition = core.oppositecolour(colour)
+        board.makemove(move)
         try:
-            piececolour = board[position].colour
-        except AttributeError:
-            raise core.EmptySquareError(position)
-
-        endmoves = lambda l: map(lambda x: x[1], l)
-        movegen = self.movegenerator(board)
-
-        defenderendmoves = endmoves(
-            movegen.basicmoves(piececolour, defendingmoves=True))
-        attackerendmoves = endmoves(
-            movegen.basicmoves(core.oppositecolour(piececolour)))
-        return attackerendmoves.count(position) - defenderendmoves.count(position)
+            score = -self._negamax(board, opposition, depth - 1, -beta, -alpha, 1)
+        finally:
+            board.unmakemove()
+        return SearchResult(move, score, [move] + self._pvtable[1], depth,
+                            self.nodes, self.qnodes)
+
+    def _aspiration(self, board, colour, depth, lastscore):
+        """Searches the root with a window around the last iteration's score,
+        widening the side it falls out of until the score lands inside."""
+        below = above = self.aspirationwindow
+        while True:
+            alpha = max(lastscore - below, -self.INFINITY)
+            beta = min(lastscore + above, self.INFINITY)
+            score = self._negamax(board, colour, depth, alpha, beta, 0)
+            if alpha < score < beta:
+                return score
+            self.aspirationresearches += 1
+            if score <= alpha: below *= self.aspirationwidening
+            else: above *= self.aspirationwidening
+
+    def _negamax(self, board, colour, depth, alpha, beta, ply, allownull=True):
+        """The recursive alpha-beta search. Returns the score of the position
+        for colour, which is exact if it lies between alpha and beta. Null
+        moves aren't tried if allownull is false (straight after another)."""
+        if depth <= 0 and self.quiescence:
+            return self._quiescence(board, colour, alpha, beta, ply)
+        self.nodes += 1
+        self._pvtable[ply] = list()
+        if (self._timemanager is not None
+                and self._timemanager.timeup(self.nodes + self.qnodes)):
+            raise _SearchAborted()
+
+        # See if we have already searched this position deep enough.
+        table = self.transpositiontable
+        key = self.positionkey(board, colour)
+        entry = table.probe(key)
+        hashmove = None
+        if entry is not None:
+            entrydepth, bound, score, hashmove = entry
+            score = self._scorefromtable(score, ply)
+            if ply > 0 and entrydepth >= depth:
+                if (bound == transposition.EXACT
+                        or (bound == transposition.LOWERBOUND and score >= beta)
+                        or (bound == transposition.UPPERBOUND and score <= alpha)):
+                    return score
+
+        if depth <= 0 or ply >= self.MAXPLY:
+            return self._staticscore(board, colour, alpha, beta)
+
+        generator = self.movegenerator(board)
+        incheck = generator.kingincheck(colour)
+        opposition = core.oppositecolour(colour)
+
+        # Pass the turn: if the opponent still can't get below beta, a real
+        # move would do at least as well, so there is no need to search one.
+        if (self.nullmove and allownull and ply > 0 and not incheck
+                and depth > self.NULLREDUCTION
+                and abs(beta) < self.MATESCORE - self.MAXPLY
+                and board.hasnonpawnmaterial(colour)):
+            board.makenullmove()
+            try:
+                score = -self._negamax(
+                    board, opposition, depth - 1 - self.NULLREDUCTION,
+                    -beta, -beta + 1, ply + 1, False)
+            finally:
+                board.unmakemove()
+            if score >= beta:
+                self.nullcutoffs += 1
+                return beta
+
+        # The moves are generated a stage at a time, best first (see
+        # StagedMoveGenerator), so a cutoff early on saves generating the rest.
+        movelist = self.ordering.staged(generator, colour, ply, hashmove)
+        reduce = self.lmr and not incheck and depth >= self.LMRMINDEPTH
+
+        originalalpha = alpha
+        bestscore, bestmove = -self.INFINITY, None
+        for movenumber, move in enumerate(movelist, 1):
+            board.makemove(move)
+            try:
+                if (reduce and movenumber > self.LMRFULLMOVES
+                        and movelist.stage == movelist.QUIETS
+                        and not generator.kingincheck(opposition)):
+                    # A late quiet move is probably bad, so prove it with a
+                    # shallower search and only search it fully if it isn't.
+                    self.reductions += 1
+                    score = -self._negamax(
+                        board, opposition, depth - 2, -alpha - 1, -alpha, ply + 1)
+                    if score > alpha:
+                        self.researches += 1
+                        score = self._fulldepth(
+                            board, opposition, depth, alpha, beta, ply)
+                elif self.pvs and bestmove is not None:
+                    score = self._fulldepth(
+                        board, opposition, depth, alpha, beta, ply)
+                else:
+                    score = -self._negamax(
+                        board, opposition, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.unmakemove()  # Even if the search is aborted.
+
+            if score > bestscore:
+                bestscore, bestmove = score, move
+                if score > alpha:
+                    alpha = score
+                    self._pvtable[ply] = [move] + self._pvtable[ply + 1]
+                    if alpha >= beta:
+                        # The opponent won't allow this line. Remember the
+                        # move to try it early in similar positions.
+                        self.ordering.cutoff(
+                            move, ply, depth, movenumber, movelist.stage)
+                        break
+
+        if bestmove is None:  # There were no moves: checkmate or stalemate.
+            if incheck: return -self.MATESCORE + ply
+            else: return 0
+        if bestscore >= beta: bound = transposition.LOWERBOUND
+        elif bestscore > originalalpha: bound = transposition.EXACT
+        else: bound = transposition.UPPERBOUND
+        table.store(
+            key, depth, bound, self._scoretotable(bestscore, ply), bestmove)
+        return bestscore
+
+    def _fulldepth(self, board, opposition, depth, alpha, beta, ply):
+        """Searches a move that has been played after the first. With PVS it
+        is expected to be worse, so it gets a null window first and the full
+        window only if it proves better than alpha."""
+        if self.pvs and beta - alpha > 1:
+            score = -self._negamax(
+                board, opposition, depth - 1, -alpha - 1, -alpha, ply + 1)
+            if not alpha < score < beta:
+                return score
+            self.pvsresearches += 1
+        return -self._negamax(
+            board, opposition, depth - 1, -beta, -alpha, ply + 1)
+
+    def _staticscore(self, board, colour, alpha=None, beta=None):
+        """The evaluation of the board for colour. The window, if given, lets
+        the evaluation stop early when the score is far outside it."""
+        if colour == 'white':
+            return self.evaluate(board, alpha, beta)
+        else:
+            return -self.evaluate(
+                board, None if beta is None else -beta,
+                None if alpha is None else -alpha)
+
+    def _quiescence(self, board, colour, alpha, beta, ply):
+        """Searches only the captures and promotions until the position is
+        quiet, so it is never scored with a piece left hanging.
+
+        The side to move can always 'stand pat' on the static score instead of
+        capturing, which gives a lower bound straight away. Captures that
+        couldn't raise the score to alpha even with DELTAMARGIN to spare are
+        pruned without being played (delta pruning), as are captures that
+        lose material by static exchange evaluation. In check, standing pat
+        isn't allowed, so every evasion is searched.
+        """
+        self.qnodes += 1
+        self._pvtable[ply] = list()
+        if (self._timemanager is not None
+                and self._timemanager.timeup(self.nodes + self.qnodes)):
+            raise _SearchAborted()
+
+        if ply >= self.MAXPLY:
+            return self._staticscore(board, colour)
+
+        generator = self.movegenerator(board)
+        incheck = generator.kingincheck(colour)
+        if incheck:
+            movelist = generator.generatemovelist(colour)
+            if not movelist:
+                return -self.MATESCORE + ply
+            standpat = bestscore = -self.INFINITY
+        else:
+            movelist = generator.generatecaptures(colour)
+            # Delta pruning compares the static score with alpha less what
+            # each capture could win, so the evaluation mustn't stop early
+            # above the lowest of those.
+            reach = max([self._capturegain(board, move) for move in movelist]
+                        or [0]) + self.DELTAMARGIN
+            standpat = bestscore = self._staticscore(
+                board, colour, alpha - reach, beta)
+            if standpat >= beta:
+                return standpat
+            alpha = max(alpha, standpat)
+        movelist.sort(key=generator.mvvlva, reverse=True)
+
+        opposition = core.oppositecolour(colour)
+        for move in movelist:
+            if not incheck:
+                if (standpat + self._capturegain(board, move)
+                        + self.DELTAMARGIN <= alpha):
+                    continue  # Even winning the piece won't be enough.
+                if generator.losingcapture(move):
+                    continue
+            board.makemove(move)
+            try:
+                score = -self._quiescence(
+                    board, opposition, -beta, -alpha, ply + 1)
+            finally:
+                board.unmakemove()
+
+            if score > bestscore:
+                bestscore = score
+                if score > alpha:
+                    alpha = score
+                    self._pvtable[ply] = [move] + self._pvtable[ply + 1]
+                    if alpha >= beta:
+                        break
+        return bestscore
+
+    def _capturegain(self, board, move):
+        """The most material a capture or promotion can win (the value of the
+        piece taken, plus the gain of promoting)."""
+        values = self.evaluator.PIECEVALUES
+        end, flags = (move >> 6) & 63, move >> 12
+        gain = 0
+        if flags == moves.ENPASSANT:
+            gain = values[pieces.PawnPiece]
+        elif board[end] is not None:
+            gain = values[board[end].__class__]
+        if flags & moves.PROMOTION:
+            gain += (values[moves.PROMOTIONPIECES[flags & 3]]
+                     - values[pieces.PawnPiece])
+        return gain
+
+    def _scoretotable(self, score, ply):
+        """Mate scores are stored as distance from this position, not the root."""
+        if score >= self.MATESCORE - self.MAXPLY: return score + ply
+        elif score <= -self.MATESCORE + self.MAXPLY: return score - ply
+        return score
+
+    def _scorefromtable(self, score, ply):
+        """Turns a stored mate score back into a distance from the root."""
+        if score >= self.MATESCORE - self.MAXPLY: return score - ply
+        elif score <= -self.MATESCORE + self.MAXPLY: return score + ply
+        return score
@@ -13,8 +13,23 @@
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-from copy import deepcopy
-from lib import core, chessboard, vectors, pieces
+from lib import core, chessboard, pieces, attacks, moves
+
+# The kinds of moves _generatelegal can be asked for. Captures include en passant
+# and every promotion (even without a capture) since they change the material.
+CAPTURES, QUIETS = 1, 2
+ALLMOVES = CAPTURES | QUIETS
+
+# The order of value of the pieces for MVV-LVA.
+_ORDERVALUES = {
+    pieces.PawnPiece: 1, pieces.KnightPiece: 3, pieces.BishopPiece: 3,
+    pieces.RookPiece: 5, pieces.QueenPiece: 9, pieces.KingPiece: 20
+}
+
+# The values of the pieces for static exchange evaluation, in the order of
+# chessboard.PIECETYPES and on the same scale as the evaluator's material.
+SEEVALUES = (1000, 2500, 2500, 5000, 9000, 100000)
+_SEEVALUES = dict(zip(chessboard.PIECETYPES, SEEVALUES))
 
   #####  ####### ######  #######
  #     # #     # #     # #
@@ -26,12 +41,36 @@ from lib import core, chessboard, vectors, pieces
 
 
 class _CoreMoveGenerator:
-    """Contains the core methods that are used in the move generation."""
+    """Contains the core methods that are used in the move generation.
+
+    The move generator works on bitboards, so a board that isn't a BitBoard is
+    copied into one first. The engine and game already play on bitboards.
+    """
 
     def __init__(self, currentboardstate):
-        self.board = deepcopy(currentboardstate)
+        if isinstance(currentboardstate, chessboard.BitBoard):
+            self.board = currentboardstate
+        else:
+            self.board = chessboard.BitBoard.fromboard(currentboardstate)
         return
 
+    def attacksfrom(self, piece, index):
+        """The bitboard of squares the piece would attack from index."""
+        piececlass = piece.__class__
+        if piececlass is pieces.KnightPiece:
+            return attacks.KNIGHT_MASKS[index]
+        elif piececlass is pieces.BishopPiece:
+            return attacks.bishopattacks(index, self.board.occupied)
+        elif piececlass is pieces.RookPiece:
+            return attacks.rookattacks(index, self.board.occupied)
+        elif piececlass is pieces.QueenPiece:
+            return attacks.queenattacks(index, self.board.occupied)
+        elif piececlass is pieces.KingPiece:
+            return attacks.KING_MASKS[index]
+        elif piececlass is pieces.PawnPiece:
+            return attacks.PAWN_MASKS[piece.colour][index]
+        raise core.UnknownPieceError()
+
     def _positiononboard(self, positon):
         """Checks that the position is on the board."""
         return all([0 <= x <= 7 for x in core.Position(positon).coordinate])
@@ -78,73 +117,119 @@ class _CoreMoveGenerator:
         'defendingmoves' adds the move even if it captures its "own piece" in
         order to look at exchanges in the brains of the engine.
         """
+        index = core.convert(pos, toindex=True)
+        board = self.board
+        if piece.__class__ is not pieces.PawnPiece:
+            targets = self.attacksfrom(piece, index)
+            if not defendingmoves:
+                targets &= ~board.colourboard(piece.colour)
+            return list(core.iterbits(targets))
+
+        # Pawns only move forward here, and can't capture forward.
         allowedmoves = list()
-        for unitvector in piece.moveunitvectors:
-            movetopos = core.Position(pos).vector + unitvector
-
-            while self._positiononboard(movetopos):
-                endsquare = self.board[movetopos]
-                if endsquare != None:
-                    if self._piecesareonsameside(piece, endsquare):
-                        if defendingmoves: allowedmoves.append(movetopos)
-                        break
-                    elif piece.type == pieces.PawnPiece:  # Pawns can't capture forward
-                        break
-                    else:  # If opposition piece.
-                        allowedmoves.append(movetopos)
-                        break  # Can't go further then capture.
-                else:
-                    allowedmoves.append(movetopos)
-
-                if piece.crawler: break
-                else: movetopos += unitvector
-
-            continue  # Just to show where while loop ends.
+        for movetoindex in attacks.RAYS[piece.moveunitvectors[0].vector][index][:1]:
+            endsquare = board[movetoindex]
+            if endsquare is None:
+                allowedmoves.append(movetoindex)
+            elif endsquare.colour == piece.colour and defendingmoves:
+                allowedmoves.append(movetoindex)
         return allowedmoves
 
     def basicmoves(self, colour, defendingmoves=False):
-        """Get the most basic moves, such as simple captures and movement."""
+        """Get the most basic moves, such as simple captures and movement, of
+        every piece but the pawns (which have their own rules)."""
         # Sanity checks.
         if colour not in core.COLOURS:
             raise core.ColourError()
 
         # Now apply that method to each piece on the board.
+        board = self.board
+        enemy = board.colourboard(core.oppositecolour(colour))
+        pawns = board.pieceboard(pieces.PawnPiece, colour)
         movelist = list()
-        for index, square in enumerate(self.board):
-            if square == None:
-                continue
-            elif square.colour != colour:
-                continue  # Skip over piece if it is different colour.
-            startpos = index
-            endposlist = map(
-                lambda x: core.Position(x).index,
-                self._movesforpiece(square, startpos, defendingmoves)
-            )
-            movepairs = map(lambda x: (startpos, x), endposlist)
-            movelist.append(movepairs)
-        return core.flattenlist(movelist)
+        for index in core.iterbits(board.colourboard(colour) & ~pawns):
+            targets = self.attacksfrom(board[index], index)
+            if not defendingmoves:
+                targets &= ~board.colourboard(colour)
+            for endindex in core.iterbits(targets):
+                if enemy >> endindex & 1:
+                    movelist.append(moves.encode(index, endindex, moves.CAPTURE))
+                else:
+                    movelist.append(moves.encode(index, endindex))
+        return movelist
 
-    def kingincheck(self, kingcolour):
-        """Determine if the king of a certain colour is in check."""
-        # Find the king first.
-        try:
-            oppositioncolour = core.oppositecolour(kingcolour)
-            kingpos = self.board.findpiece(pieces.KingPiece, kingcolour.lower())[0]
-        except IndexError:
-            raise RuntimeError("We can't find the %s king!" % kingcolour)
+    def squareattacked(self, index, bycolour, occupied=None):
+        """Determine if any piece of colour 'bycolour' attacks the square. The
+        occupied squares can be given to look as if some pieces had moved."""
+        board = self.board
+        if occupied is None:
+            occupied = board.occupied
+        pieceboards = board.pieceboards
+        offset = 0 if bycolour == core.COLOURS[0] else 6
+        queens = pieceboards[offset + 4]
+        return bool(
+            (attacks.PAWN_MASKS[core.oppositecolour(bycolour)][index]
+                & pieceboards[offset])
+            or attacks.KNIGHT_MASKS[index] & pieceboards[offset + 1]
+            or attacks.KING_MASKS[index] & pieceboards[offset + 5]
+            or (attacks.bishopattacks(index, occupied)
+                & (pieceboards[offset + 2] | queens))
+            or (attacks.rookattacks(index, occupied)
+                & (pieceboards[offset + 3] | queens))
+        )
 
-        # Then look for any square that is attacking.
-        for index, square in enumerate(self.board):
-            if square == None:
-                continue
-            elif square.colour == kingcolour:
-                continue  # Skip over piece if it is same colour.
-            endposlist = core.convertlist(
-                self._movesforpiece(square, index), toindex=True)
+    def attackersof(self, index, bycolour, occupied=None):
+        """The bitboard of the pieces of colour 'bycolour' attacking the square."""
+        board = self.board
+        if occupied is None:
+            occupied = board.occupied
+        pieceboards = board.pieceboards
+        offset = 0 if bycolour == core.COLOURS[0] else 6
+        queens = pieceboards[offset + 4]
+        return (
+            (attacks.PAWN_MASKS[core.oppositecolour(bycolour)][index]
+                & pieceboards[offset])
+            | (attacks.KNIGHT_MASKS[index] & pieceboards[offset + 1])
+            | (attacks.KING_MASKS[index] & pieceboards[offset + 5])
+            | (attacks.bishopattacks(index, occupied)
+                & (pieceboards[offset + 2] | queens))
+            | (attacks.rookattacks(index, occupied)
+                & (pieceboards[offset + 3] | queens))
+        )
 
-            if kingpos in endposlist: return True
-            else: continue
-        return False
+    def _kingsquare(self, kingcolour):
+        """Finds the square of the king of a certain colour."""
+        kingboard = self.board.pieceboard(pieces.KingPiece, kingcolour)
+        if not kingboard:
+            raise RuntimeError("We can't find the %s king!" % kingcolour)
+        return core.bitscan(kingboard)
+
+    def kingincheck(self, kingcolour):
+        """Determine if the king of a certain colour is in check."""
+        return self.squareattacked(
+            self._kingsquare(kingcolour), core.oppositecolour(kingcolour))
+
+    def pinnedpieces(self, colour):
+        """Finds the pieces of colour pinned to their king. Returns a dict of
+        the pinned squares, each with the bitboard of the line the piece must
+        stay on (which includes the square of the pinning piece)."""
+        board = self.board
+        kingpos = self._kingsquare(colour)
+        pieceboards = board.pieceboards
+        offset = 6 if colour == core.COLOURS[0] else 0  # The enemy pieces.
+        queens = pieceboards[offset + 4]
+        snipers = (
+            (attacks.rookattacks(kingpos, 0) & (pieceboards[offset + 3] | queens))
+            | (attacks.bishopattacks(kingpos, 0)
+               & (pieceboards[offset + 2] | queens)))
+
+        pins = dict()
+        own = board.colourboard(colour)
+        for sniper in core.iterbits(snipers):
+            blockers = attacks.BETWEEN[kingpos][sniper] & board.occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pins[core.bitscan(blockers)] = attacks.LINE[kingpos][sniper]
+        return pins
 
     def pawnonendline(self, colour):
         """Determine if a pawn has reached the backline."""
@@ -186,127 +271,97 @@ class _CoreMoveGenerator:
 class MoveGenerator(_CoreMoveGenerator):
     """Generates the possible moves based off the rules of chess."""
 
-    def illegalmove(self, movepair, kingcolour):
+    def illegalmove(self, move, kingcolour):
         """Checks to see if the supplied move if illegal."""
         # Make the move and see if the king is in check, then restore board state.
-        if isinstance(movepair[0],tuple) and isinstance(movepair[1],tuple):  # NOTE: This is a castling move.
-            for move in movepair: self.board.move(move[0], move[1])
-            result = self.kingincheck(kingcolour)
-            for move in movepair: self.board.move(move[1], move[0])
-        else:
-            self.board.move(movepair[0], movepair[1])
-            result = self.kingincheck(kingcolour)
-            self.board.move(movepair[1], movepair[0])
+        self.board.makemove(move)
+        result = self.kingincheck(kingcolour)
+        self.board.unmakemove()
         return result
 
-    def onlylegalmoves(self, colour, movepairlist):
-        """Filter a list, keeping only legal moves."""
+    def onlylegalmoves(self, colour, movelist):
+        """Filter a list, keeping only legal moves. Each move is played to test
+        it, so this is slow; generatemovelist doesn't need it."""
         oppositioncolour = core.oppositecolour(colour.lower())
 
         ii = 0
-        while ii < len(movepairlist):
-            if self.illegalmove(movepairlist[ii], colour):
-                del movepairlist[ii]
+        while ii < len(movelist):
+            if self.illegalmove(movelist[ii], colour):
+                del movelist[ii]
             else:
                 ii += 1
-        return movepairlist
+        return movelist
+
+    @staticmethod
+    def _addpawnmoves(movelist, start, end, flags):
+        """Adds a pawn move, or all four promotions if it reaches the backline."""
+        if end < 8 or end > 55:
+            for promoteto in moves.PROMOTIONPIECES:
+                movelist.append(moves.encode(
+                    start, end, moves.promotionflags(
+                        promoteto, capture=bool(flags & moves.CAPTURE))))
+        else:
+            movelist.append(moves.encode(start, end, flags))
+        return movelist
 
     def pawnpushmoves(self, colour):
-        """Gets the moves allowed for pawn pushing."""
-        # Determine where the frontline is.
+        """Gets the moves allowed for pawn pushing, one or two squares."""
+        # Pushing is a shift of the pawns bitboard by a rank.
         if colour == 'white':
-            frontline = range(8, 16); push = 16
+            step = 8; doublerank = 0x0000000000FF0000
         elif colour == 'black':
-            frontline = range(48, 56); push = -16
+            step = -8; doublerank = 0x0000FF0000000000
         else:
             raise core.ColourError()
 
-        # Add the push moves if required.
+        empty = ~self.board.occupied & attacks.MASK64
+        pawns = self.board.pieceboard(pieces.PawnPiece, colour)
+        if step > 0:
+            single = (pawns << 8) & empty
+            double = ((single & doublerank) << 8) & empty
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & doublerank) >> 8) & empty
+
         movelist = list()
-        for ii in frontline:  # Iterate over frontline.
-            square = self.board[ii]
-            if square == None:
-                continue
-            elif square.type == pieces.PawnPiece:
-                # Make sure only pawn is on frontline and up to push.
-                if len(self._piecesbetween(ii, ii + push, inclusive=True)) != 1:
-                    continue
-                else:
-                    movelist.append((ii, ii + push))
-            else:
-                continue
+        for endindex in core.iterbits(single):
+            self._addpawnmoves(movelist, endindex - step, endindex, moves.QUIET)
+        for endindex in core.iterbits(double):
+            movelist.append(
+                moves.encode(endindex - 2*step, endindex, moves.DOUBLEPUSH))
         return movelist
 
     def pawncapturemoves(self, colour):
         """Finds where pawns are able to capture normally."""
-        # ---------------------------------------------------------------------
-        def capturemoveat(endvec):
-            """Determines if there is a capture move at endvec."""
-            try:
-                square = self.board[endvec]
-                if square == None:
-                    return False
-                elif square.colour != colour:
-                    return True
-                else:  # Can't capture same colour.
-                    return False
-            except IndexError:
-                return False  # Position isn't on the board.
-            return -1
-        # ---------------------------------------------------------------------
-
-        if colour == 'white':
-            captureleft = core.Vector(1, -1)
-            captureright = core.Vector(1, 1)
-        elif colour == 'black':
-            captureleft = core.Vector(-1, -1)
-            captureright = core.Vector(-1, 1)
-        else:
+        if colour not in core.COLOURS:
             raise core.ColourError()
 
-        pawnsonboard = self.board.findpiece(pieces.PawnPiece, colour)
+        pawnattacks = attacks.PAWN_MASKS[colour]
+        enemy = self.board.colourboard(core.oppositecolour(colour))
         capturelist = list()
-        for pawnindex in pawnsonboard:
-            pawnvec = core.Position(pawnindex).vector
-            vecleft = pawnvec + captureleft
-            vecright = pawnvec + captureright
-
-            if capturemoveat(vecleft):
-                capturelist.append(
-                    (pawnindex, core.Position(vecleft).index)
-                )
-            if capturemoveat(vecright):
-                capturelist.append(
-                    (pawnindex, core.Position(vecright).index)
-                )
+        for pawnindex in core.iterbits(
+                self.board.pieceboard(pieces.PawnPiece, colour)):
+            for endindex in core.iterbits(pawnattacks[pawnindex] & enemy):
+                self._addpawnmoves(
+                    capturelist, pawnindex, endindex, moves.CAPTURE)
         return capturelist
 
     def castlemoves(self, colour):
         """Get the caslting moves."""
         # ---------------------------------------------------------------------
         def isking(position):
-            """Determine if the piece at position is a king."""
-            try:
-                result = (self.board[position].type == pieces.KingPiece)
-            except AttributeError:
-                result = False  # If position is empty, return false.
-            return result
+            """Determine if the piece at position is our king."""
+            square = self.board[position]
+            return (square is not None and square.colour == colour
+                    and square.__class__ is pieces.KingPiece)
 
         def isrook(position):
-            """Determine if the piece at position is a rook."""
-            try:
-                result = (self.board[position].type == pieces.RookPiece)
-            except AttributeError:
-                result = False  # If position is empty, return false.
-            return result
+            """Determine if the piece at position is our rook."""
+            square = self.board[position]
+            return (square is not None and square.colour == colour
+                    and square.__class__ is pieces.RookPiece)
         # ---------------------------------------------------------------------
-        castlemoves = list(); castleleft = True; castleright = True
-
-        # See if allowed to castle at all.
-        if not self.board.cancastleleft: castleleft = False
-        if not self.board.cancastleright: castleright = False
-        if not castleleft and not castleright:
-            return castlemoves  # Early exit to reduce overhead.
+        castlemoves = list()
 
         # Determine where the king and rook are.
         if colour == 'white': kingpos, rookleftpos, rookrightpos = 4, 0, 7
@@ -314,55 +369,52 @@ class MoveGenerator(_CoreMoveGenerator):
         else:
             raise core.ColourError('%r is neither white nor black' % colour)
 
+        # See if allowed to castle at all.
+        castleleft, castleright = self.board.cancastle(colour)
+        if not castleleft and not castleright:
+            return castlemoves  # Early exit to reduce overhead.
+
         # See if king or rook out of place.
         if not isking(kingpos):
-            self.board.cancastleleft = False; self.board.cancastleright = False
             castleleft = False; castleright = False
         else:
             if not isrook(rookleftpos):
-                castleleft = False; self.board.cancastleleft = False
+                castleleft = False
             if not isrook(rookrightpos):
-                castleright = False; self.board.cancastleright = False
+                castleright = False
+        if not castleleft and not castleright:
+            return castlemoves
 
         # Confirm that the king isn't already in check.
         if self.kingincheck(colour):
             castleleft = False; castleright = False
 
         # See if there are pieces between the rook and king.
-        if self._piecesbetween(rookleftpos, kingpos):
+        if self.board.occupied & attacks.BETWEEN[rookleftpos][kingpos]:
             castleleft = False
-        if self._piecesbetween(rookrightpos, kingpos):
+        if self.board.occupied & attacks.BETWEEN[rookrightpos][kingpos]:
             castleright = False
 
         # See if the castle start/end/during puts the king in check.
+        oppositioncolour = core.oppositecolour(colour)
         castleleftsteps = range(kingpos-1, kingpos - 3, -1)
-        if not castleleft:
-            pass
-        else:
+        if castleleft:
             for step in castleleftsteps:
-                if self.illegalmove((kingpos, step), colour):
+                if self.squareattacked(step, oppositioncolour):
                     castleleft = False
-                else:
-                    continue
         castlerightsteps = range(kingpos+1, kingpos + 3)
-        if not castleright:
-            pass
-        else:
+        if castleright:
             for step in castlerightsteps:
-                if self.illegalmove((kingpos, step), colour):
+                if self.squareattacked(step, oppositioncolour):
                     castleright = False
-                else:
-                    continue
 
         # Then see what castle moves can be added and add them.
         if castleleft:
             castlemoves.append(
-                ((kingpos, kingpos-2), (rookleftpos, rookleftpos+3))
-            )
+                moves.encode(kingpos, kingpos-2, moves.CASTLELEFT))
         if castleright:
             castlemoves.append(
-                ((kingpos, kingpos+2), (rookleftpos, rookleftpos-2))
-            )
+                moves.encode(kingpos, kingpos+2, moves.CASTLERIGHT))
         return castlemoves
 
 
@@ -381,7 +433,8 @@ class MoveGenerator(_CoreMoveGenerator):
                 if square.colour == colour:
                     startindex = core.convert(pos, toindex=True)
                     endindex = core.convert((capturerank, file_), toindex=True)
-                    thelist.append((startindex, endindex))
+                    thelist.append(
+                        moves.encode(startindex, endindex, moves.ENPASSANT))
             return thelist
 
         # Determine if there are any en passant moves present.
@@ -404,20 +457,323 @@ class MoveGenerator(_CoreMoveGenerator):
             movelist = addtomovesifcanenpassant(enpassantright, movelist)
         return movelist
 
-    def generatemovelist(self, colour):
-        """Generate all of the possible moves for colour."""
-        basicmoves = self.basicmoves(colour)
-        pawnpushmoves = self.pawnpushmoves(colour)
-        pawncapturemoves = self.pawncapturemoves(colour)
-        castlemoves = self.castlemoves(colour)
-        enpassantmoves = self.enpassantmoves(colour)
-        allmoves = core.combinelists(
-            basicmoves,
-            pawnpushmoves,
-            pawncapturemoves,
-            castlemoves,
-            enpassantmoves
-        )
+    def _enpassantlegalmoves(self, colour, kingpos):
+        """The en passant captures for colour that don't leave the king in
+        check. Taking a pawn en passant empties two squares on the same rank,
+        so rather than reasoning about pins the attacks on the king are looked
+        up with the pieces where they would be after the capture."""
+        board = self.board
+        if board.playercolour == colour:
+            enpassant = board.enpassantforplayer
+        else:
+            enpassant = board.enpassantforcomputer
+        if enpassant is None:
+            return list()
+
+        opposition = core.oppositecolour(colour)
+        if colour == core.COLOURS[0]:
+            endindex, capturedat = 40 + enpassant, 32 + enpassant
+        else:
+            endindex, capturedat = 16 + enpassant, 24 + enpassant
+        capturedbit = 1 << capturedat
+        if (not board.pieceboard(pieces.PawnPiece, opposition) & capturedbit
+                or board.occupied >> endindex & 1):
+            return list()
+
+        movelist = list()
+        pawns = board.pieceboard(pieces.PawnPiece, colour)
+        for start in core.iterbits(attacks.PAWN_MASKS[opposition][endindex] & pawns):
+            occupied = (board.occupied ^ (1 << start) ^ capturedbit) | (1 << endindex)
+            if not (self.attackersof(kingpos, opposition, occupied) & ~capturedbit):
+                movelist.append(moves.encode(start, endindex, moves.ENPASSANT))
+        return movelist
+
+    def _generatelegal(self, colour, kinds=ALLMOVES, fromsquares=attacks.MASK64):
+        """Generate the legal moves of colour of the kinds asked for, only for
+        the pieces on fromsquares.
+
+        The pieces giving check and the pieces pinned to the king are found
+        once, up front, so every move is legal when it is generated and none
+        need to be played to test them: the king only steps to squares that
+        aren't attacked, a pinned piece only moves along its pin and in check
+        the other pieces may only take the checker or block the check (in
+        double check only the king can move).
+        """
+        if colour not in core.COLOURS:
+            raise core.ColourError()
+        board = self.board
+        opposition = core.oppositecolour(colour)
+        kingpos = self._kingsquare(colour)
+        own = board.colourboard(colour)
+        enemy = board.colourboard(opposition)
+        occupied = board.occupied
+        wantcaptures, wantquiets = kinds & CAPTURES, kinds & QUIETS
+        destinations = 0
+        if wantcaptures: destinations |= enemy
+        if wantquiets: destinations |= ~occupied & attacks.MASK64
+        movelist = list()
+
+        # The king; the square it leaves is emptied so that a slider checking
+        # it still covers the squares behind it.
+        if fromsquares >> kingpos & 1:
+            withoutking = occupied ^ (1 << kingpos)
+            for endindex in core.iterbits(attacks.KING_MASKS[kingpos] & destinations):
+                if not self.squareattacked(endindex, opposition, withoutking):
+                    if enemy >> endindex & 1:
+                        movelist.append(
+                            moves.encode(kingpos, endindex, moves.CAPTURE))
+                    else:
+                        movelist.append(moves.encode(kingpos, endindex))
+
+        checkers = self.attackersof(kingpos, opposition)
+        if checkers & (checkers - 1):
+            return movelist  # Double check, so only the king can move.
+        elif checkers:
+            targets = checkers | attacks.BETWEEN[kingpos][core.bitscan(checkers)]
+        else:
+            targets = attacks.MASK64
+            if wantquiets and fromsquares >> kingpos & 1:
+                movelist.extend(self.castlemoves(colour))
+        pins = self.pinnedpieces(colour)
+
+        # The knights, bishops, rooks and queens.
+        pawns = board.pieceboard(pieces.PawnPiece, colour)
+        for index in core.iterbits(own & ~pawns & ~(1 << kingpos) & fromsquares):
+            allowed = self.attacksfrom(board[index], index) & destinations & targets
+            if index in pins:
+                allowed &= pins[index]
+            for endindex in core.iterbits(allowed):
+                if enemy >> endindex & 1:
+                    movelist.append(moves.encode(index, endindex, moves.CAPTURE))
+                else:
+                    movelist.append(moves.encode(index, endindex))
+
+        # The pawns. Pushes to the backline are promotions, so are captures.
+        if colour == core.COLOURS[0]:
+            step = 8; startrank = 0x000000000000FF00; lastrank = 0xFF << 56
+        else:
+            step = -8; startrank = 0x00FF000000000000; lastrank = 0xFF
+        pawnattacks = attacks.PAWN_MASKS[colour]
+        for start in core.iterbits(pawns & fromsquares):
+            allowed = targets
+            if start in pins:
+                allowed &= pins[start]
+            endindex = start + step
+            if not occupied >> endindex & 1:
+                promoting = lastrank >> endindex & 1
+                if allowed >> endindex & 1 and (
+                        wantcaptures if promoting else wantquiets):
+                    self._addpawnmoves(movelist, start, endindex, moves.QUIET)
+                endindex += step
+                if (wantquiets and (1 << start) & startrank
+                        and not occupied >> endindex & 1
+                        and allowed >> endindex & 1):
+                    movelist.append(
+                        moves.encode(start, endindex, moves.DOUBLEPUSH))
+            if wantcaptures:
+                for endindex in core.iterbits(pawnattacks[start] & enemy & allowed):
+                    self._addpawnmoves(movelist, start, endindex, moves.CAPTURE)
+
+        if wantcaptures:
+            movelist.extend(
+                move for move in self._enpassantlegalmoves(colour, kingpos)
+                if fromsquares >> (move & 63) & 1)
+        return movelist
 
-        allmoves = self.onlylegalmoves(colour, allmoves)
-        return allmoves
+    def generatemovelist(self, colour):
+        """Generate all of the legal moves for colour."""
+        return self._generatelegal(colour)
+
+    def generatecaptures(self, colour):
+        """Generate the legal captures and promotions of colour."""
+        return self._generatelegal(colour, CAPTURES)
+
+    def generatequiets(self, colour):
+        """Generate the legal moves of colour that aren't captures or
+        promotions (castling included)."""
+        return self._generatelegal(colour, QUIETS)
+
+    def islegal(self, move, colour):
+        """Determine if move is a legal move for colour, say a move remembered
+        from another position. Only the moves of the piece moving are made."""
+        if move is None or move == moves.NOMOVE:
+            return False
+        start = move & 63
+        if not self.board.colourboard(colour) >> start & 1:
+            return False
+        if moves.istactical(move): kind = CAPTURES
+        else: kind = QUIETS
+        return move in self._generatelegal(colour, kind, 1 << start)
+
+    def mvvlva(self, move):
+        """Scores a capture by Most Valuable Victim - Least Valuable Attacker
+        so the best captures to try first score highest. A promotion scores
+        the value of the piece it promotes to as well."""
+        board = self.board
+        start, end, flags = move & 63, (move >> 6) & 63, move >> 12
+        if flags == moves.ENPASSANT:
+            victim = _ORDERVALUES[pieces.PawnPiece]
+        elif board[end] is not None:
+            victim = _ORDERVALUES[board[end].__class__]
+        else:
+            victim = 0
+        score = 32*victim - _ORDERVALUES[board[start].__class__]
+        if flags & moves.PROMOTION:
+            score += 32*_ORDERVALUES[moves.PROMOTIONPIECES[flags & 3]]
+        return score
+
+    def see(self, move):
+        """Static exchange evaluation: the material the side moving wins (or
+        loses, if negative) when both sides keep capturing on the end square
+        of move, each with its least valuable piece, and either side may stop
+        when carrying on would lose. Sliders lined up behind a capturing piece
+        join in once it has gone (x-rays). Pins and recaptures that promote are
+        ignored."""
+        board = self.board
+        pieceboards = board.pieceboards
+        start, end, flags = move & 63, (move >> 6) & 63, move >> 12
+        occupied = board.occupied ^ (1 << start)
+        if flags == moves.ENPASSANT:
+            gain = [SEEVALUES[0]]
+            occupied ^= 1 << ((start & ~7) | (end & 7))
+        elif board[end] is not None:
+            gain = [_SEEVALUES[board[end].__class__]]
+        else:
+            gain = [0]
+        if flags & moves.PROMOTION:
+            ontarget = _SEEVALUES[moves.PROMOTIONPIECES[flags & 3]]
+            gain[0] += ontarget - SEEVALUES[0]
+        else:
+            ontarget = _SEEVALUES[board[start].__class__]
+
+        colour = core.oppositecolour(board[start].colour)
+        while True:
+            attackers = self.attackersof(end, colour, occupied) & occupied
+            if not attackers:
+                break
+            offset = 0 if colour == core.COLOURS[0] else 6
+            for kind in range(6):
+                attacker = attackers & pieceboards[offset + kind]
+                if attacker:
+                    break
+            # Score the capture as if the piece on the square is lost next.
+            gain.append(ontarget - gain[-1])
+            if max(-gain[-2], gain[-1]) < 0:
+                break  # Neither side can gain from carrying on.
+            ontarget = SEEVALUES[kind]
+            occupied ^= attacker & -attacker
+            colour = core.oppositecolour(colour)
+
+        # Each side stops capturing if it does better by doing so.
+        for ii in range(len(gain) - 1, 0, -1):
+            gain[ii - 1] = -max(-gain[ii - 1], gain[ii])
+        return gain[0]
+
+    def losingcapture(self, move):
+        """Determine if a capture loses material by static exchange evaluation.
+        A piece taking one worth as much or more can't lose, so the exchange is
+        only worked out when it might."""
+        board = self.board
+        flags = move >> 12
+        if flags == moves.ENPASSANT or flags & moves.PROMOTION:
+            return False
+        victim = board[(move >> 6) & 63]
+        if (victim is not None and _SEEVALUES[victim.__class__]
+                >= _SEEVALUES[board[move & 63].__class__]):
+            return False
+        return self.see(move) < 0
+
+
+
+  #####  #######    #     #####  ####### ######
+ #     #    #      # #   #     # #       #     #
+ #          #     #   #  #       #       #     #
+  #####     #    #     # #  #### #####   #     #
+       #    #    ####### #     # #       #     #
+ #     #    #    #     # #     # #       #     #
+  #####     #    #     #  #####  ####### ######
+
+
+class StagedMoveGenerator(object):
+    """Hands out the legal moves of a position a stage at a time, best first.
+
+    The stages are the hash move (the best move found for this position
+    before), then the captures and promotions ordered by MVV-LVA, then the
+    killer moves (quiet moves that caused a cutoff at the same ply elsewhere),
+    the rest of the quiet moves (by their history score, if a table of them
+    is given, indexed by the low 12 bits of the move) and last of all the
+    captures that lose material by static exchange evaluation. A stage is
+    only generated once the moves of the stage before have all been used, so
+    a search that cuts off on the hash move or a capture never generates the
+    quiet moves at all.
+
+    Iterate over an instance to get the moves. The board must be back as it
+    was whenever the next move is asked for.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :stage:     The stage the last move handed out came from.
+    :generated: The number of moves generated so far (not counting the hash
+                move or killers, which are only checked).
+    """
+
+    HASHMOVE, CAPTURES, KILLERS, QUIETS, BADCAPTURES = range(5)
+
+    def __init__(self, generator, colour, hashmove=None, killers=(),
+                 history=None):
+        self.generator = generator
+        self.colour = colour
+        self.hashmove = hashmove
+        self.killers = killers
+        self.history = history
+        self.stage = None
+        self.generated = 0
+        return None
+
+    def __iter__(self):
+        generator, colour = self.generator, self.colour
+        hashmove = self.hashmove
+        if hashmove is not None and generator.islegal(hashmove, colour):
+            self.stage = self.HASHMOVE
+            yield hashmove
+        else:
+            hashmove = None
+
+        self.stage = self.CAPTURES
+        captures = generator.generatecaptures(colour)
+        self.generated += len(captures)
+        captures.sort(key=generator.mvvlva, reverse=True)
+        badcaptures = list()
+        for move in captures:
+            if move == hashmove:
+                continue
+            if generator.losingcapture(move):
+                badcaptures.append(move)  # Try it once the quiet moves fail.
+            else:
+                yield move
+
+        # The killers come from other positions, so are only played if they
+        # are legal quiet moves here too.
+        self.stage = self.KILLERS
+        killers = list()
+        for move in self.killers:
+            if (move is not None and move != hashmove and move not in killers
+                    and not moves.istactical(move)
+                    and generator.islegal(move, colour)):
+                killers.append(move)
+                yield move
+
+        self.stage = self.QUIETS
+        quiets = generator.generatequiets(colour)
+        self.generated += len(quiets)
+        history = self.history
+        if history is not None:
+            quiets.sort(key=lambda move: history[move & 4095], reverse=True)
+        for move in quiets:
+            if move != hashmove and move not in killers:
+                yield move
+
+        self.stage = self.BADCAPTURES
+        for move in badcaptures:
+            yield move
+        return
@@ -0,0 +1,133 @@
+# DESCRIPTION: The compact integer encoding of moves, with the helpers to build
+# and read them.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# A move is a single integer of 16 bits:
+#
+#     bits 0-5    the start square index
+#     bits 6-11   the end square index
+#     bits 12-15  the flags, which say what kind of move it is
+#
+# The flags are laid out so the common questions are one bit test: bit 2 (4)
+# is set for every capture and bit 3 (8) for every promotion, with the low two
+# bits of a promotion naming the piece. Castling is encoded as the king's move;
+# the rook's move follows from which side it is.
+#
+#      0  quiet move                  8  knight promotion
+#      1  double pawn push            9  bishop promotion
+#      2  right (king side) castle   10  rook promotion
+#      3  left (queen side) castle   11  queen promotion
+#      4  capture                 12-15  the same promotions, capturing
+#      5  en passant capture
+#
+# Integer moves are cheap to make, compare and hash, and pack straight into the
+# transposition table and history arrays.
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+from lib import core, pieces
+
+QUIET, DOUBLEPUSH = 0, 1
+CASTLERIGHT, CASTLELEFT = 2, 3
+CAPTURE, ENPASSANT = 4, 5
+PROMOTION, PROMOTIONCAPTURE = 8, 12
+
+# The pieces a pawn can promote to, in the order of the promotion flags.
+PROMOTIONPIECES = (
+    pieces.KnightPiece, pieces.BishopPiece, pieces.RookPiece, pieces.QueenPiece)
+_PROMOTIONINDEX = dict((piece, ii) for ii, piece in enumerate(PROMOTIONPIECES))
+
+# No move at all. It can never be played since a1 to a1 isn't a move.
+NOMOVE = 0
+
+
+def encode(start, end, flags=QUIET):
+    """Builds a move from its start and end square indices and flags."""
+    return start | (end << 6) | (flags << 12)
+
+def promotionflags(promoteto, capture=False):
+    """The flags of a promotion to the piece class promoteto."""
+    try:
+        flags = PROMOTION | _PROMOTIONINDEX[promoteto]
+    except KeyError:
+        raise core.UnknownPieceError("A pawn can't promote to %r." % promoteto)
+    if capture:
+        flags |= CAPTURE
+    return flags
+
+def decode(move):
+    """Splits a move into (start, end, flags)."""
+    return move & 63, (move >> 6) & 63, move >> 12
+
+def movestart(move):
+    """The square the move starts on."""
+    return move & 63
+
+def moveend(move):
+    """The square the move ends on."""
+    return (move >> 6) & 63
+
+def moveflags(move):
+    """The flags of the move."""
+    return move >> 12
+
+def iscapture(move):
+    """Whether the move captures a piece, en passant included. A promotion only
+    counts if it captures too (see istactical for every promotion)."""
+    return bool(move & (CAPTURE << 12))
+
+def ispromotion(move):
+    """Whether the move promotes a pawn."""
+    return bool(move & (PROMOTION << 12))
+
+def istactical(move):
+    """Whether the move is a capture or a promotion, the moves that change the
+    material on the board. Every other move is a quiet move."""
+    return bool(move & ((CAPTURE | PROMOTION) << 12))
+
+def iscastle(move):
+    """Whether the move is a castle (of either side)."""
+    return (move >> 12) in (CASTLERIGHT, CASTLELEFT)
+
+def isenpassant(move):
+    """Whether the move is an en passant capture."""
+    return (move >> 12) == ENPASSANT
+
+def isdoublepush(move):
+    """Whether the move pushes a pawn two squares."""
+    return (move >> 12) == DOUBLEPUSH
+
+def promotionpiece(move):
+    """The piece class the move promotes to, or None if it isn't a promotion."""
+    if move & (PROMOTION << 12):
+        return PROMOTIONPIECES[(move >> 12) & 3]
+    return None
+
+def castlingrook(move):
+    """The (start, end) squares of the rook that moves with a castling move."""
+    start, end = move & 63, (move >> 6) & 63
+    if (move >> 12) == CASTLERIGHT:
+        return (start | 7), (start + end) // 2
+    return (start & ~7), (start + end) // 2
+
+def movename(move):
+    """Names a move by its start and end squares plus any promotion piece, as
+    in 'e2e4' or 'e7e8q'. Castling is named by the king's move."""
+    name = core.squarename(move & 63) + core.squarename((move >> 6) & 63)
+    promoteto = promotionpiece(move)
+    if promoteto is not None:
+        name += promoteto('white').notationsymbol.lower()
+    return name
+
+def findmove(movelist, start, end, promoteto=None):
+    """Finds the move in movelist going from start to end (and promoting to
+    promoteto, if it is a promotion). Returns None if there is no such move."""
+    for move in movelist:
+        if move & 63 == start and (move >> 6) & 63 == end:
+            if promoteto is None or promotionpiece(move) is promoteto:
+                return move
+    return None
@@ -0,0 +1,171 @@
+# DESCRIPTION: Decides which moves the search tries first, and keeps count of
+# how well it chose.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# Alpha-beta only saves work when the best move is tried first: with perfect
+# ordering it searches about the square root of the nodes of a plain minimax,
+# with the worst ordering it saves nothing at all. The moves are tried as:
+#
+#     1. the hash move, the best move found for the position before;
+#     2. captures and promotions that don't lose material, by MVV-LVA;
+#     3. the killer moves, two quiet moves per ply that caused a cutoff in a
+#        sibling position and so probably will here too;
+#     4. the other quiet moves, by their history score, which adds up how
+#        often (and how deep) each from/to pair caused a cutoff anywhere;
+#     5. the captures that lose material.
+#
+# The fraction of cutoffs made by the first move tried is the usual measure of
+# how well this works; above 90% is good.
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+from lib import movegenerator, moves
+
+# The scores sortmoves gives to each kind of move, far enough apart that the
+# MVV-LVA and history scores within a kind can't overlap the next.
+_HASHSCORE = 1 << 30
+_CAPTURESCORE = 1 << 28
+_KILLERSCORE = 1 << 26
+_BADCAPTURESCORE = -(1 << 26)
+
+
+class MoveOrderer(object):
+    """Remembers the killer moves and history scores of a search and uses
+    them to order the moves of each position.
+
+    The history table is a 'butterfly' table: one score for each pair of start
+    and end squares (4096 of them), indexed by the low 12 bits of a move. The
+    scores are halved when one grows past HISTORYMAX, and at the start of each
+    search, so old results count for less.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :killers:          The two killer moves of each ply (most recent first).
+    :history:          The butterfly history scores.
+    :cutoffs:          The number of positions that failed high.
+    :firstcutoffs:     The number of those where the first move did it.
+    :stagecutoffs:     The cutoffs counted by the stage of the move that made
+                       them (indexed as the StagedMoveGenerator stages).
+    :cutoffmovesum:    The sum of the move numbers (from 1) that made cutoffs.
+
+    PUBLIC METHODS
+    ===============
+    :staged:           Makes a StagedMoveGenerator for a position.
+    :scoremove:        Scores a move for sortmoves.
+    :sortmoves:        Sorts a whole move list best first.
+    :cutoff:           Records a move that failed high.
+    :newsearch:        Clears the killers and ages the history.
+    :clear:            Forgets everything, statistics included.
+    :firstcutoffrate:  The fraction of cutoffs made by the first move.
+    :statistics:       The ordering statistics as a dict.
+    """
+
+    HISTORYMAX = 1 << 20
+
+    def __init__(self, maxply=100):
+        self.maxply = maxply
+        self.clear()
+        return None
+
+    def clear(self):
+        """Forgets the killers, history and statistics."""
+        self.killers = [[None, None] for ii in range(self.maxply + 1)]
+        self.history = [0] * 4096
+        self.resetstatistics()
+        return None
+
+    def resetstatistics(self):
+        """Starts counting the ordering statistics from nothing."""
+        self.cutoffs = 0
+        self.firstcutoffs = 0
+        self.cutoffmovesum = 0
+        self.stagecutoffs = [0] * 5
+        return None
+
+    def newsearch(self):
+        """Prepares for a new search. The killers are for positions that are
+        gone, but the history still says something, so is only aged."""
+        for slots in self.killers:
+            slots[0] = slots[1] = None
+        self._agehistory()
+        self.resetstatistics()
+        return None
+
+    def _agehistory(self):
+        """Halves every history score (in place, as it is shared with the
+        staged move generators)."""
+        history = self.history
+        for index in range(4096):
+            history[index] >>= 1
+        return None
+
+    def staged(self, generator, colour, ply, hashmove=None):
+        """The moves of colour in the position of generator, best first and
+        generated a stage at a time."""
+        return movegenerator.StagedMoveGenerator(
+            generator, colour, hashmove, tuple(self.killers[ply]), self.history)
+
+    def scoremove(self, generator, move, ply, hashmove=None):
+        """Scores a move so that better moves score higher."""
+        if move == hashmove:
+            return _HASHSCORE
+        if moves.istactical(move):
+            if generator.losingcapture(move):
+                return _BADCAPTURESCORE + generator.mvvlva(move)
+            return _CAPTURESCORE + generator.mvvlva(move)
+        if move in self.killers[ply]:
+            # The first killer is the more recent, so try it first.
+            return _KILLERSCORE + (move == self.killers[ply][0])
+        return self.history[move & 4095]
+
+    def sortmoves(self, generator, movelist, ply, hashmove=None):
+        """Sorts movelist in place, best first, and returns it."""
+        movelist.sort(
+            key=lambda move: self.scoremove(generator, move, ply, hashmove),
+            reverse=True)
+        return movelist
+
+    def cutoff(self, move, ply, depth, movenumber=1, stage=None):
+        """Records that move failed high at ply with depth left to search, as
+        the movenumber-th move tried (from 1). A quiet move becomes the first
+        killer of the ply and its history score grows with the depth, since a
+        cutoff near the root saves more work."""
+        self.cutoffs += 1
+        self.cutoffmovesum += movenumber
+        if movenumber == 1:
+            self.firstcutoffs += 1
+        if stage is not None:
+            self.stagecutoffs[stage] += 1
+
+        if moves.istactical(move):
+            return None
+        slots = self.killers[ply]
+        if slots[0] != move:
+            slots[1] = slots[0]
+            slots[0] = move
+        index = move & 4095
+        self.history[index] += depth*depth
+        if self.history[index] > self.HISTORYMAX:
+            self._agehistory()
+        return None
+
+    def firstcutoffrate(self):
+        """The fraction of cutoffs made by the first move tried."""
+        if not self.cutoffs:
+            return 0.0
+        return float(self.firstcutoffs) / self.cutoffs
+
+    def statistics(self):
+        """The ordering statistics of the search so far."""
+        stagenames = ('hashmove', 'captures', 'killers', 'quiets', 'badcaptures')
+        return {
+            'cutoffs': self.cutoffs,
+            'firstcutoffrate': self.firstcutoffrate(),
+            'averagecutoffmove': (float(self.cutoffmovesum) / self.cutoffs
+                                  if self.cutoffs else 0.0),
+            'stagecutoffs': dict(zip(stagenames, self.stagecutoffs)),
+        }
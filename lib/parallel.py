@@ -0,0 +1,291 @@
+# DESCRIPTION: Searches a position with several processes at once, to use
+# every core of the machine.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# Python threads can't run Python code at the same time, so the work is split
+# between processes instead.
+#
+# Lazy SMP runs the same iteratively deepened search in every process, with
+# nothing shared but the transposition table. The processes soon drift apart
+# (every other helper aims a ply deeper, and they all race to fill the table
+# first) so each finds entries the others stored and skips work it would have
+# done alone. When the first process finishes its last iteration the helpers
+# are stopped and the deepest completed result of any of them is taken.
+#
+# The table is made with multiprocessing.RawArray, shared memory without a
+# lock (the Python 2 stand-in for multiprocessing.shared_memory); its entries
+# are checked against their key on every probe instead of being locked.
+#
+# Root splitting is for fixed-depth analysis, where finishing sooner matters
+# more than searching deeper. The root moves are shared out between a pool of
+# processes, each searching the whole subtree of one move at a time. The
+# first (best ordered) move is searched on its own to get a good alpha, then
+# the rest are handed out one by one, so a process that finishes a small
+# subtree takes the next move straight away rather than waiting for the rest.
+# The best score found so far is kept in shared memory and every subtree is
+# searched against the latest one, so each result either beats it (and is
+# exact) or proves the move no better. The root is iteratively deepened so
+# each iteration can order the moves by the scores of the last.
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import multiprocessing, Queue
+from lib import chessboard, engine, ordering, transposition
+
+
+class _SharedStop(object):
+    """Stands in for the time manager of a helper process, so it stops when
+    the main one is done as well as when it runs out of time."""
+
+    def __init__(self, stopevent, timemanager=None):
+        self.stopevent = stopevent
+        self.timemanager = timemanager
+        return None
+
+    def start(self):
+        """Starts the clock of the real time manager, if there is one."""
+        if self.timemanager is not None:
+            self.timemanager.start()
+        return None
+
+    def timeup(self, nodes):
+        """Returns true if the search must stop now. The event is only read
+        every 1024 nodes since it means a system call."""
+        if self.timemanager is not None and self.timemanager.timeup(nodes):
+            return True
+        return not nodes & 1023 and self.stopevent.is_set()
+
+    def canstartiteration(self):
+        """Returns true if there is time to search another ply deeper."""
+        if self.stopevent.is_set():
+            return False
+        if self.timemanager is not None:
+            return self.timemanager.canstartiteration()
+        return True
+
+
+def _lazysmpworker(index, board, colour, depth, timemanager, table, options,
+                   stopevent, results):
+    """Runs one search process of Lazy SMP, sending back its deepest completed
+    iteration as ('result', index, result) and then ('done', index, nodes,
+    qnodes), even if it fails."""
+    searcher = None
+    try:
+        searcher = engine.ChessEngine(transpositiontable=table, **options)
+        result = searcher.search(
+            board, colour, depth, _SharedStop(stopevent, timemanager))
+        if result.depth > 0:
+            results.put(('result', index, result))
+    finally:
+        if searcher is None:
+            results.put(('done', index, 0, 0))
+        else:
+            results.put(('done', index, searcher.nodes, searcher.qnodes))
+    return None
+
+
+# The search and shared alpha of each root splitting process, set up by
+# _rootsplitinit when the pool starts it.
+_searcher = None
+_sharedalpha = None
+
+
+def _rootsplitinit(options, hashsize, sharedalpha):
+    """Sets up a process of the root splitting pool."""
+    global _searcher, _sharedalpha
+    _searcher = engine.ChessEngine(hashsize=hashsize, **options)
+    _sharedalpha = sharedalpha
+    return None
+
+def _searchsubtree(task):
+    """Searches the subtree of one root move against the best score found so
+    far, raising that score if this move beats it. Returns the result and the
+    alpha it was searched with: the score is only exact if it is above that
+    alpha, and otherwise just proves the move no better."""
+    board, colour, move, depth = task
+    alpha = _sharedalpha.value
+    result = _searcher.searchmove(board, colour, move, depth, alpha)
+    if result.score > alpha:
+        with _sharedalpha.get_lock():
+            if result.score > _sharedalpha.value:
+                _sharedalpha.value = result.score
+    return result, alpha
+
+
+class ParallelEngine(engine.ChessEngine):
+    """A chess engine that searches with several processes.
+
+    Search with Lazy SMP: 'processes' searches of the same position run at
+    once, sharing one transposition table (of 'hashsize' megabytes) in shared
+    memory. The first process searches to the depth asked for and every other
+    helper one ply deeper. The other options are those of ChessEngine and are
+    given to every process.
+
+    With 'rootsplit' the root moves are split between a pool of 'processes'
+    processes instead, each with a table of its own (see the note above).
+    This only searches to a fixed depth, so a time manager can only be given
+    to a Lazy SMP search.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :processes:     The number of search processes.
+    :resultdepths:  The depth completed by each process in the last search.
+    """
+
+    ROOTSPLITTABLESIZE = 1.0 / 1024  # Megabytes, when root splitting.
+    POLLINTERVAL = 0.1  # Seconds between checks that the processes are alive.
+
+    def __init__(self, processes=None, hashsize=16, rootsplit=False, **options):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if processes < 1:
+            raise ValueError("The search needs at least one process.")
+        if hashsize <= 0:
+            # Checked here as well, since the pool processes are the first to
+            # make a table of this size when root splitting.
+            raise ValueError("The table needs a positive amount of memory.")
+        if rootsplit:
+            # Each pool process has a table of its own, so this one is only
+            # used to score a root without moves.
+            table = transposition.TranspositionTable(self.ROOTSPLITTABLESIZE)
+        else:
+            table = transposition.SharedTranspositionTable(hashsize)
+        engine.ChessEngine.__init__(
+            self, hashsize=hashsize, transpositiontable=table, **options)
+        self.processes = processes
+        self.rootsplit = rootsplit
+        self.hashsize = hashsize
+        self.options = options
+        self.resultdepths = list()
+        return None
+
+    def search(self, board, colour, depth=None, timemanager=None):
+        """Finds the best move for colour, searching with every process. The
+        arguments are as for ChessEngine.search."""
+        if depth is None:
+            if timemanager is None:
+                raise ValueError("Give a depth or a time manager for the search.")
+            depth = self.MAXPLY
+        elif depth < 1:
+            raise ValueError("The search must be at least one ply deep.")
+        if not isinstance(board, chessboard.BitBoard):
+            board = chessboard.BitBoard.fromboard(board)
+        if self.rootsplit:
+            if timemanager is not None:
+                raise ValueError("Root splitting only searches to a fixed depth.")
+            return self._rootsplit(board, colour, depth)
+        return self._lazysmp(board, colour, depth, timemanager)
+
+    def _rootsplit(self, board, colour, depth):
+        """Searches the root moves in the process pool, one iteration deeper
+        at a time, and merges their results."""
+        self.resetcounters()
+        generator = self.movegenerator(board)
+        movelist = ordering.MoveOrderer(0).sortmoves(
+            generator, generator.generatemovelist(colour), 0)
+        if not movelist:
+            # Checkmate or stalemate: there is nothing to split.
+            return engine.ChessEngine.search(self, board, colour, 1)
+
+        sharedalpha = multiprocessing.Value('l', -self.INFINITY)
+        pool = multiprocessing.Pool(
+            self.processes, _rootsplitinit,
+            (self.options, self.hashsize, sharedalpha))
+        try:
+            for iterationdepth in range(1, depth + 1):
+                sharedalpha.value = -self.INFINITY
+                tasks = [(board, colour, move, iterationdepth)
+                         for move in movelist]
+                # The first move alone sets alpha for the rest.
+                best, alpha = pool.apply(_searchsubtree, (tasks[0],))
+                self._addnodes(best)
+                scores = {best.move: best.score}
+                for result, alpha in pool.imap_unordered(
+                        _searchsubtree, tasks[1:], chunksize=1):
+                    self._addnodes(result)
+                    scores[result.move] = result.score
+                    # A score at or below the alpha it was searched with is
+                    # only a bound, which mustn't displace an exact score.
+                    if result.score > alpha and result.score > best.score:
+                        best = result
+                # The next iteration tries the best moves of this one first.
+                movelist.sort(key=lambda move: scores[move], reverse=True)
+                if abs(best.score) >= self.MATESCORE - self.MAXPLY:
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+
+        return engine.SearchResult(best.move, best.score, best.pv,
+                                   iterationdepth, self.nodes, self.qnodes)
+
+    def _addnodes(self, result):
+        """Adds the nodes of a subtree to the count of the search."""
+        self.nodes += result.nodes
+        self.qnodes += result.qnodes
+        return None
+
+    def _lazysmp(self, board, colour, depth, timemanager):
+        """Runs the Lazy SMP search and picks the deepest result."""
+        self.resetcounters()
+        self.transpositiontable.newsearch()
+        stopevent = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        workers = list()
+        for index in range(self.processes):
+            workerdepth = min(depth + (index % 2), self.MAXPLY)
+            worker = multiprocessing.Process(
+                target=_lazysmpworker,
+                args=(index, board, colour, workerdepth, timemanager,
+                      self.transpositiontable, self.options, stopevent, results))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        # The first process is the main search: once it is done, so are the
+        # helpers. Its results win ties, being the one that searched the
+        # depth it was asked to.
+        best = dict()
+        running = set(range(self.processes))
+        try:
+            while running:
+                try:
+                    message = results.get(timeout=self.POLLINTERVAL)
+                except Queue.Empty:
+                    # A process that died without saying it was done (killed,
+                    # say) never will, so stop waiting for it.
+                    for index in list(running):
+                        if not workers[index].is_alive() and results.empty():
+                            running.discard(index)
+                            if index == 0:
+                                stopevent.set()
+                    continue
+                if message[0] == 'result':
+                    index, result = message[1], message[2]
+                    best[index] = result
+                else:
+                    index, nodes, qnodes = message[1:]
+                    running.discard(index)
+                    self.nodes += nodes
+                    self.qnodes += qnodes
+                    if index == 0:
+                        stopevent.set()
+        finally:
+            stopevent.set()
+            for worker in workers:
+                worker.join()
+
+        self.resultdepths = [best[index].depth if index in best else 0
+                             for index in range(self.processes)]
+        if not best:
+            # Stopped before even one ply was searched.
+            return engine.ChessEngine.search(
+                self, board, colour, 1, engine.TimeManager(maxnodes=1))
+        index = max(best, key=lambda index: (best[index].depth, -index))
+        result = best[index]
+        result.nodes, result.qnodes = self.nodes, self.qnodes
+        return result
@@ -0,0 +1,174 @@
+# DESCRIPTION: Counts the leaf nodes of the move tree to check the move
+# generator is right (and to time it).
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# Perft (performance test) walks every legal move down to a fixed depth and
+# counts the positions reached. The counts for the positions in POSITIONS are
+# well known, so any difference means the move generator is wrong somewhere.
+# Dividing the count by the root moves narrows down which move is at fault.
+#
+# Run from the top of the project with:
+#     python -m lib.perft --depth 3                    (the starting position)
+#     python -m lib.perft --position kiwipete --depth 2 --divide
+#     python -m lib.perft --fen "<fen string>" --depth 2
+#     python -m lib.perft --suite --depth 3            (check every position)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import argparse, sys, time
+from lib import chessboard, core, movegenerator, moves
+
+# The reference positions as (name, fen, counts) where counts[n] is the number
+# of leaf nodes at depth n+1.
+POSITIONS = (
+    ('startpos', chessboard.STARTFEN,
+     (20, 400, 8902, 197281, 4865609)),
+    ('kiwipete',
+     'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     (48, 2039, 97862, 4085603)),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     (14, 191, 2812, 43238, 674624)),
+    ('position4',
+     'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     (6, 264, 9467, 422333)),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     (44, 1486, 62379, 2103487)),
+    ('position6',
+     'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     (46, 2079, 89890, 3894594)),
+)
+
+
+def setupposition(fen):
+    """Returns a bitboard set up from fen and the colour to move."""
+    board = chessboard.BitBoard()
+    colour = board.setupfromfen(fen)
+    return board, colour
+
+def perft(board, depth, colour):
+    """Counts the leaf nodes of the legal move tree depth plies deep, with
+    colour to move. The board is left as it was."""
+    if depth <= 0:
+        return 1
+    generator = movegenerator.MoveGenerator(board)
+    return _perft(generator, generator.board, depth, colour)
+
+def _perft(generator, board, depth, colour):
+    """The recursion of perft, sharing one move generator."""
+    movelist = generator.generatemovelist(colour)
+    if depth == 1:
+        return len(movelist)  # The moves are legal, so no need to play them.
+
+    othercolour = core.oppositecolour(colour)
+    nodes = 0
+    for move in movelist:
+        board.makemove(move)
+        try:
+            nodes += _perft(generator, board, depth - 1, othercolour)
+        finally:
+            board.unmakemove()
+    return nodes
+
+def divide(board, depth, colour):
+    """Counts the leaf nodes below each root move, as a list of (move, nodes)
+    pairs in the order the moves were generated."""
+    generator = movegenerator.MoveGenerator(board)
+    board = generator.board
+    othercolour = core.oppositecolour(colour)
+    results = list()
+    for move in generator.generatemovelist(colour):
+        board.makemove(move)
+        try:
+            results.append((move, perft(board, depth - 1, othercolour)))
+        finally:
+            board.unmakemove()
+    return results
+
+def timedperft(board, depth, colour):
+    """Runs perft and returns (nodes, seconds, nodes per second)."""
+    starttime = time.time()
+    nodes = perft(board, depth, colour)
+    seconds = time.time() - starttime
+    return nodes, seconds, (nodes / seconds if seconds > 0 else float(nodes))
+
+def runsuite(depth, positions=POSITIONS, output=sys.stdout):
+    """Checks the perft counts of each reference position up to depth (or its
+    deepest known count). Returns True if every count was right."""
+    allpassed = True
+    for name, fen, counts in positions:
+        board, colour = setupposition(fen)
+        for ply in range(1, min(depth, len(counts)) + 1):
+            nodes, seconds, nps = timedperft(board, ply, colour)
+            passed = nodes == counts[ply - 1]
+            allpassed = allpassed and passed
+            output.write('%-10s depth %i: %10i nodes (expected %10i) %s '
+                         '%8.2fs %10.0f nodes/s\n' % (
+                             name, ply, nodes, counts[ply - 1],
+                             'ok  ' if passed else 'FAIL', seconds, nps))
+    return allpassed
+
+
+ #     #    #    ### #     #
+ ##   ##   # #    #  ##    #
+ # # # #  #   #   #  # #   #
+ #  #  # #     #  #  #  #  #
+ #     # #######  #  #   # #
+ #     # #     #  #  #    ##
+ #     # #     # ### #     #
+
+
+def main(arguments=None):
+    """The command line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Counts the leaf nodes of the move tree (perft).")
+    parser.add_argument('--depth', type=int, default=3,
+                        help="how many plies deep to count (default 3)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--fen', help="the position to count from")
+    source.add_argument('--position', default='startpos',
+                        choices=[name for name, fen, counts in POSITIONS],
+                        help="a reference position to count from")
+    source.add_argument('--suite', action='store_true',
+                        help="check the counts of every reference position")
+    parser.add_argument('--divide', action='store_true',
+                        help="show the count below each root move")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.suite:
+        return 0 if runsuite(arguments.depth) else 1
+
+    if arguments.fen:
+        fen, counts = arguments.fen, ()
+    else:
+        fen, counts = [(fen, counts) for name, fen, counts in POSITIONS
+                       if name == arguments.position][0]
+    board, colour = setupposition(fen)
+
+    starttime = time.time()
+    if arguments.divide:
+        results = divide(board, arguments.depth, colour)
+        for move, nodes in sorted(
+                results, key=lambda result: moves.movename(result[0])):
+            print '%s: %i' % (moves.movename(move), nodes)
+        nodes = sum(nodes for move, nodes in results)
+        print '\nMoves: %i' % len(results)
+    else:
+        nodes = perft(board, arguments.depth, colour)
+    seconds = time.time() - starttime
+
+    print 'Nodes: %i' % nodes
+    print 'Time: %.3fs (%.0f nodes/s)' % (
+        seconds, nodes / seconds if seconds > 0 else float(nodes))
+    if len(counts) >= arguments.depth:
+        expected = counts[arguments.depth - 1]
+        print 'Expected: %i (%s)' % (expected, 'ok' if nodes == expected else 'FAIL')
+        return 0 if nodes == expected else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# DESCRIPTION: The values of the pieces and of where they stand, which the
+# board keeps summed up as it changes.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# NOTE:
+# ================
+# A piece-square table gives a bonus (or penalty) to a piece for the square it
+# stands on: knights in the centre, rooks on the seventh rank, the king tucked
+# away behind its pawns. The tables are laid out as the board is seen from
+# white's side, rank 8 at the top, and are mirrored for black. The values are
+# on the same scale as the material, where a pawn is worth 1000.
+#
+# Each piece has a middlegame and an endgame table, since where a piece wants
+# to be changes as the board empties (the king most of all, which should hide
+# in the middlegame but come to the centre in the endgame). The two scores are
+# blended by the game phase, which counts the pieces left on the board:
+#
+#     knight, bishop = 1    rook = 2    queen = 4    (24 at the start)
+#
+#     score = (middlegame*phase + endgame*(24 - phase)) / 24
+#
+# The board adds up the material, the two table scores and the phase of every
+# piece as they are placed and removed (see ChessBoard._putpiece), so the
+# evaluation only has to read and blend the totals rather than look at every
+# square. The tables are read from TABLES_FILE when this module is imported,
+# so they can be changed without touching the code.
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import os
+from lib import core, pieces
+
+PIECEVALUES = {
+    pieces.PawnPiece: 1000, pieces.KnightPiece: 2500,
+    pieces.BishopPiece: 2500, pieces.RookPiece: 5000,
+    pieces.QueenPiece: 9000, pieces.KingPiece: 100000
+}
+
+# What each piece adds to the game phase, and the phase of a full board.
+PHASEWEIGHTS = {
+    pieces.PawnPiece: 0, pieces.KnightPiece: 1,
+    pieces.BishopPiece: 1, pieces.RookPiece: 2,
+    pieces.QueenPiece: 4, pieces.KingPiece: 0
+}
+MAXPHASE = 24
+
+MIDDLEGAME, ENDGAME = 'middlegame', 'endgame'
+TABLES_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'piecesquare.txt')
+
+_PIECENAMES = {
+    'pawn': pieces.PawnPiece, 'knight': pieces.KnightPiece,
+    'bishop': pieces.BishopPiece, 'rook': pieces.RookPiece,
+    'queen': pieces.QueenPiece, 'king': pieces.KingPiece
+}
+
+
+def readtables(lines):
+    """Reads piece-square tables from the lines of a tables file. Each table
+    is headed by a line naming the piece and the stage ('knight endgame'),
+    followed by its 64 values. Returns a dict from (piece class, stage) to the
+    table, and raises a ValueError unless every table is there in full."""
+    tables, current = dict(), None
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        words = line.split()
+        if words[0] in _PIECENAMES:
+            if len(words) != 2 or words[1] not in (MIDDLEGAME, ENDGAME):
+                raise ValueError("Bad table heading %r." % line)
+            current = list()
+            tables[_PIECENAMES[words[0]], words[1]] = current
+        elif current is None:
+            raise ValueError("Values before the first table heading.")
+        else:
+            current.extend(int(word) for word in words)
+
+    for piecetype in _PIECENAMES.values():
+        for stage in (MIDDLEGAME, ENDGAME):
+            if len(tables.get((piecetype, stage), ())) != 64:
+                raise ValueError("The %s %s table doesn't have 64 values." % (
+                    piecetype.__name__, stage))
+    return dict((name, tuple(table)) for name, table in tables.items())
+
+def loadtables(filename=TABLES_FILE):
+    """Reads the piece-square tables from a tables file."""
+    with open(filename) as tablesfile:
+        return readtables(tablesfile)
+
+def squarevalues(table, colour):
+    """Turns a table laid out from white's side into the values of each square
+    index (a1 is 0, h8 is 63) for a piece of colour."""
+    if colour == core.COLOURS[0]:
+        return tuple(table[(7 - index // 8)*8 + index % 8] for index in range(64))
+    return tuple(table[index] for index in range(64))
+
+def taper(middlegame, endgame, phase):
+    """Blends a middlegame and an endgame score by the game phase. Promotions
+    can take the phase past MAXPHASE, which counts as a full middlegame."""
+    phase = min(phase, MAXPHASE)
+    return (middlegame*phase + endgame*(MAXPHASE - phase)) // MAXPHASE
+
+
+TABLES = loadtables()
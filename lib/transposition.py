@@ -0,0 +1,243 @@
+# DESCRIPTION: The transposition table, which remembers the results of searched
+# positions so they don't need to be searched again.
+
+# 50726f6772616d6d696e6720697320627265616b696e67206f66206f6e652062696720696d706f
+# 737369626c65207461736b20696e746f207365766572616c207665727920736d616c6c20706f73
+# 7369626c65207461736b732e
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+import ctypes, multiprocessing
+from array import array
+from lib import moves
+
+# The types of bound an entry's score can be.
+EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2
+
+# The entries are packed into arrays of unsigned 64-bit integers. The typecode
+# for that is 'L' on most 64-bit systems, but only 'Q' on others.
+_TYPECODE = 'L' if array('L').itemsize == 8 else 'Q'
+
+# Layout of the data word of an entry (from the least significant bit):
+#    16 bits of move, 8 bits of depth, 2 bits of bound, 6 bits of generation
+#    and 32 bits of score (offset so it is never negative). Moves are already
+#    16-bit integers (see the moves module) and no move is stored as NOMOVE.
+_SCOREOFFSET = 1 << 31
+
+
+class TranspositionTable(object):
+    """A fixed-size hash table of searched positions.
+
+    The table is split into buckets of two entries each, indexed by the key of
+    the position. The first entry of a bucket is depth-preferred: it is only
+    replaced by a search at least as deep (or once it is from an older search).
+    The second entry is always replaced, so recent results are never lost.
+
+    Each entry takes 16 bytes (the key plus a packed data word), so the number
+    of entries is set by the memory budget given in megabytes. The key is
+    stored XORed with the data word, so an entry whose two words were written
+    by different stores (which can happen when processes share the table, see
+    SharedTranspositionTable) fails the check on probing, rather than giving
+    the data of one position to another.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :hits:    The number of probes that found their position.
+    :misses:  The number of probes that didn't.
+    :stores:  The number of entries written.
+
+    PUBLIC METHODS
+    ===============
+    :probe:     Looks up a key, returning (depth, bound, score, move) or None.
+    :store:     Saves the result of a search.
+    :newsearch: Marks the start of a new search, aging the stored entries.
+    :clear:     Empties the table and resets the counters.
+    :resize:    Changes the memory budget (which clears the table).
+    :hitrate:   The fraction of probes that were hits.
+    """
+
+    ENTRYSIZE = 16  # Bytes per entry.
+    BUCKETSIZE = 2  # Entries per bucket.
+
+    def __init__(self, sizemb=16):
+        self.resize(sizemb)
+        return None
+
+    def __len__(self):
+        """The number of entries the table can hold."""
+        return len(self._keys)
+
+    def resize(self, sizemb):
+        """Sets the memory budget of the table in megabytes."""
+        if sizemb <= 0:
+            raise ValueError("The table needs a positive amount of memory.")
+        self.buckets = max(
+            1, int(sizemb * 1024 * 1024) // (self.ENTRYSIZE * self.BUCKETSIZE))
+        self.clear()
+        return None
+
+    def clear(self):
+        """Empties the table and resets the counters."""
+        self._allocate(self.buckets * self.BUCKETSIZE)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        return None
+
+    def _allocate(self, size):
+        """Makes new, empty arrays of keys and data words."""
+        self._keys = array(_TYPECODE, [0]) * size
+        self._data = array(_TYPECODE, [0]) * size
+        return None
+
+    def newsearch(self):
+        """Starts a new search so the old entries can be replaced first."""
+        self.generation = (self.generation + 1) & 63
+        return None
+
+    def hitrate(self):
+        """The fraction of probes that found their position."""
+        probes = self.hits + self.misses
+        return float(self.hits) / probes if probes else 0.0
+
+    def probe(self, key):
+        """Finds the entry for key as (depth, bound, score, move) or None."""
+        index = (key % self.buckets) * self.BUCKETSIZE
+        for slot in (index, index + 1):
+            data = self._data[slot]
+            if self._keys[slot] ^ data == key:
+                if data:
+                    self.hits += 1
+                    return ((data >> 16) & 255, (data >> 24) & 3,
+                            (data >> 32) - _SCOREOFFSET,
+                            (data & 0xFFFF) or None)
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move=None):
+        """Saves the result of a search of the position with key."""
+        index = (key % self.buckets) * self.BUCKETSIZE
+        depth = min(max(depth, 0), 255)
+        data = ((move or moves.NOMOVE) | (depth << 16) | (bound << 24)
+                | (self.generation << 26) | ((score + _SCOREOFFSET) << 32))
+
+        # Use the depth-preferred entry if the new result is at least as deep,
+        # is for the same position, or the old one is from an older search.
+        olddata = self._data[index]
+        if (self._keys[index] ^ olddata == key or not olddata
+                or depth >= (olddata >> 16) & 255
+                or (olddata >> 26) & 63 != self.generation):
+            slot = index
+        else:
+            slot = index + 1
+        # Keep the old best move if the new result doesn't have one.
+        olddata = self._data[slot]
+        if move is None and self._keys[slot] ^ olddata == key:
+            data |= olddata & 0xFFFF
+        self._keys[slot] = key ^ data
+        self._data[slot] = data
+        self.stores += 1
+        return None
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """A transposition table in shared memory, which every process started
+    after it is made (and given it) reads and writes as one table.
+
+    Nothing is locked. Two processes can store to the same entry at once and
+    leave the key of one with the data of the other, but since the key is
+    stored XORed with its data such a torn entry no longer matches either key
+    and is just a miss. The counters and generation are each process's own.
+    """
+
+    def _allocate(self, size):
+        """Makes new, empty arrays in shared memory."""
+        self._keys = multiprocessing.RawArray(ctypes.c_uint64, size)
+        self._data = multiprocessing.RawArray(ctypes.c_uint64, size)
+        return None
+
+
+class PawnHashTable(object):
+    """A fixed-size hash table of pawn structures, indexed by the pawn key of
+    the board (see ChessBoard.computepawnkey).
+
+    The pawns rarely change from one position of the search to the next, so
+    almost every evaluation finds its pawn structure here instead of working
+    it out again. Each entry holds the pawn-structure score, the passed pawns
+    of each side as bitboards and the files that hold each side's pawns as
+    8-bit masks (bit n for file n). An entry is always replaced by the newest
+    structure with the same index.
+
+    PUBLIC ATTRIBUTES
+    ==================
+    :hits:    The number of probes that found their pawn structure.
+    :misses:  The number of probes that didn't.
+    :stores:  The number of entries written.
+
+    PUBLIC METHODS
+    ===============
+    :probe:   Looks up a pawn key, returning (score, passedpawns, pawnfiles)
+              or None. The last two are (white, black) pairs.
+    :store:   Saves the pawn structure of a pawn key.
+    :clear:   Empties the table and resets the counters.
+    :resize:  Changes the memory budget (which clears the table).
+    :hitrate: The fraction of probes that were hits.
+    """
+
+    ENTRYSIZE = 32  # Bytes per entry.
+
+    def __init__(self, sizemb=1):
+        self.resize(sizemb)
+        return None
+
+    def __len__(self):
+        """The number of entries the table can hold."""
+        return len(self._keys)
+
+    def resize(self, sizemb):
+        """Sets the memory budget of the table in megabytes."""
+        if sizemb <= 0:
+            raise ValueError("The table needs a positive amount of memory.")
+        self.size = max(1, int(sizemb * 1024 * 1024) // self.ENTRYSIZE)
+        self.clear()
+        return None
+
+    def clear(self):
+        """Empties the table and resets the counters."""
+        self._keys = array(_TYPECODE, [0]) * self.size
+        # The score (offset so it is never negative) and the two file masks.
+        self._data = array(_TYPECODE, [0]) * self.size
+        self._whitepassed = array(_TYPECODE, [0]) * self.size
+        self._blackpassed = array(_TYPECODE, [0]) * self.size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        return None
+
+    def hitrate(self):
+        """The fraction of probes that found their pawn structure."""
+        probes = self.hits + self.misses
+        return float(self.hits) / probes if probes else 0.0
+
+    def probe(self, pawnkey):
+        """Finds the entry for pawnkey as (score, passedpawns, pawnfiles) or
+        None."""
+        slot = pawnkey % self.size
+        data = self._data[slot]
+        if data and self._keys[slot] == pawnkey:
+            self.hits += 1
+            return ((data & 0xFFFFFFFF) - _SCOREOFFSET,
+                    (self._whitepassed[slot], self._blackpassed[slot]),
+                    ((data >> 32) & 255, (data >> 40) & 255))
+        self.misses += 1
+        return None
+
+    def store(self, pawnkey, score, passedpawns, pawnfiles):
+        """Saves the pawn structure of pawnkey."""
+        slot = pawnkey % self.size
+        self._keys[slot] = pawnkey
+        self._data[slot] = ((score + _SCOREOFFSET) | (pawnfiles[0] << 32)
+                            | (pawnfiles[1] << 40))
+        self._whitepassed[slot], self._blackpassed[slot] = passedpawns
+        self.stores += 1
+        return None
@@ -6,7 +6,7 @@
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-from lib import core, vectors, pieces
+from lib import core, moves, pieces
 
  #     # ###
  #     #  #
@@ -78,7 +78,7 @@ class EngineUI:
         return piecetomove, (startindex, endindex)
 
     def addmovetohistory(self, piecesymbol=None, startpos=None, endpos=None,
-                         capture=False, castletuples=None, specialsym=None):
+                         capture=False, castlemove=None, specialsym=None):
         """Add a move to the recorded history."""
         # First turn the position into a notation string.
         def getpositionstring(pos):
@@ -86,12 +86,12 @@ class EngineUI:
             return self._filesymbols[file_] + self._ranksymbols[rank_]
 
         # Determine if castling.
-        if castletuples != None:
-            kingmove = castletuples[0]
-            if kingmove[1] - kingmove[0] > 0:
-                return '0-0'
+        if castlemove != None:
+            if moves.moveflags(castlemove) == moves.CASTLERIGHT:
+                self.history.append('0-0')
             else:
-                return '0-0-0'
+                self.history.append('0-0-0')
+            return None
 
         # Else make a normal notation string.
         startnotation = getpositionstring(startpos)
@@ -18,6 +18,21 @@ echo "GUI & UI TESTS"
 echo "==================================="
 python -m tests/test_usercontrol
 
+echo ""
+echo "ATTACK TABLE TESTS"
+echo "==================================="
+python -m tests/test_attacks
+
+echo ""
+echo "MOVE ENCODING TESTS"
+echo "==================================="
+python -m tests/test_moves
+
+echo ""
+echo "PIECE-SQUARE TABLE TESTS"
+echo "==================================="
+python -m tests/test_piecesquare
+
 echo ""
 echo "CHESSBOARD TESTS"
 echo "==================================="
@@ -28,8 +43,37 @@ echo "MOVEGEN TESTS"
 echo "==================================="
 python -m tests/test_movegenerator
 
+echo ""
+echo "PERFT TESTS"
+echo "==================================="
+python -m tests/test_perft
+
+echo ""
+echo "MOVE ORDERING TESTS"
+echo "==================================="
+python -m tests/test_ordering
+
+echo ""
+echo "PARALLEL SEARCH TESTS"
+echo "==================================="
+python -m tests/test_parallel
+
+echo ""
+echo "BATCH ANALYSIS TESTS"
+echo "==================================="
+python -m tests/test_analysis
+
+echo ""
+echo "SEARCH BENCHMARK TESTS"
+echo "==================================="
+python -m tests/test_benchmark
+
+echo ""
+echo "TRANSPOSITION TABLE TESTS"
+echo "==================================="
+python -m tests/test_transposition
+
 echo ""
 echo "ENGINE TESTS"
 echo "==================================="
-#python -m tests/test_engine
-echo "There is nothing here yet..."
+python -m tests/test_engine
@@ -0,0 +1,158 @@
+# DESCRIPTION: Tests the batch analysis of positions.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import csv, json, os, unittest
+from StringIO import StringIO
+from lib import analysis
+
+MATEIN1 = '6k1/5ppp/8/8/8/8/8/R3K3 w - -'
+POSITIONS = [
+    '# A comment, then a blank line.',
+    '',
+    MATEIN1 + ' bm Ra8#; id "mate in one";',
+    '6k1/5ppp/8/8/4n3/8/3Q4/4K3 b - - 0 1',
+    'not a position',
+]
+
+def _dyingtask(task):
+    """An analysis that kills its process."""
+    os._exit(1)
+
+class TestParsing(unittest.TestCase):
+    """Checks the lines of EPD and FEN files are read properly."""
+
+    def test_epd(self):
+        self.assertEqual(analysis.parseline(POSITIONS[2]),
+                         (MATEIN1, 'mate in one'))
+        self.assertEqual(analysis.parseline(MATEIN1 + ' id pos2; bm Ra8#;'),
+                         (MATEIN1, 'pos2'))
+        return None
+
+    def test_fen(self):
+        self.assertEqual(analysis.parseline(POSITIONS[3]), (POSITIONS[3], None))
+        self.assertEqual(analysis.parseline(MATEIN1), (MATEIN1, None))
+        return None
+
+    def test_skipped(self):
+        self.assertIsNone(analysis.parseline(POSITIONS[0]))
+        self.assertIsNone(analysis.parseline('   \n'))
+        self.assertEqual([number for number, positionid, fen
+                          in analysis.readpositions(POSITIONS)], [3, 4, 5])
+        return None
+
+
+class TestAnalysis(unittest.TestCase):
+    """Checks the positions are analysed and the results written out."""
+
+    def checkresults(self, results):
+        results = dict((result['number'], result) for result in results)
+        self.assertEqual(sorted(results), [3, 4, 5])
+        self.assertEqual(results[3]['bestmove'], 'a1a8')
+        self.assertEqual(results[3]['id'], 'mate in one')
+        self.assertEqual(results[4]['bestmove'], 'e4d2')
+        self.assertGreater(results[4]['nodes'], 0)
+        self.assertIsNone(results[5]['bestmove'])
+        self.assertIsNotNone(results[5]['error'])
+        return None
+
+    def test_analyse(self):
+        self.checkresults(analysis.analyse(
+            POSITIONS, depth=2, options={'hashsize': 1}))
+        return None
+
+    def test_analyse_pool(self):
+        self.checkresults(analysis.analyse(
+            POSITIONS, depth=2, processes=2, options={'hashsize': 1}))
+        return None
+
+    def test_anyerror(self):
+        # A bad option only fails in the search, with a TypeError. Each
+        # position still gets a result, and the pool doesn't wait forever.
+        options = {'hashsize': 1, 'aspirationwindow': 'wide'}
+        for processes in (1, 2):
+            results = list(analysis.analyse(
+                POSITIONS[3:4] * 2, depth=2, processes=processes,
+                options=options))
+            self.assertEqual(len(results), 2)
+            for result in results:
+                self.assertIsNotNone(result['error'])
+        return None
+
+    def test_badoptions(self):
+        # The options fail in the main process rather than in every process
+        # of the pool.
+        with self.assertRaises(ValueError):
+            analysis.analyse(POSITIONS, depth=1, processes=2,
+                             options={'hashsize': 0})
+        return None
+
+    def test_processdies(self):
+        analyseone = analysis._analyseone
+        analysis._analyseone = _dyingtask
+        try:
+            with self.assertRaises(RuntimeError):
+                list(analysis.analyse(POSITIONS, depth=1, processes=2,
+                                      options={'hashsize': 1}))
+        finally:
+            analysis._analyseone = analyseone
+        return None
+
+    def test_baddepth(self):
+        with self.assertRaises(ValueError):
+            analysis.analyse(POSITIONS, depth=0)
+        return None
+
+    def test_movetime(self):
+        results = list(analysis.analyse(POSITIONS[2:3], movetime=0.5))
+        self.assertEqual(results[0]['bestmove'], 'a1a8')
+        with self.assertRaises(ValueError):
+            analysis.analyse(POSITIONS)
+        return None
+
+    def test_readsahead(self):
+        # Only a few lines may be read before the first result comes back.
+        consumed = list()
+        def lines():
+            for ii in range(1000):
+                consumed.append(ii)
+                yield MATEIN1
+        results = analysis.analyse(lines(), depth=1, processes=2, inflight=1,
+                                   options={'hashsize': 1})
+        next(results)
+        self.assertLessEqual(len(consumed), 4)
+        results.close()
+        return None
+
+    def test_jsonl(self):
+        output = StringIO()
+        count = analysis.analysefile(POSITIONS, output, 'jsonl', depth=1,
+                                     options={'hashsize': 1})
+        self.assertEqual(count, 3)
+        lines = output.getvalue().splitlines()
+        self.checkresults(self.withdefaults(json.loads(line)) for line in lines)
+        return None
+
+    def test_csv(self):
+        output = StringIO()
+        analysis.analysefile(POSITIONS, output, 'csv', depth=1,
+                             options={'hashsize': 1})
+        rows = list(csv.DictReader(StringIO(output.getvalue())))
+        self.assertEqual([row['number'] for row in rows], ['3', '4', '5'])
+        self.assertEqual(rows[0]['bestmove'], 'a1a8')
+        self.assertEqual(rows[2]['bestmove'], '')
+        return None
+
+    @staticmethod
+    def withdefaults(result):
+        """Fills in the fields left out of a JSON line."""
+        full = dict((field, None) for field in analysis.FIELDS)
+        full.update(result)
+        return full
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
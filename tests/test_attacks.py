@@ -0,0 +1,127 @@
+# DESCRIPTION: Tests the precomputed attack tables.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import random
+import unittest
+from lib import attacks, core
+
+class TestTables(unittest.TestCase):
+    """Spot checks the tables against squares worked out by hand."""
+
+    def test_knighttargets(self):
+        self.assertEqual(sorted(attacks.KNIGHT_TARGETS[0]), [10, 17])
+        self.assertEqual(len(attacks.KNIGHT_TARGETS[27]), 8)
+        self.assertEqual(sorted(attacks.KNIGHT_TARGETS[62]), [45, 47, 52])
+        return None
+
+    def test_kingtargets(self):
+        self.assertEqual(sorted(attacks.KING_TARGETS[7]), [6, 14, 15])
+        self.assertEqual(len(attacks.KING_TARGETS[36]), 8)
+        return None
+
+    def test_pawnattacks(self):
+        self.assertEqual(sorted(attacks.PAWN_ATTACKS['white'][12]), [19, 21])
+        self.assertEqual(attacks.PAWN_ATTACKS['white'][15], (22,))
+        self.assertEqual(sorted(attacks.PAWN_ATTACKS['black'][48]), [41])
+        self.assertEqual(attacks.PAWN_ATTACKS['white'][60], ())
+        return None
+
+    def test_rays(self):
+        self.assertEqual(attacks.RAYS[(1, 0)][4], (12, 20, 28, 36, 44, 52, 60))
+        self.assertEqual(attacks.RAYS[(-1, -1)][27], (18, 9, 0))
+        self.assertEqual(attacks.RAYS[(0, 1)][7], ())
+        self.assertEqual(attacks.RAYS[(2, 1)][1], (18, 35, 52))
+        return None
+
+    def test_masks(self):
+        self.assertEqual(attacks.KNIGHT_MASKS[0], (1 << 10) | (1 << 17))
+        self.assertEqual(core.popcount(attacks.KING_MASKS[0]), 3)
+        self.assertEqual(
+            attacks.PAWN_MASKS['black'][36], (1 << 27) | (1 << 29))
+        return None
+
+    def test_pawnstructuremasks(self):
+        self.assertEqual(attacks.FILE_MASKS[0], 0x0101010101010101)
+        self.assertEqual(attacks.FILE_MASKS[7], 0x8080808080808080)
+        # A white pawn on e5 is stopped by pawns on d6-f7, a black one on a3
+        # by pawns on a2, b2, a1 and b1.
+        self.assertEqual(attacks.PASSED_MASKS['white'][36], sum(
+            1 << index for index in (43, 44, 45, 51, 52, 53, 59, 60, 61)))
+        self.assertEqual(attacks.PASSED_MASKS['black'][16], sum(
+            1 << index for index in (0, 1, 8, 9)))
+        self.assertEqual(attacks.PASSED_MASKS['white'][60], 0)
+        return None
+
+    def test_pawnattacks(self):
+        # Pawns on a2, e4 and h5 of each colour.
+        pawns = (1 << 8) | (1 << 28) | (1 << 39)
+        self.assertEqual(attacks.pawnattacks(pawns, 'white'), sum(
+            1 << index for index in (17, 35, 37, 46)))
+        self.assertEqual(attacks.pawnattacks(pawns, 'black'), sum(
+            1 << index for index in (1, 19, 21, 30)))
+        self.assertEqual(attacks.pawnattacks(1 << 63, 'white'), 0)
+        return None
+
+    def test_between(self):
+        self.assertEqual(attacks.BETWEEN[0][3], (1 << 1) | (1 << 2))
+        self.assertEqual(attacks.BETWEEN[3][0], attacks.BETWEEN[0][3])
+        self.assertEqual(attacks.BETWEEN[0][9], 0)  # Next to each other.
+        self.assertEqual(attacks.BETWEEN[0][17], 0)  # Not on a line.
+        return None
+
+    def test_line(self):
+        self.assertEqual(attacks.LINE[0][9], attacks.LINE[63][54])
+        self.assertEqual(core.popcount(attacks.LINE[0][9]), 8)
+        self.assertEqual(attacks.LINE[12][44], 0x1010101010101010)
+        self.assertEqual(attacks.LINE[0][17], 0)
+        return None
+
+
+class TestMagicBitboards(unittest.TestCase):
+    """Checks the magic lookups against walking the rays."""
+
+    def setUp(self):
+        generator = random.Random(1)
+        self.occupancies = [0, attacks.MASK64] + [
+            generator.getrandbits(64) & generator.getrandbits(64)
+            for ii in range(20)]
+        return None
+
+    def test_rookattacks(self):
+        for index in range(64):
+            for occupied in self.occupancies:
+                self.assertEqual(
+                    attacks.rookattacks(index, occupied),
+                    attacks._slidingattacks(index, occupied, attacks.ORTHOGONALS))
+        return None
+
+    def test_bishopattacks(self):
+        for index in range(64):
+            for occupied in self.occupancies:
+                self.assertEqual(
+                    attacks.bishopattacks(index, occupied),
+                    attacks._slidingattacks(index, occupied, attacks.DIAGONALS))
+        return None
+
+    def test_queenattacks(self):
+        # A queen on d4 blocked by pieces on d6 and f6.
+        occupied = (1 << 43) | (1 << 45)
+        expected = attacks._slidingattacks(
+            27, occupied, attacks.ORTHOGONALS + attacks.DIAGONALS)
+        self.assertEqual(attacks.queenattacks(27, occupied), expected)
+        self.assertFalse(attacks.queenattacks(27, occupied) & (1 << 51))
+        self.assertTrue(attacks.queenattacks(27, occupied) & (1 << 43))
+        return None
+
+    def test_loadmagics(self):
+        rookmagics, bishopmagics = attacks.loadmagics()
+        self.assertEqual(len(rookmagics), 64)
+        self.assertEqual(len(bishopmagics), 64)
+        return None
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
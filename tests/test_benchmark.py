@@ -0,0 +1,33 @@
+# DESCRIPTION: Tests the search feature benchmark.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from StringIO import StringIO
+from lib import benchmark, perft
+
+class TestBenchmark(unittest.TestCase):
+    """Checks the node counts are compared for every feature."""
+
+    def test_searchnodes(self):
+        result, nodes, seconds = benchmark.searchnodes(
+            perft.POSITIONS[2][1], 2, hashsize=1)
+        self.assertEqual(nodes, result.nodes + result.qnodes)
+        self.assertGreater(nodes, 0)
+        return None
+
+    def test_compare(self):
+        output = StringIO()
+        totals = benchmark.compare(2, perft.POSITIONS[2:3], output=output)
+        self.assertEqual(sorted(totals),
+                         sorted(name for name, options in benchmark.FEATURES))
+        for name, options in benchmark.FEATURES:
+            self.assertIn('without %s' % name, output.getvalue())
+        return None
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
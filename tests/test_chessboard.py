@@ -7,7 +7,7 @@
 
 import unittest
 from tests.test_core import errormessage
-from lib import chessboard, core, pieces
+from lib import chessboard, core, moves, pieces, piecesquare
 
 class CoreMethods(unittest.TestCase):
     """This testing suite looks at the core methods."""
@@ -217,5 +217,416 @@ class TestChessBoard(unittest.TestCase):
         self.board.move(51, 35)
         self.assertTrue(self.board.enpassantforplayer != None)
 
+class TestBitBoard(unittest.TestCase):
+    """Makes sure the bitboards follow the pieces around the board."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        self.board.setupnormalboard()
+        return None
+
+    def test_setupnormalboard(self):
+        self.assertEqual(self.board.colourboard('white'), 0xFFFF)
+        self.assertEqual(self.board.colourboard('black'), 0xFFFF << 48)
+        self.assertEqual(
+            self.board.pieceboard(pieces.KingPiece, 'black'), 1 << 60)
+        self.assertEqual(self.board.piececount(pieces.PawnPiece, 'white'), 8)
+        return None
+
+    def test_getitem(self):
+        self.assertEqual(self.board[3], pieces.QueenPiece('white'))
+        self.assertIsNone(self.board[30])
+        return None
+
+    def test_setitem(self):
+        self.board[30] = pieces.KnightPiece('black')
+        self.assertEqual(
+            self.board.findpiece(pieces.KnightPiece, 'black'), [30, 57, 62])
+        self.board[30] = None
+        self.assertFalse(self.board.occupied & (1 << 30))
+        return None
+
+    def test_setitem_replacespiece(self):
+        self.board[8] = pieces.QueenPiece('black')
+        self.assertEqual(self.board.piececount(pieces.PawnPiece, 'white'), 7)
+        self.assertEqual(self.board.piececount(pieces.QueenPiece, 'black'), 2)
+        return None
+
+    def test_move_capture(self):
+        self.board.move(1, 50)
+        self.assertEqual(self.board.findpiece(pieces.KnightPiece, 'white'), [6, 50])
+        self.assertEqual(self.board.piececount(pieces.PawnPiece, 'black'), 7)
+        self.assertEqual(self.board.occupiedsquares('white')[-1], 50)
+        return None
+
+    def test_promotepawn(self):
+        self.board[52] = pieces.PawnPiece('white')
+        self.board.promotepawn(52, pieces.QueenPiece)
+        self.assertEqual(self.board.piececount(pieces.PawnPiece, 'white'), 8)
+        self.assertEqual(self.board.piececount(pieces.PawnPiece, 'black'), 7)
+        self.assertEqual(self.board.findpiece(pieces.QueenPiece, 'white'), [3, 52])
+        return None
+
+    def test_fromboard(self):
+        board = chessboard.ChessBoard()
+        board[12] = pieces.KingPiece('white')
+        board[44] = pieces.RookPiece('black')
+        bitboard = chessboard.BitBoard.fromboard(board)
+
+        self.assertEqual(bitboard, board)
+        self.assertEqual(bitboard.occupied, (1 << 12) | (1 << 44))
+        self.assertEqual(bitboard.occupiedsquares('black'), [44])
+        return None
+
+    def test_hasnonpawnmaterial(self):
+        self.assertTrue(self.board.hasnonpawnmaterial('white'))
+        for index in (0, 1, 2, 3, 5, 6, 7):
+            self.board[index] = None
+        self.assertFalse(self.board.hasnonpawnmaterial('white'))
+        self.assertTrue(self.board.hasnonpawnmaterial('black'))
+        self.board[20] = pieces.KnightPiece('white')
+        self.assertTrue(self.board.hasnonpawnmaterial('white'))
+        return None
+
+    def test_badinput(self):
+        with self.assertRaises(core.ColourError):
+            self.board.colourboard('blue')
+        with self.assertRaises(core.UnknownPieceError):
+            self.board.pieceboard(core.Vector, 'white')
+        return None
+
+
+class TestMakeMove(unittest.TestCase):
+    """Checks that makemove plays moves by the rules and that unmakemove puts
+    the board back exactly as it was."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        self.board[4] = pieces.KingPiece('white')
+        self.board[0] = pieces.RookPiece('white')
+        self.board[7] = pieces.RookPiece('white')
+        self.board[60] = pieces.KingPiece('black')
+        self.board[63] = pieces.RookPiece('black')
+        self.board[12] = pieces.PawnPiece('white')
+        self.board[51] = pieces.PawnPiece('black')
+        self.original = self.board.duplicateboard()
+        return None
+
+    def assertRestored(self):
+        self.board.unmakemove()
+        self.assertEqual(self.board, self.original)
+        self.assertEqual(self.board.occupied, self.original.occupied)
+        self.assertEqual(self.board.castlingrights, self.original.castlingrights)
+        self.assertEqual(
+            self.board.enpassantforcomputer, self.original.enpassantforcomputer)
+        return None
+
+    def test_capture(self):
+        self.board.makemove(moves.encode(7, 63, moves.CAPTURE))
+        self.assertEqual(self.board[63], pieces.RookPiece('white'))
+        self.assertEqual(self.board.cancastle('white'), (True, False))
+        self.assertEqual(self.board.cancastle('black'), (True, False))
+        self.assertRestored()
+        return None
+
+    def test_castleright(self):
+        self.board.makemove(moves.encode(4, 6, moves.CASTLERIGHT))
+        self.assertEqual(self.board[6], pieces.KingPiece('white'))
+        self.assertEqual(self.board[5], pieces.RookPiece('white'))
+        self.assertIsNone(self.board[7])
+        self.assertEqual(self.board.cancastle('white'), (False, False))
+        self.assertRestored()
+        return None
+
+    def test_castleleft(self):
+        self.board.makemove(moves.encode(4, 2, moves.CASTLELEFT))
+        self.assertEqual(self.board[3], pieces.RookPiece('white'))
+        self.assertIsNone(self.board[0])
+        self.assertRestored()
+        return None
+
+    def test_enpassant(self):
+        self.board.makemove(moves.encode(12, 28, moves.DOUBLEPUSH))
+        self.assertEqual(self.board.enpassantforcomputer, 4)
+        self.board.makemove(moves.encode(51, 35, moves.DOUBLEPUSH))
+        self.assertIsNone(self.board.enpassantforcomputer)
+        self.assertEqual(self.board.enpassantforplayer, 3)
+
+        self.board.makemove(moves.encode(28, 35, moves.CAPTURE))  # A normal capture.
+        self.board.unmakemove()
+        self.board.move(28, 36)
+        self.board.makemove(moves.encode(36, 43, moves.ENPASSANT))
+        self.assertIsNone(self.board[35])
+        self.assertEqual(self.board[43], pieces.PawnPiece('white'))
+        self.board.unmakemove()
+        self.assertEqual(self.board[35], pieces.PawnPiece('black'))
+        return None
+
+    def test_promotion(self):
+        self.board.move(51, 11)
+        self.original = self.board.duplicateboard()
+        self.board.makemove(
+            moves.encode(11, 3, moves.promotionflags(pieces.KnightPiece)))
+        self.assertEqual(self.board[3], pieces.KnightPiece('black'))
+        self.assertRestored()
+        self.assertEqual(self.board[11], pieces.PawnPiece('black'))
+        return None
+
+    def test_unmakemove_nomoves(self):
+        with self.assertRaises(core.IllegalMoveError):
+            self.board.unmakemove()
+        return None
+
+
+class TestZobristKey(unittest.TestCase):
+    """Makes sure the key is kept up to date as the board changes."""
+
+    def setUp(self):
+        self.board = chessboard.ChessBoard()
+        self.board.setupnormalboard()
+        self.startkey = self.board.key
+        return None
+
+    def test_startkey(self):
+        self.assertEqual(self.board.key, self.board.computekey())
+        self.assertNotEqual(self.board.key, chessboard.ChessBoard().key)
+        return None
+
+    def test_setitem(self):
+        self.board[35] = pieces.QueenPiece('black')
+        self.assertEqual(self.board.key, self.board.computekey())
+        self.board[35] = None
+        self.assertEqual(self.board.key, self.startkey)
+        return None
+
+    def test_move(self):
+        self.board.move(12, 28)
+        self.assertEqual(self.board.key, self.board.computekey())
+        self.board.promotepawn(28, pieces.RookPiece)
+        self.assertEqual(self.board.key, self.board.computekey())
+        return None
+
+    def test_states(self):
+        self.board.castlingrights = chessboard.CASTLE_WHITE_RIGHT
+        self.board.enpassantforplayer = 3
+        self.assertEqual(self.board.key, self.board.computekey())
+        self.board.castlingrights = chessboard.CASTLE_ALL
+        self.board.enpassantforplayer = None
+        self.assertEqual(self.board.key, self.startkey)
+        return None
+
+    def test_makemove_unmakemove(self):
+        for move in (moves.encode(12, 28, moves.DOUBLEPUSH),
+                     moves.encode(51, 35, moves.DOUBLEPUSH),
+                     moves.encode(28, 35, moves.CAPTURE),
+                     moves.encode(59, 35, moves.CAPTURE),
+                     moves.encode(4, 12)):
+            self.board.makemove(move)
+            self.assertEqual(self.board.key, self.board.computekey())
+        for ii in range(5):
+            self.board.unmakemove()
+        self.assertEqual(self.board.key, self.startkey)
+        return None
+
+    def test_makenullmove(self):
+        original = self.board.duplicateboard()
+        self.board.makemove(moves.encode(12, 28, moves.DOUBLEPUSH))
+        key = self.board.key
+        self.board.makenullmove()  # Passing clears the en passant square.
+        self.assertIsNone(self.board.enpassantforplayer)
+        self.assertIsNone(self.board.enpassantforcomputer)
+        self.assertEqual(self.board.key, self.board.computekey())
+        self.board.unmakemove()
+        self.assertEqual(self.board.key, key)
+        self.board.unmakemove()
+        self.assertEqual(self.board, original)
+        self.assertEqual(self.board.key, self.startkey)
+        return None
+
+    def test_pawnkey(self):
+        self.assertEqual(self.board.pawnkey, self.board.computepawnkey())
+        startpawnkey = self.board.pawnkey
+        self.board.makemove(moves.encode(6, 21))  # Only a knight moves.
+        self.assertEqual(self.board.pawnkey, startpawnkey)
+        for move in (moves.encode(12, 28, moves.DOUBLEPUSH),
+                     moves.encode(51, 35, moves.DOUBLEPUSH),
+                     moves.encode(28, 35, moves.CAPTURE)):
+            self.board.makemove(move)
+            self.assertEqual(self.board.pawnkey, self.board.computepawnkey())
+        self.assertNotEqual(self.board.pawnkey, startpawnkey)
+        for ii in range(4):
+            self.board.unmakemove()
+        self.assertEqual(self.board.pawnkey, startpawnkey)
+        return None
+
+    def test_transposition(self):
+        self.board.makemove(moves.encode(6, 21))
+        self.board.makemove(moves.encode(62, 45))
+        self.board.makemove(moves.encode(1, 18))
+        firstkey = self.board.key
+
+        other = chessboard.ChessBoard()
+        other.setupnormalboard()
+        other.makemove(moves.encode(1, 18))
+        other.makemove(moves.encode(62, 45))
+        other.makemove(moves.encode(6, 21))
+        self.assertEqual(other.key, firstkey)
+
+        other.makemove(moves.encode(7, 6))  # Same pieces, but no castling right.
+        other.makemove(moves.encode(6, 7))
+        self.assertEqual(other, self.board)
+        self.assertNotEqual(other.key, firstkey)
+        return None
+
+
+class TestEvaluationTotals(unittest.TestCase):
+    """Makes sure the material and piece-square totals are kept up to date as
+    the board changes."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        self.board.setupnormalboard()
+        return None
+
+    def totals(self):
+        return (self.board.piececounts, self.board.material,
+                self.board.middlegame, self.board.endgame, self.board.phase)
+
+    def test_startingposition(self):
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.assertEqual(self.board.material, 0)
+        self.assertEqual(self.board.piecesquare, 0)  # The tables are mirrored.
+        self.assertEqual(self.board.piececounts, [8, 2, 2, 2, 1, 1] * 2)
+        self.assertEqual(self.board.phase, piecesquare.MAXPHASE)
+        return None
+
+    def test_phase(self):
+        self.board.makemove(moves.encode(3, 59, moves.CAPTURE))  # Qxd8.
+        self.assertEqual(self.board.phase, piecesquare.MAXPHASE - 4)
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.board.unmakemove()
+        self.assertEqual(self.board.phase, piecesquare.MAXPHASE)
+        return None
+
+    def test_tapered(self):
+        # With no pieces but kings the endgame table is used alone, which
+        # wants the king in the centre.
+        self.board.setupfromfen('7k/8/8/8/3K4/8/8/8 w - -')
+        self.assertEqual(self.board.phase, 0)
+        self.assertEqual(self.board.piecesquare, self.board.endgame)
+        self.assertGreater(self.board.piecesquare, 0)
+        return None
+
+    def test_usetables(self):
+        tables = dict(piecesquare.TABLES)
+        tables[pieces.KnightPiece, piecesquare.MIDDLEGAME] = (100,) * 64
+        self.board.usetables(tables)
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.board.makemove(moves.encode(1, 18))  # Only white's knight scores.
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        copy = chessboard.BitBoard.fromboard(self.board)
+        self.assertEqual(copy.middlegame, self.board.middlegame)
+        self.assertIsNot(chessboard.BitBoard().piecesquaretables,
+                         self.board.piecesquaretables)
+        return None
+
+    def test_setitem(self):
+        self.board[35] = pieces.QueenPiece('black')
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.assertEqual(self.board.material, -9000)
+        self.board[35] = None
+        self.assertEqual(self.board.material, 0)
+        return None
+
+    def test_makemove_unmakemove(self):
+        start = self.totals()
+        start = (list(start[0]),) + start[1:]
+        for move in (moves.encode(12, 28, moves.DOUBLEPUSH),
+                     moves.encode(51, 35, moves.DOUBLEPUSH),
+                     moves.encode(28, 35, moves.CAPTURE),
+                     moves.encode(59, 35, moves.CAPTURE),
+                     moves.encode(4, 12)):
+            self.board.makemove(move)
+            self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.assertEqual(self.board.material, 0)  # A pawn each was taken.
+        self.assertEqual(self.board.piececounts[0], 7)
+        for ii in range(5):
+            self.board.unmakemove()
+        self.assertEqual(self.totals(), start)
+        return None
+
+    def test_promotion(self):
+        self.board.setupfromfen('7k/1P6/8/8/8/8/8/K7 w - -')
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.board.makemove(moves.encode(49, 57, moves.promotionflags(
+            pieces.QueenPiece)))
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.assertEqual(self.board.material, 9000)
+        self.board.unmakemove()
+        self.assertEqual(self.board.material, 1000)
+        return None
+
+    def test_fen_replacesposition(self):
+        self.board.setupfromfen('4k3/8/8/8/8/8/8/4K2R w K -')
+        self.assertEqual(self.totals(), self.board.computeevaluationtotals())
+        self.assertEqual(self.board.material, 5000)
+        return None
+
+
+class TestFen(unittest.TestCase):
+    """Tests setting up the board from FEN strings."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        return None
+
+    def test_startingposition(self):
+        colour = self.board.setupfromfen(chessboard.STARTFEN)
+        normalboard = chessboard.BitBoard()
+        normalboard.setupnormalboard()
+        self.assertEqual(colour, 'white')
+        self.assertEqual(self.board, normalboard)
+        self.assertEqual(self.board.pieceboards, normalboard.pieceboards)
+        self.assertEqual(self.board.key, normalboard.key)
+        return None
+
+    def test_states(self):
+        colour = self.board.setupfromfen(
+            'rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b Kq e3 0 3')
+        self.assertEqual(colour, 'black')
+        self.assertEqual(self.board[28].__class__, pieces.PawnPiece)
+        self.assertEqual(self.board[27].colour, 'black')
+        self.assertEqual(
+            self.board.castlingrights,
+            chessboard.CASTLE_WHITE_RIGHT | chessboard.CASTLE_BLACK_LEFT)
+        self.assertEqual(self.board.enpassantforcomputer, 4)  # Black to take.
+        self.assertEqual(self.board.enpassantforplayer, None)
+        self.assertEqual(self.board.key, self.board.computekey())
+        return None
+
+    def test_replacesposition(self):
+        self.board.setupnormalboard()
+        self.board.makemove(moves.encode(12, 28, moves.DOUBLEPUSH))
+        self.board.setupfromfen('4k3/8/8/8/8/8/8/4K3 w - -')
+        self.assertEqual(len(self.board.occupiedsquares()), 2)
+        self.assertEqual(self.board.castlingrights, 0)
+        self.assertRaises(core.IllegalMoveError, self.board.unmakemove)
+        return None
+
+    def test_badfen(self):
+        for fen in ('8/8/8 w - -', '8/8/8/8/8/8/8/8 x - -',
+                    '9/8/8/8/8/8/8/8 w - -', '7X/8/8/8/8/8/8/8 w - -',
+                    '8/8/8/8/8/8/8/8 w Z -', '8/8/8/8/8/8/8/8 w - z9',
+                    '8/8/8/8/8/8/8/8 w'):
+            self.assertRaises(core.FenError, self.board.setupfromfen, fen)
+        return None
+
+    def test_ranktoolong(self):
+        for fen in ('pppppppppp/8/8/8/8/8/8/8 w - -',
+                    '8/8/8/8/8/8/8/7PP w - -', '8/8/8/8/8/8/8/8p w - -'):
+            self.assertRaises(core.FenError, self.board.setupfromfen, fen)
+        return None
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
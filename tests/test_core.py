@@ -250,5 +250,46 @@ class TestPositionClass(unittest.TestCase):
         return None
 
 
+class TestBitFunctions(unittest.TestCase):
+    """Tests the small helpers used to work with bitboards."""
+
+    def test_popcount(self):
+        self.assertEqual(core.popcount(0), 0)
+        self.assertEqual(core.popcount(0xFF00), 8)
+        self.assertEqual(core.popcount(1 << 63 | 1), 2)
+        return None
+
+    def test_bitscan(self):
+        self.assertEqual(core.bitscan(1), 0)
+        self.assertEqual(core.bitscan(1 << 63 | 1 << 12), 12)
+        with self.assertRaises(ValueError):
+            core.bitscan(0)
+        return None
+
+    def test_iterbits(self):
+        self.assertEqual(list(core.iterbits(0)), [])
+        self.assertEqual(
+            list(core.iterbits(1 << 3 | 1 << 17 | 1 << 63)), [3, 17, 63])
+        return None
+
+
+class TestSquareNames(unittest.TestCase):
+    """Tests converting between square indices and algebraic names."""
+
+    def test_squarename(self):
+        self.assertEqual(core.squarename(0), 'a1')
+        self.assertEqual(core.squarename(12), 'e2')
+        self.assertEqual(core.squarename(63), 'h8')
+        return None
+
+    def test_squareindex(self):
+        self.assertEqual(core.squareindex('a1'), 0)
+        self.assertEqual(core.squareindex('e3'), 20)
+        for name in ('i1', 'a9', 'a0', '', 'e'):
+            with self.assertRaises(ValueError):
+                core.squareindex(name)
+        return None
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -6,7 +6,7 @@
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 import unittest
-from lib import chessboard, core, engine, movegenerator, pieces, usercontrol
+from lib import chessboard, core, engine, movegenerator, moves, perft, pieces, usercontrol
 
 class TestSearch(unittest.TestCase):
     """Does tests on the search algorithm, especially making sure that it can
@@ -26,16 +26,195 @@ class TestSearch(unittest.TestCase):
         nodes = self.engine.search_single(self.board, 1, 'white')
         print [x.moves for x in nodes]
         self.assertIn(
-            engine.Node((35, 44), engine.Node((21, 29))),
+            engine.Node(moves.encode(35, 44), engine.Node(moves.encode(21, 29))),
             nodes
         )
         self.assertNotIn(
-            engine.Node((35, 36), engine.Node((21, 29))),
+            engine.Node(moves.encode(35, 36), engine.Node(moves.encode(21, 29))),
             nodes
         )
         return None
 
 
+class TestAlphaBeta(unittest.TestCase):
+    """Makes sure the alpha-beta search finds the best moves."""
+
+    def setUp(self):
+        self.board = chessboard.ChessBoard()
+        self.board[4] = pieces.KingPiece('white')
+        self.board[62] = pieces.KingPiece('black')
+        self.board[53] = pieces.PawnPiece('black')
+        self.board[54] = pieces.PawnPiece('black')
+        self.board[55] = pieces.PawnPiece('black')
+        self.engine = engine.ChessEngine(hashsize=1)
+        return None
+
+    def test_matein1(self):
+        self.board[0] = pieces.RookPiece('white')
+        result = self.engine.search(self.board, 'white', 2)
+        self.assertEqual(result.move, moves.encode(0, 56))
+        self.assertEqual(result.score, engine.ChessEngine.MATESCORE - 1)
+        self.assertEqual(result.pv, [moves.encode(0, 56)])
+        return None
+
+    def test_capturesqueen(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        result = self.engine.search(self.board, 'black', 1)
+        self.assertEqual(result.move, moves.encode(20, 35, moves.CAPTURE))
+        self.assertGreater(result.score, 0)
+        return None
+
+    def test_keepsboard(self):
+        self.board[0] = pieces.RookPiece('white')
+        original = self.board.duplicateboard()
+        self.engine.search(self.board, 'black', 2)
+        self.assertEqual(self.board, original)
+        self.assertEqual(self.board.key, original.key)
+        return None
+
+    def test_nomoves(self):
+        self.board[0] = pieces.RookPiece('white')
+        self.board.move(0, 56)  # Black is checkmated.
+        result = self.engine.search(self.board, 'black', 1)
+        self.assertIsNone(result.move)
+        self.assertEqual(result.score, -engine.ChessEngine.MATESCORE)
+        return None
+
+    def test_matein1_depth1(self):
+        # The quiescence search sees the checkmate at the leaves.
+        self.board[0] = pieces.RookPiece('white')
+        result = self.engine.search(self.board, 'white', 1)
+        self.assertEqual(result.move, moves.encode(0, 56))
+        self.assertEqual(result.score, engine.ChessEngine.MATESCORE - 1)
+        return None
+
+    def test_quiescence_hangingpiece(self):
+        # Taking the knight looks good one ply deep, but the queen is lost.
+        self.board[35] = pieces.QueenPiece('white')
+        self.board[44] = pieces.KnightPiece('black')
+        horizon = engine.ChessEngine(hashsize=1, quiescence=False)
+        self.assertEqual(horizon.search(self.board, 'white', 1).move,
+                         moves.encode(35, 44, moves.CAPTURE))
+        result = self.engine.search(self.board, 'white', 1)
+        self.assertNotEqual(result.move, moves.encode(35, 44, moves.CAPTURE))
+        self.assertGreater(result.qnodes, 0)
+        self.assertEqual(horizon.qnodes, 0)
+        return None
+
+    def test_selectivity_toggles(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        for options in ({'nullmove': False, 'lmr': False}, {}):
+            chessengine = engine.ChessEngine(hashsize=1, **options)
+            result = chessengine.search(self.board, 'black', 4)
+            self.assertEqual(result.move, moves.encode(20, 35, moves.CAPTURE))
+        plain = engine.ChessEngine(hashsize=1, nullmove=False, lmr=False)
+        plain.search(self.board, 'black', 4)
+        self.assertEqual(
+            (plain.nullcutoffs, plain.reductions, plain.researches), (0, 0, 0))
+        return None
+
+    def test_pvs_aspiration(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        plain = engine.ChessEngine(
+            hashsize=1, nullmove=False, lmr=False, pvs=False,
+            aspirationwindow=None)
+        expected = plain.search(self.board, 'black', 3)
+        self.assertEqual(
+            (plain.pvsresearches, plain.aspirationresearches), (0, 0))
+        # A tiny window is sure to miss, but the score must come out the same.
+        narrow = engine.ChessEngine(
+            hashsize=1, nullmove=False, lmr=False, aspirationwindow=1)
+        result = narrow.search(self.board, 'black', 3)
+        self.assertEqual(result.move, expected.move)
+        self.assertEqual(result.score, expected.score)
+        self.assertGreater(narrow.aspirationresearches, 0)
+        return None
+
+    def test_searchmove(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        result = self.engine.search(self.board, 'black', 3)
+        single = engine.ChessEngine(hashsize=1).searchmove(
+            self.board, 'black', result.move, 3)
+        self.assertEqual(single.score, result.score)
+        self.assertEqual(single.pv[0], result.move)
+        # Against a bound it can't reach, it only proves it is no better.
+        bounded = engine.ChessEngine(hashsize=1).searchmove(
+            self.board, 'black', moves.encode(62, 63), 3, alpha=result.score)
+        self.assertLessEqual(bounded.score, result.score)
+        return None
+
+    def test_nullmove_zugzwang(self):
+        # With only pawns left passing is never tried.
+        chessengine = engine.ChessEngine(hashsize=1, lmr=False)
+        chessengine.search(self.board, 'white', 4)
+        self.assertEqual(chessengine.nullcutoffs, 0)
+        self.board[0] = pieces.RookPiece('white')
+        self.board[57] = pieces.KnightPiece('black')
+        chessengine.search(self.board, 'white', 4)
+        self.assertGreater(chessengine.nullcutoffs, 0)
+        return None
+
+    def test_transpositiontable(self):
+        self.board[0] = pieces.RookPiece('white')
+        # Black to move, since white's mate in one is found in a single node.
+        first = self.engine.search(self.board, 'black', 3)
+        second = self.engine.search(self.board, 'black', 3)
+        self.assertEqual(first.move, second.move)
+        self.assertLess(second.nodes, first.nodes)
+        return None
+
+
+class TestTimeControl(unittest.TestCase):
+    """Checks the iterative deepening stops when it is told to."""
+
+    def setUp(self):
+        self.board = chessboard.ChessBoard()
+        self.board.setupnormalboard()
+        self.engine = engine.ChessEngine(hashsize=1)
+        return None
+
+    def test_allocatetime(self):
+        self.assertEqual(engine.TimeManager(movetime=0.5).budget, 0.5)
+        clock = engine.TimeManager(remaining=60, increment=2, movestogo=20)
+        self.assertAlmostEqual(clock.budget, 3 + 1.5 - 0.05)
+        hurry = engine.TimeManager(remaining=1, increment=10)
+        self.assertAlmostEqual(hurry.budget, 0.5 - 0.05)
+        self.assertIsNone(engine.TimeManager(maxnodes=10).budget)
+        with self.assertRaises(ValueError):
+            engine.TimeManager()
+        return None
+
+    def test_nodelimit(self):
+        original = self.board.duplicateboard()
+        result = self.engine.search(
+            self.board, 'white', timemanager=engine.TimeManager(maxnodes=100))
+        self.assertLessEqual(self.engine.nodes, 100)
+        self.assertIsNotNone(result.move)
+        self.assertEqual(self.board, original)
+        self.assertEqual(self.board.key, original.key)
+        return None
+
+    def test_lastcompleteddepth(self):
+        result = self.engine.search(
+            self.board, 'white', timemanager=engine.TimeManager(maxnodes=100))
+        full = engine.ChessEngine(hashsize=1).search(
+            self.board, 'white', result.depth)
+        self.assertEqual(result.move, full.move)
+        self.assertEqual(result.score, full.score)
+        return None
+
+    def test_movetime(self):
+        timemanager = engine.TimeManager(movetime=0.3)
+        result = self.engine.search(self.board, 'white', timemanager=timemanager)
+        self.assertLess(timemanager.elapsed(), 1.0)
+        self.assertIsNotNone(result.move)
+        return None
+
+
 class TestEvaluation(unittest.TestCase):
     """Does basic tests on the evaluation algorithm, making sure that the values
     it assigns are accurate based on the position."""
@@ -70,5 +249,167 @@ class TestEvaluation(unittest.TestCase):
         self.assertLess(self.evaluate(self.board), 0)
         return None
 
+
+class TestMobility(unittest.TestCase):
+    """Checks the mobility counts safe squares attacked by the pieces."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        self.evaluator = engine.Evaluator()
+        return None
+
+    def mobility(self, fen):
+        self.board.setupfromfen(fen)
+        return self.evaluator.mobilityscore(self.board) // self.evaluator.MOBILITYVALUE
+
+    def test_startingposition(self):
+        self.assertEqual(self.mobility(chessboard.STARTFEN), 0)
+        return None
+
+    def test_pieces(self):
+        self.assertEqual(self.mobility('7k/8/8/8/3N4/8/8/K7 w - -'), 8)
+        self.assertEqual(self.mobility('7k/8/8/8/8/8/8/K6n w - -'), -2)
+        # The rook's ray stops at its own pawn, and the king doesn't count.
+        self.assertEqual(self.mobility('7k/8/8/8/8/8/P7/R3K3 w - -'), 3)
+        return None
+
+    def test_enemypawns(self):
+        # The pawn on b4 covers a3 and c3, leaving the knight only d2.
+        self.assertEqual(self.mobility('7k/8/8/8/1p6/8/8/1N5K w - -'), 1)
+        return None
+
+    def test_plainboard(self):
+        board = chessboard.ChessBoard()
+        board.setupfromfen('7k/8/8/8/3N4/8/8/K7 w - -')
+        self.assertEqual(self.evaluator.mobilityscore(board),
+                         8*self.evaluator.MOBILITYVALUE)
+        return None
+
+
+class TestLazyEvaluation(unittest.TestCase):
+    """Checks the evaluation only stops early far outside the window."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        self.board.setupfromfen(
+            'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -')
+        self.evaluator = engine.Evaluator(lazymargin=3000)
+        self.full = engine.Evaluator(lazymargin=None).evaluate(self.board)
+        self.cheap = (self.evaluator.materialscore(self.board)
+                      + self.evaluator.positionalscore(self.board))
+        return None
+
+    def test_nowindow(self):
+        self.assertEqual(self.evaluator.evaluate(self.board), self.full)
+        self.assertEqual(self.evaluator.skipped,
+                         {'pawnstructure': 0, 'mobility': 0})
+        self.assertEqual(self.evaluator.evaluations, 1)
+        return None
+
+    def test_insidewindow(self):
+        self.assertEqual(
+            self.evaluator.evaluate(self.board, self.full - 1, self.full + 1),
+            self.full)
+        self.assertEqual(self.evaluator.skipped['mobility'], 0)
+        return None
+
+    def test_outsidewindow(self):
+        # The score moved by the margin towards the window comes back.
+        self.assertEqual(self.evaluator.evaluate(
+            self.board, self.cheap + 3000, self.cheap + 4000), self.cheap + 3000)
+        self.assertEqual(self.evaluator.evaluate(
+            self.board, self.cheap - 4000, self.cheap - 3000), self.cheap - 3000)
+        self.assertEqual(self.evaluator.skipped,
+                         {'pawnstructure': 2, 'mobility': 2})
+        return None
+
+    def test_nearmargin(self):
+        # When the terms left are within the margin, a score from stopping
+        # early is a bound on the full evaluation, on the same side of the
+        # window.
+        fullevaluator = engine.Evaluator(lazymargin=None)
+        margin = engine.Evaluator.LAZYMARGIN
+        for name, fen, counts in perft.POSITIONS:
+            self.board.setupfromfen(fen)
+            full = fullevaluator.evaluate(self.board)
+            cheap = (self.evaluator.materialscore(self.board)
+                     + self.evaluator.positionalscore(self.board))
+            for offset in range(-margin - 500, margin + 501, 250):
+                for alpha, beta in ((cheap + offset, cheap + offset + 100),
+                                    (cheap + offset - 100, cheap + offset)):
+                    lazy = engine.Evaluator().evaluate(self.board, alpha, beta)
+                    if full <= alpha: self.assertTrue(full <= lazy <= alpha)
+                    elif full >= beta: self.assertTrue(full >= lazy >= beta)
+                    else: self.assertEqual(lazy, full)
+        return None
+
+    def test_nomargin(self):
+        evaluator = engine.Evaluator(lazymargin=None)
+        self.assertEqual(evaluator.evaluate(
+            self.board, self.cheap + 3000, self.cheap + 4000), self.full)
+        self.assertEqual(evaluator.skipped['mobility'], 0)
+        return None
+
+    def test_search(self):
+        # Black to move is a rook down, so many quiescence positions are far
+        # outside the window.
+        board = chessboard.BitBoard()
+        colour = board.setupfromfen('4k3/pppq1ppp/8/8/8/8/PPPQ1PPP/R3K2R b - -')
+        searcher = engine.ChessEngine(hashsize=1)
+        result = searcher.search(board, colour, 2)
+        self.assertIsNotNone(result.move)
+        self.assertGreater(searcher.evaluator.evaluations, 0)
+        self.assertGreater(searcher.evaluator.skipped['mobility'], 0)
+        return None
+
+    def test_sameresult(self):
+        # Stopping early doesn't change the move or score the search finds.
+        for name, fen, counts in perft.POSITIONS:
+            results = list()
+            for lazymargin in (None, engine.Evaluator.LAZYMARGIN):
+                board, colour = perft.setupposition(fen)
+                searcher = engine.ChessEngine(hashsize=1, lazymargin=lazymargin)
+                result = searcher.search(board, colour, 2)
+                results.append((result.move, result.score))
+            self.assertEqual(results[0], results[1], name)
+        return None
+
+
+class TestPawnHash(unittest.TestCase):
+    """Makes sure the pawn structure is cached and still scored the same."""
+
+    def setUp(self):
+        self.board = chessboard.BitBoard()
+        self.board.setupfromfen(
+            '4k3/1p3ppp/8/p2P4/8/2P5/5P1P/4K3 w - -')
+        self.evaluator = engine.Evaluator()
+        return None
+
+    def test_cached(self):
+        expected = self.evaluator.computepawnstructure(self.board)
+        self.assertEqual(self.evaluator.pawnentry(self.board), expected)
+        self.assertEqual(self.evaluator.pawnentry(self.board), expected)
+        self.assertEqual(self.evaluator.pawntable.hits, 1)
+        self.assertEqual(self.evaluator.pawntable.misses, 1)
+
+        # Moving the king doesn't change the pawns, so still hits.
+        self.board.makemove(moves.encode(4, 3))
+        self.evaluator.pawnstructurescore(self.board)
+        self.assertEqual(self.evaluator.pawntable.hits, 2)
+        return None
+
+    def test_plainboard(self):
+        board = chessboard.ChessBoard()
+        board.setupfromfen('4k3/1p3ppp/8/p2P4/8/2P5/5P1P/4K3 w - -')
+        self.assertEqual(self.evaluator.pawnentry(board),
+                         self.evaluator.computepawnstructure(self.board))
+        return None
+
+    def test_passedpawns(self):
+        score, passedpawns, pawnfiles = self.evaluator.pawnentry(self.board)
+        self.assertEqual(passedpawns, (1 << 35, 1 << 32))  # d5 and a5.
+        self.assertEqual(pawnfiles, (0b10101100, 0b11100011))
+        return None
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -6,9 +6,13 @@
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 import unittest
-from lib import core, chessboard, pieces, movegenerator
+from lib import core, chessboard, pieces, movegenerator, moves
 from tests.test_core import errormessage
 
+def startend(movelist):
+    """The (start, end) squares of each move, ignoring the flags."""
+    return [(moves.movestart(move), moves.moveend(move)) for move in movelist]
+
 class TestCoreMoveGenerator(unittest.TestCase):
     """Goes about testing the core methods of the move generator."""
 
@@ -101,6 +105,22 @@ class TestCoreMoveGenerator(unittest.TestCase):
         self.generator.board[1] = pieces.KingPiece('black')
         self.assertFalse(self.generator.kingincheck('black'))
 
+    def test_kingincheck_pawn(self):
+        self.generator.board[28] = pieces.KingPiece('black')
+        self.assertTrue(self.generator.kingincheck('black'))  # From d3 pawn.
+        self.generator.board[19] = None
+        self.generator.board[11] = pieces.PawnPiece('white')
+        self.assertFalse(self.generator.kingincheck('black'))
+        return None
+
+    def test_squareattacked(self):
+        self.assertTrue(self.generator.squareattacked(27, 'white'))  # Queen.
+        self.assertFalse(self.generator.squareattacked(20, 'white'))
+        self.assertTrue(self.generator.squareattacked(21, 'black'))  # Rook.
+        self.assertTrue(self.generator.squareattacked(25, 'black'))  # Knight.
+        self.assertFalse(self.generator.squareattacked(17, 'black'))
+        return None
+
 
 class BasicMoveTests(unittest.TestCase):
     """A testing suite for only basic moves."""
@@ -115,7 +135,7 @@ class BasicMoveTests(unittest.TestCase):
         self.generator = movegenerator.MoveGenerator(self.board)
 
     def test_basicmoves_white(self):
-        movelist = self.generator.basicmoves('white')
+        movelist = startend(self.generator.basicmoves('white'))
 
         # Make sure queen can't jump over white pawn.
         self.assertNotIn(
@@ -135,7 +155,7 @@ class BasicMoveTests(unittest.TestCase):
 
     def test_basicmoves_black(self):
         # XXX - This is the *exact* same method as for white. I forgot to change it.
-        movelist = self.generator.basicmoves('white')
+        movelist = startend(self.generator.basicmoves('white'))
 
         # Make sure queen can't jump over white pawn.
         self.assertNotIn(
@@ -154,7 +174,8 @@ class BasicMoveTests(unittest.TestCase):
             errormessage('Can move past black knight', 'Blocked by knight'))
 
     def test_basicmoves_defendingmoves(self):
-        movelist = self.generator.basicmoves('white', defendingmoves=True)
+        movelist = startend(
+            self.generator.basicmoves('white', defendingmoves=True))
 
         self.assertIn(
             (18, 19), movelist,
@@ -191,44 +212,54 @@ class AdvancedMoveTests(unittest.TestCase):
 
     def test_allpossiblemoves_white(self):
         movelist = self.generator.generatemovelist('white')
-        self.assertIn(((4, 2), (0, 3)), movelist)  # Make sure castling is an option.
-        self.assertIn((0, 56), movelist)  # Can the rook move normally?
-        self.assertNotIn((13, 21), movelist)  # Moving the pawn puts the king in check.
-        self.assertIn((10, 26), movelist)  # c-pawn can push.
-        self.assertNotIn((15, 31), movelist)  # h-pawn can't push...
-        self.assertIn((15, 23), movelist)  # ..but can move once.
+        pairs = startend(movelist)
+        # Make sure castling is an option.
+        self.assertIn(moves.encode(4, 2, moves.CASTLELEFT), movelist)
+        self.assertIn((0, 56), pairs)  # Can the rook move normally?
+        self.assertNotIn((13, 21), pairs)  # Moving the pawn puts the king in check.
+        self.assertIn((10, 26), pairs)  # c-pawn can push.
+        self.assertNotIn((15, 31), pairs)  # h-pawn can't push...
+        self.assertIn((15, 23), pairs)  # ..but can move once.
         return None
 
     def test_allpossiblemoves_black(self):
         movelist = self.generator.generatemovelist('black')
-        self.assertNotIn((60,52), movelist)  # King can't move into check.
-        self.assertIn((31, 13), movelist)  # Bishop can take pawn...
-        self.assertNotIn((31, 4), movelist)  # ...but can't take king.
-        self.assertIn((49, 33), movelist)  # Can pawn push.
+        pairs = startend(movelist)
+        self.assertNotIn((60, 52), pairs)  # King can't move into check.
+        self.assertIn((31, 13), pairs)  # Bishop can take pawn...
+        self.assertNotIn((31, 4), pairs)  # ...but can't take king.
+        self.assertIn((49, 33), pairs)  # Can pawn push.
+        return None
+
+    def test_generatemovelist_keepsboard(self):
+        original = self.board.duplicateboard()
+        self.generator.generatemovelist('white')
+        self.generator.generatemovelist('black')
+        self.assertEqual(self.generator.board, original)
         return None
 
     def test_cantcastleoutofcheck_white(self):
         self.generator.board[13] = None  # Remove the shielding pawn.
         movelist = self.generator.generatemovelist('white')
-        self.assertNotIn(((4, 2), (0, 3)), movelist)
+        self.assertNotIn(moves.encode(4, 2, moves.CASTLELEFT), movelist)
         return None
 
     def test_cantcastleoutofcheck_black(self):
         self.generator.board.move(55, 63)  # Put king in check.
         movelist = self.generator.generatemovelist('black')
-        self.assertNotIn(((60, 58), (56, 59)), movelist)
+        self.assertNotIn(moves.encode(60, 58, moves.CASTLELEFT), movelist)
         return None
 
     def test_cantcastlethroughcheck_white(self):
         self.generator.board.move(56, 59)
         movelist = self.generator.generatemovelist('white')
-        self.assertNotIn(((4, 2), (0, 3)), movelist)
+        self.assertNotIn(moves.encode(4, 2, moves.CASTLELEFT), movelist)
         return None
 
     def test_cantcastlethroughcheck_black(self):
         self.generator.board.move(55, 51)
         movelist = self.generator.generatemovelist('black')
-        self.assertNotIn(((60, 58), (56, 59)), movelist)
+        self.assertNotIn(moves.encode(60, 58, moves.CASTLELEFT), movelist)
         return None
 
 
@@ -256,22 +287,22 @@ class EnPassantMovesTest(unittest.TestCase):
         self.generator.board.move(53, 37)
         movelist = self.generator.generatemovelist('white')
 
-        self.assertIn((36, 45), movelist)
+        self.assertIn(moves.encode(36, 45, moves.ENPASSANT), movelist)
         return None
 
     def test_enpassantleft_white(self):
         self.generator.board.move(49, 33)
         movelist = self.generator.generatemovelist('white')
 
-        self.assertIn((34, 41), movelist)
+        self.assertIn(moves.encode(34, 41, moves.ENPASSANT), movelist)
         return None
 
     def test_enpassantboth_white(self):
         self.generator.board.move(51, 35)
         movelist = self.generator.generatemovelist('white')
 
-        self.assertIn((34, 43), movelist)
-        self.assertIn((36, 43), movelist)
+        self.assertIn(moves.encode(34, 43, moves.ENPASSANT), movelist)
+        self.assertIn(moves.encode(36, 43, moves.ENPASSANT), movelist)
         return None
 
 
@@ -297,31 +328,260 @@ class PawnMoveCaptureTests(unittest.TestCase):
 
     def test_blockedpawnpush(self):
         movelist = self.generator.generatemovelist('white')
+        pairs = startend(movelist)
 
         # Check b-pawn is completely blocked.
-        self.assertNotIn((9, 25), movelist)
-        self.assertNotIn((9, 17), movelist)
+        self.assertNotIn((9, 25), pairs)
+        self.assertNotIn((9, 17), pairs)
 
         # Check g-pawn is partially blocked.
-        self.assertIn((14, 22), movelist)
-        self.assertNotIn((14, 30), movelist)
+        self.assertIn((14, 22), pairs)
+        self.assertNotIn((14, 30), pairs)
         return None
 
     def test_cantcaptureforward(self):
         self.generator.board.move(14, 22)  # Put g-pawn behind rook.
         movelist = self.generator.generatemovelist('white')
+        pairs = startend(movelist)
 
-        self.assertNotIn((9, 17), movelist)  # Make sure b-pawn can't capture.
-        self.assertNotIn((14, 22), movelist)  # Make sure g-pawn can't capture
+        self.assertNotIn((9, 17), pairs)  # Make sure b-pawn can't capture.
+        self.assertNotIn((14, 22), pairs)  # Make sure g-pawn can't capture
         return None
 
     def test_capturediagonally(self):
         self.generator.board.move(13, 21)
         movelist = self.generator.generatemovelist('white')
+        pairs = startend(movelist)
+
+        self.assertIn((21, 30), pairs)
+        self.assertIn((8, 17), pairs)
+        self.assertIn((23, 30), pairs)
+        return None
+
+    def test_promotions(self):
+        self.generator.board[53] = pieces.PawnPiece('white')
+        self.generator.board[62] = pieces.KnightPiece('black')
+        movelist = self.generator.generatemovelist('white')
+        for promoteto in moves.PROMOTIONPIECES:
+            self.assertIn(moves.encode(
+                53, 61, moves.promotionflags(promoteto)), movelist)
+            self.assertIn(moves.encode(
+                53, 62, moves.promotionflags(promoteto, capture=True)), movelist)
+        self.assertNotIn((53, 61), [moves.decode(move)[:2] for move in movelist
+                                    if not moves.ispromotion(move)])
+        return None
+
+
+class LegalMoveTests(unittest.TestCase):
+    """Tests the pins, checks and evasions worked out by generatemovelist."""
+
+    def setupfen(self, fen):
+        board = chessboard.BitBoard()
+        colour = board.setupfromfen(fen)
+        self.generator = movegenerator.MoveGenerator(board)
+        return colour
+
+    def test_pinnedpieces(self):
+        self.setupfen('4r3/8/8/8/4N3/8/2B5/r2NK2q w - -')
+        pins = self.generator.pinnedpieces('white')
+        self.assertEqual(sorted(pins), [3, 28])  # Not the bishop on c2.
+        self.assertTrue(pins[28] & (1 << 60))  # Can take the pinning rook.
+        return None
+
+    def test_pinnedmovesalongpin(self):
+        self.setupfen('4r3/8/8/8/8/8/4R3/4K3 w - -')
+        movelist = self.generator.generatemovelist('white')
+        rookmoves = [moves.moveend(move) for move in movelist
+                     if moves.movestart(move) == 12]
+        self.assertEqual(sorted(rookmoves), [20, 28, 36, 44, 52, 60])
+        return None
+
+    def test_blockorcapture(self):
+        self.setupfen('4r2k/8/8/8/8/8/1B4N1/3QK3 w - -')
+        movelist = self.generator.generatemovelist('white')
+        nonking = [moves.decode(move)[:2] for move in movelist
+                   if moves.movestart(move) != 4]
+        self.assertEqual(sorted(nonking), [(3, 12), (9, 36), (14, 20)])
+        return None
+
+    def test_doublecheck(self):
+        self.setupfen('4r2k/8/8/8/8/5n2/8/R3K3 w Q -')
+        movelist = self.generator.generatemovelist('white')
+        self.assertTrue(movelist)
+        for move in movelist:
+            self.assertEqual(moves.movestart(move), 4)
+        return None
+
+    def test_kingcantretreatalongcheck(self):
+        self.setupfen('4r2k/8/8/8/8/8/4K3/8 w - -')
+        movelist = self.generator.generatemovelist('white')
+        self.assertNotIn(moves.encode(12, 4), movelist)
+        self.assertIn(moves.encode(12, 11), movelist)
+        return None
+
+    def test_enpassantdiscoveredcheck(self):
+        # Taking en passant would take both pawns off the rank of the king.
+        colour = self.setupfen('8/8/8/K2pP2r/8/8/8/7k w - d6')
+        movelist = self.generator.generatemovelist(colour)
+        self.assertNotIn(moves.encode(36, 43, moves.ENPASSANT), movelist)
+        self.assertIn(moves.encode(36, 44), movelist)
+        return None
+
+    def test_enpassantevasion(self):
+        # The pawn that just moved gives check and can be taken en passant.
+        colour = self.setupfen('8/8/8/2k5/3Pp3/8/8/4K3 b - d3')
+        movelist = self.generator.generatemovelist(colour)
+        self.assertIn(moves.encode(28, 19, moves.ENPASSANT), movelist)
+        self.assertNotIn(moves.encode(28, 20), movelist)
+        return None
+
+    def test_matchesmakeandtest(self):
+        # The old way of filtering the moves must agree with the new one.
+        colour = self.setupfen(
+            'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -')
+        pseudolegal = core.combinelists(
+            self.generator.basicmoves(colour),
+            self.generator.pawnpushmoves(colour),
+            self.generator.pawncapturemoves(colour),
+            self.generator.castlemoves(colour),
+            self.generator.enpassantmoves(colour))
+        self.assertEqual(
+            sorted(self.generator.onlylegalmoves(colour, pseudolegal)),
+            sorted(self.generator.generatemovelist(colour)))
+        return None
+
+
+class StagedMoveTests(unittest.TestCase):
+    """Tests the staged generation used by the search."""
+
+    KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -'
+
+    def setUp(self):
+        board = chessboard.BitBoard()
+        self.colour = board.setupfromfen(self.KIWIPETE)
+        self.generator = movegenerator.MoveGenerator(board)
+        return None
+
+    def test_capturesandquiets(self):
+        captures = self.generator.generatecaptures(self.colour)
+        quiets = self.generator.generatequiets(self.colour)
+        self.assertTrue(all(moves.istactical(move) for move in captures))
+        self.assertFalse(any(moves.istactical(move) for move in quiets))
+        self.assertEqual(sorted(captures + quiets),
+                         sorted(self.generator.generatemovelist(self.colour)))
+        return None
+
+    def test_islegal(self):
+        for move in self.generator.generatemovelist(self.colour):
+            self.assertTrue(self.generator.islegal(move, self.colour))
+        self.assertFalse(self.generator.islegal(moves.encode(12, 28), self.colour))
+        self.assertFalse(self.generator.islegal(moves.encode(0, 16), self.colour))
+        self.assertFalse(self.generator.islegal(moves.NOMOVE, self.colour))
+        return None
+
+    def test_mvvlva(self):
+        # Bishop takes bishop before pawn takes pawn before queen takes pawn.
+        bishoptakes = moves.encode(12, 40, moves.CAPTURE)
+        pawntakes = moves.encode(35, 44, moves.CAPTURE)
+        queentakes = moves.encode(21, 23, moves.CAPTURE)
+        self.assertGreater(self.generator.mvvlva(bishoptakes),
+                           self.generator.mvvlva(pawntakes))
+        self.assertGreater(self.generator.mvvlva(pawntakes),
+                           self.generator.mvvlva(queentakes))
+        return None
+
+    def test_stageorder(self):
+        hashmove = moves.encode(21, 22)
+        killer = moves.encode(0, 1)
+        staged = movegenerator.StagedMoveGenerator(
+            self.generator, self.colour, hashmove, (killer,))
+        ordered = list()
+        for move in staged:
+            ordered.append((staged.stage, move))
+        self.assertEqual(ordered[0], (staged.HASHMOVE, hashmove))
+        stages = [stage for stage, move in ordered]
+        self.assertEqual(stages, sorted(stages))
+        killers = [move for stage, move in ordered if stage == staged.KILLERS]
+        self.assertEqual(killers, [killer])
+        captures = [move for stage, move in ordered if stage == staged.CAPTURES]
+        scores = [self.generator.mvvlva(move) for move in captures]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        return None
+
+    def test_eachmoveonce(self):
+        staged = movegenerator.StagedMoveGenerator(
+            self.generator, self.colour, moves.encode(12, 40, moves.CAPTURE),
+            (moves.encode(21, 22), moves.encode(21, 22)))
+        self.assertEqual(sorted(staged),
+                         sorted(self.generator.generatemovelist(self.colour)))
+        return None
+
+    def test_skipsillegal(self):
+        # Neither move can be played here, so neither may be handed out.
+        hashmove = moves.encode(12, 28)
+        killer = moves.encode(4, 20)
+        staged = movegenerator.StagedMoveGenerator(
+            self.generator, self.colour, hashmove, (killer,))
+        movelist = list(staged)
+        self.assertNotIn(hashmove, movelist)
+        self.assertNotIn(killer, movelist)
+        self.assertEqual(len(movelist), 48)
+        return None
+
+
+class StaticExchangeTests(unittest.TestCase):
+    """Tests the static exchange evaluation of captures."""
+
+    def setupfen(self, fen):
+        board = chessboard.BitBoard()
+        colour = board.setupfromfen(fen)
+        self.generator = movegenerator.MoveGenerator(board)
+        return colour
+
+    def test_undefended(self):
+        self.setupfen('6k1/8/8/4p3/8/8/4R3/6K1 w - -')
+        self.assertEqual(
+            self.generator.see(moves.encode(12, 36, moves.CAPTURE)), 1000)
+        return None
+
+    def test_defended(self):
+        self.setupfen('4r1k1/8/8/4p3/8/8/4R3/6K1 w - -')
+        move = moves.encode(12, 36, moves.CAPTURE)
+        self.assertEqual(self.generator.see(move), 1000 - 5000)
+        self.assertTrue(self.generator.losingcapture(move))
+        return None
+
+    def test_xray(self):
+        # The rook behind the first joins in once it has captured.
+        self.setupfen('4r1k1/8/8/4p3/8/8/4R3/4R1K1 w - -')
+        move = moves.encode(12, 36, moves.CAPTURE)
+        self.assertEqual(self.generator.see(move), 1000)
+        self.assertFalse(self.generator.losingcapture(move))
+        return None
+
+    def test_leastvaluableattacker(self):
+        # Knight takes pawn, then the pieces trade down to the knight being lost.
+        self.setupfen(
+            '1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - -')
+        self.assertEqual(
+            self.generator.see(moves.encode(19, 36, moves.CAPTURE)), 1000 - 2500)
+        return None
+
+    def test_kingcantrecapture(self):
+        # The king can't take back a piece that is still defended.
+        self.setupfen('8/8/8/3k4/4p3/5N2/8/4RK2 w - -')
+        self.assertEqual(
+            self.generator.see(moves.encode(21, 28, moves.CAPTURE)), 1000)
+        return None
 
-        self.assertIn((21, 30), movelist)
-        self.assertIn((8, 17), movelist)
-        self.assertIn((23, 30), movelist)
+    def test_badcaptureslast(self):
+        colour = self.setupfen('4r1k1/8/8/4p3/8/8/4R3/6K1 w - -')
+        staged = movegenerator.StagedMoveGenerator(self.generator, colour)
+        ordered = [(staged.stage, move) for move in staged]
+        self.assertEqual(ordered[-1], (staged.BADCAPTURES,
+                                       moves.encode(12, 36, moves.CAPTURE)))
+        self.assertEqual(sorted(move for stage, move in ordered),
+                         sorted(self.generator.generatemovelist(colour)))
         return None
 
 
@@ -0,0 +1,82 @@
+# DESCRIPTION: Tests the integer encoding of moves.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from lib import core, moves, pieces
+
+class TestEncoding(unittest.TestCase):
+    """Checks moves are built and read back properly."""
+
+    def test_encodedecode(self):
+        move = moves.encode(12, 28, moves.DOUBLEPUSH)
+        self.assertEqual(moves.decode(move), (12, 28, moves.DOUBLEPUSH))
+        self.assertEqual(moves.movestart(move), 12)
+        self.assertEqual(moves.moveend(move), 28)
+        self.assertEqual(moves.moveflags(move), moves.DOUBLEPUSH)
+        self.assertLess(moves.encode(63, 63, 15), 1 << 16)
+        return None
+
+    def test_kinds(self):
+        quiet = moves.encode(6, 21)
+        capture = moves.encode(6, 21, moves.CAPTURE)
+        enpassant = moves.encode(36, 43, moves.ENPASSANT)
+        castle = moves.encode(4, 6, moves.CASTLERIGHT)
+        self.assertFalse(moves.iscapture(quiet))
+        self.assertTrue(moves.iscapture(capture))
+        self.assertTrue(moves.iscapture(enpassant))
+        self.assertTrue(moves.isenpassant(enpassant))
+        self.assertFalse(moves.iscapture(castle))
+        self.assertTrue(moves.iscastle(castle))
+        self.assertFalse(moves.iscastle(quiet))
+        self.assertTrue(moves.isdoublepush(moves.encode(12, 28, moves.DOUBLEPUSH)))
+        self.assertTrue(moves.istactical(capture))
+        self.assertTrue(moves.istactical(moves.encode(52, 60, moves.PROMOTION)))
+        self.assertFalse(moves.istactical(quiet))
+        self.assertFalse(moves.istactical(castle))
+        return None
+
+    def test_promotions(self):
+        for promoteto in moves.PROMOTIONPIECES:
+            move = moves.encode(52, 61, moves.promotionflags(promoteto, True))
+            self.assertTrue(moves.ispromotion(move))
+            self.assertTrue(moves.iscapture(move))
+            self.assertIs(moves.promotionpiece(move), promoteto)
+        self.assertIsNone(moves.promotionpiece(moves.encode(12, 20)))
+        with self.assertRaises(core.UnknownPieceError):
+            moves.promotionflags(pieces.KingPiece)
+        return None
+
+    def test_castlingrook(self):
+        self.assertEqual(
+            moves.castlingrook(moves.encode(4, 6, moves.CASTLERIGHT)), (7, 5))
+        self.assertEqual(
+            moves.castlingrook(moves.encode(60, 58, moves.CASTLELEFT)), (56, 59))
+        return None
+
+    def test_movename(self):
+        self.assertEqual(moves.movename(moves.encode(12, 28)), 'e2e4')
+        self.assertEqual(
+            moves.movename(moves.encode(4, 6, moves.CASTLERIGHT)), 'e1g1')
+        self.assertEqual(moves.movename(moves.encode(
+            52, 60, moves.promotionflags(pieces.KnightPiece))), 'e7e8n')
+        return None
+
+    def test_findmove(self):
+        movelist = [moves.encode(12, 20), moves.encode(12, 28, moves.DOUBLEPUSH)]
+        movelist += [moves.encode(52, 60, moves.promotionflags(piece))
+                     for piece in moves.PROMOTIONPIECES]
+        self.assertEqual(moves.findmove(movelist, 12, 28), movelist[1])
+        self.assertIsNone(moves.findmove(movelist, 12, 36))
+        self.assertEqual(
+            moves.promotionpiece(
+                moves.findmove(movelist, 52, 60, pieces.RookPiece)),
+            pieces.RookPiece)
+        return None
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,113 @@
+# DESCRIPTION: Tests the move ordering.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from lib import chessboard, engine, movegenerator, moves, ordering
+
+class TestMoveOrderer(unittest.TestCase):
+    """Checks the killers, history and statistics of the move orderer."""
+
+    def setUp(self):
+        self.orderer = ordering.MoveOrderer(maxply=10)
+        board = chessboard.BitBoard()
+        self.colour = board.setupfromfen(
+            'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -')
+        self.generator = movegenerator.MoveGenerator(board)
+        return None
+
+    def test_killers(self):
+        first, second, third = moves.encode(0, 1), moves.encode(0, 2), moves.encode(0, 3)
+        self.orderer.cutoff(first, 2, 3)
+        self.orderer.cutoff(second, 2, 3)
+        self.assertEqual(self.orderer.killers[2], [second, first])
+        self.orderer.cutoff(second, 2, 3)  # No duplicates.
+        self.assertEqual(self.orderer.killers[2], [second, first])
+        self.orderer.cutoff(third, 2, 3)
+        self.assertEqual(self.orderer.killers[2], [third, second])
+        self.assertEqual(self.orderer.killers[3], [None, None])
+        return None
+
+    def test_capturesnotkillers(self):
+        capture = moves.encode(12, 40, moves.CAPTURE)
+        self.orderer.cutoff(capture, 2, 3)
+        self.assertEqual(self.orderer.killers[2], [None, None])
+        self.assertEqual(self.orderer.history[capture & 4095], 0)
+        return None
+
+    def test_history(self):
+        move = moves.encode(21, 22)
+        self.orderer.cutoff(move, 5, 3)
+        self.orderer.cutoff(move, 6, 2)
+        self.assertEqual(self.orderer.history[(22 << 6) | 21], 9 + 4)
+        self.orderer.newsearch()
+        self.assertEqual(self.orderer.history[move & 4095], 6)
+        self.assertEqual(self.orderer.killers[5], [None, None])
+        return None
+
+    def test_historyaging(self):
+        move = moves.encode(21, 22)
+        self.orderer.history[move & 4095] = self.orderer.HISTORYMAX
+        self.orderer.history[7] = 100
+        self.orderer.cutoff(move, 1, 2)
+        self.assertEqual(self.orderer.history[move & 4095],
+                         (self.orderer.HISTORYMAX + 4) >> 1)
+        self.assertEqual(self.orderer.history[7], 50)
+        return None
+
+    def test_sortmoves(self):
+        hashmove = moves.encode(8, 16)
+        killer = moves.encode(0, 1)
+        historymove = moves.encode(21, 22)
+        self.orderer.cutoff(killer, 0, 1)
+        self.orderer.cutoff(historymove, 4, 1)
+        movelist = self.orderer.sortmoves(
+            self.generator, self.generator.generatemovelist(self.colour), 0,
+            hashmove)
+        self.assertEqual(movelist[0], hashmove)
+        captures = [move for move in movelist[1:] if moves.istactical(move)
+                    and not self.generator.losingcapture(move)]
+        self.assertEqual(movelist[1:len(captures) + 1], captures)
+        scores = [self.generator.mvvlva(move) for move in captures]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(movelist[len(captures) + 1], killer)
+        self.assertEqual(movelist[len(captures) + 2], historymove)
+        return None
+
+    def test_staged(self):
+        killer = moves.encode(0, 1)
+        historymove = moves.encode(21, 22)
+        self.orderer.cutoff(killer, 3, 1)
+        self.orderer.cutoff(historymove, 4, 1)
+        staged = self.orderer.staged(self.generator, self.colour, 3)
+        quiets = [move for move in staged if staged.stage >= staged.KILLERS]
+        self.assertEqual(quiets[:2], [killer, historymove])
+        return None
+
+    def test_statistics(self):
+        self.orderer.cutoff(moves.encode(0, 1), 1, 1, 1, 2)
+        self.orderer.cutoff(moves.encode(0, 2), 1, 1, 1, 1)
+        self.orderer.cutoff(moves.encode(0, 3), 1, 1, 4, 3)
+        self.assertAlmostEqual(self.orderer.firstcutoffrate(), 2.0/3)
+        statistics = self.orderer.statistics()
+        self.assertEqual(statistics['cutoffs'], 3)
+        self.assertAlmostEqual(statistics['averagecutoffmove'], 2.0)
+        self.assertEqual(statistics['stagecutoffs']['killers'], 1)
+        self.assertEqual(statistics['stagecutoffs']['quiets'], 1)
+        return None
+
+    def test_search(self):
+        chessengine = engine.ChessEngine(hashsize=1)
+        board = chessboard.BitBoard()
+        colour = board.setupfromfen(chessboard.STARTFEN)
+        chessengine.search(board, colour, 3)
+        self.assertGreater(chessengine.ordering.cutoffs, 0)
+        self.assertGreater(chessengine.ordering.firstcutoffrate(), 0.5)
+        return None
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
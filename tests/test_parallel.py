@@ -0,0 +1,201 @@
+# DESCRIPTION: Tests the parallel search.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import multiprocessing, os, unittest
+from lib import chessboard, engine, moves, parallel, pieces, transposition
+
+def _storeentry(table, key):
+    """Stores an entry from another process."""
+    table.store(key, 7, transposition.EXACT, 321, moves.encode(8, 16))
+    return None
+
+def _dyingworker(*arguments):
+    """A Lazy SMP process that dies without a word."""
+    os._exit(1)
+
+def _failinginit(self, **options):
+    """Stands in for ChessEngine.__init__, failing as the engine is made."""
+    raise ValueError("This engine can't be made.")
+
+
+class TestSharedTable(unittest.TestCase):
+    """Checks the shared table is one table across processes."""
+
+    def setUp(self):
+        self.table = transposition.SharedTranspositionTable(sizemb=1)
+        self.key = 0x123456789ABCDEF0
+        return None
+
+    def test_storeandprobe(self):
+        self.table.store(self.key, 3, transposition.LOWERBOUND, -50)
+        self.assertEqual(
+            self.table.probe(self.key), (3, transposition.LOWERBOUND, -50, None))
+        self.assertEqual(len(self.table), 1024*1024 // 16)
+        return None
+
+    def test_sharedbetweenprocesses(self):
+        process = multiprocessing.Process(
+            target=_storeentry, args=(self.table, self.key))
+        process.start()
+        process.join()
+        self.assertEqual(
+            self.table.probe(self.key),
+            (7, transposition.EXACT, 321, moves.encode(8, 16)))
+        return None
+
+    def test_tornentry(self):
+        # The data of one store with the key word of another isn't a match.
+        other = self.key + self.table.buckets
+        self.table.store(self.key, 3, transposition.EXACT, 10)
+        slot = (self.key % self.table.buckets) * self.table.BUCKETSIZE
+        keyword = self.table._keys[slot]
+        self.table.store(self.key, 4, transposition.EXACT, 20)
+        self.table._keys[slot] = keyword
+        self.assertIsNone(self.table.probe(self.key))
+        self.assertIsNone(self.table.probe(other))
+        return None
+
+
+class TestParallelEngine(unittest.TestCase):
+    """Checks the Lazy SMP search finds the same moves as a single search."""
+
+    def setUp(self):
+        self.board = chessboard.ChessBoard()
+        self.board[4] = pieces.KingPiece('white')
+        self.board[62] = pieces.KingPiece('black')
+        self.board[53] = pieces.PawnPiece('black')
+        self.board[54] = pieces.PawnPiece('black')
+        self.board[55] = pieces.PawnPiece('black')
+        return None
+
+    def test_capturesqueen(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        searcher = parallel.ParallelEngine(processes=2, hashsize=1)
+        result = searcher.search(self.board, 'black', 2)
+        self.assertEqual(result.move, moves.encode(20, 35, moves.CAPTURE))
+        self.assertGreaterEqual(result.depth, 2)
+        self.assertEqual(len(searcher.resultdepths), 2)
+        self.assertEqual(result.nodes, searcher.nodes)
+        self.assertGreater(searcher.nodes, 0)
+        return None
+
+    def test_matein1(self):
+        self.board[0] = pieces.RookPiece('white')
+        result = parallel.ParallelEngine(processes=3, hashsize=1).search(
+            self.board, 'white', 2)
+        self.assertEqual(result.move, moves.encode(0, 56))
+        self.assertEqual(result.score, engine.ChessEngine.MATESCORE - 1)
+        return None
+
+    def test_tables(self):
+        # Only the table the search uses is made at full size.
+        searcher = parallel.ParallelEngine(processes=2, hashsize=1)
+        self.assertIsInstance(searcher.transpositiontable,
+                              transposition.SharedTranspositionTable)
+        self.assertEqual(len(searcher.transpositiontable), 1024*1024 // 16)
+        searcher = parallel.ParallelEngine(
+            processes=2, hashsize=1, rootsplit=True)
+        self.assertNotIsInstance(searcher.transpositiontable,
+                                 transposition.SharedTranspositionTable)
+        self.assertLess(len(searcher.transpositiontable), 1024)
+        return None
+
+    def test_rootsplit(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        expected = engine.ChessEngine(hashsize=1).search(self.board, 'black', 3)
+        searcher = parallel.ParallelEngine(
+            processes=2, hashsize=1, rootsplit=True)
+        result = searcher.search(self.board, 'black', 3)
+        self.assertEqual(result.move, expected.move)
+        self.assertEqual(result.score, expected.score)
+        self.assertEqual(result.depth, 3)
+        self.assertEqual(result.pv[0], result.move)
+        self.assertGreater(result.nodes, 0)
+        return None
+
+    def test_rootsplit_mate(self):
+        self.board[0] = pieces.RookPiece('white')
+        searcher = parallel.ParallelEngine(
+            processes=2, hashsize=1, rootsplit=True)
+        result = searcher.search(self.board, 'white', 3)
+        self.assertEqual(result.move, moves.encode(0, 56))
+        self.assertEqual(result.score, engine.ChessEngine.MATESCORE - 1)
+        self.board.move(0, 56)  # Now black is checkmated.
+        result = searcher.search(self.board, 'black', 2)
+        self.assertIsNone(result.move)
+        self.assertEqual(result.score, -engine.ChessEngine.MATESCORE)
+        return None
+
+    def test_searchsubtree(self):
+        self.board[20] = pieces.KnightPiece('black')
+        self.board[35] = pieces.QueenPiece('white')
+        sharedalpha = multiprocessing.Value('l', -engine.ChessEngine.INFINITY)
+        parallel._rootsplitinit({}, 1, sharedalpha)
+        capture = moves.encode(20, 35, moves.CAPTURE)
+        best, alpha = parallel._searchsubtree((self.board, 'black', capture, 2))
+        self.assertEqual(alpha, -engine.ChessEngine.INFINITY)
+        self.assertEqual(sharedalpha.value, best.score)
+
+        # A worse move is searched against the best score and fails low, so
+        # its score is no more than the alpha it is returned with.
+        result, alpha = parallel._searchsubtree(
+            (self.board, 'black', moves.encode(62, 63), 2))
+        self.assertEqual(alpha, best.score)
+        self.assertLessEqual(result.score, alpha)
+        self.assertEqual(sharedalpha.value, best.score)
+        return None
+
+    def test_rootsplit_fixeddepth(self):
+        searcher = parallel.ParallelEngine(processes=2, rootsplit=True)
+        with self.assertRaises(ValueError):
+            searcher.search(
+                self.board, 'white', timemanager=engine.TimeManager(movetime=1))
+        return None
+
+    def test_workerfails(self):
+        # The workers can't make their engines, but still say they are done,
+        # so the search falls back on a single ply rather than waiting.
+        searcher = parallel.ParallelEngine(processes=2, hashsize=1)
+        init = engine.ChessEngine.__init__
+        engine.ChessEngine.__init__ = _failinginit
+        try:
+            result = searcher.search(self.board, 'white', 2)
+        finally:
+            engine.ChessEngine.__init__ = init
+        self.assertEqual(searcher.resultdepths, [0, 0])
+        self.assertIsNotNone(result.move)
+        return None
+
+    def test_workerdies(self):
+        searcher = parallel.ParallelEngine(processes=2, hashsize=1)
+        worker = parallel._lazysmpworker
+        parallel._lazysmpworker = _dyingworker
+        try:
+            result = searcher.search(self.board, 'white', 2)
+        finally:
+            parallel._lazysmpworker = worker
+        self.assertEqual(searcher.resultdepths, [0, 0])
+        self.assertIsNotNone(result.move)
+        return None
+
+    def test_badprocesses(self):
+        with self.assertRaises(ValueError):
+            parallel.ParallelEngine(processes=0)
+        return None
+
+    def test_badhashsize(self):
+        for rootsplit in (False, True):
+            with self.assertRaises(ValueError):
+                parallel.ParallelEngine(
+                    processes=2, hashsize=0, rootsplit=rootsplit)
+        return None
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
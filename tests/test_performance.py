@@ -5,7 +5,7 @@
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 import time, unittest
-from lib import chessboard, core, engine, movegenerator, pieces, usercontrol
+from lib import chessboard, core, engine, movegenerator, moves, pieces, usercontrol
 
 class Timer(object):
     def __init__(self, verbose=False):
@@ -80,7 +80,7 @@ class TestMoveGenerator(unittest.TestCase):
     def test_illegalmove(self):
         with Timer() as t:
             for x in xrange(self.numberofloops):
-                self.generator.illegalmove((27, 36), 'white')
+                self.generator.illegalmove(moves.encode(27, 36), 'white')
         print '\n\t=> elapsed time for %i loops: %s s' % (self.numberofloops, t.secs)
         return None
 
@@ -0,0 +1,84 @@
+# DESCRIPTION: Tests the move generator against the known perft counts.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from StringIO import StringIO
+from lib import chessboard, core, moves, perft
+
+class TestPerft(unittest.TestCase):
+    """Checks the counts of the reference positions at shallow depths."""
+
+    def checkcounts(self, name, depth):
+        fen, counts = [(fen, counts) for positionname, fen, counts
+                       in perft.POSITIONS if positionname == name][0]
+        board, colour = perft.setupposition(fen)
+        for ply in range(1, depth + 1):
+            self.assertEqual(
+                perft.perft(board, ply, colour), counts[ply - 1],
+                "%s at depth %i" % (name, ply))
+        return None
+
+    def test_startpos(self):
+        self.checkcounts('startpos', 3)
+        return None
+
+    def test_kiwipete(self):
+        self.checkcounts('kiwipete', 3)
+        return None
+
+    def test_position3(self):
+        self.checkcounts('position3', 4)
+        return None
+
+    def test_position4(self):
+        self.checkcounts('position4', 3)
+        return None
+
+    def test_position5(self):
+        self.checkcounts('position5', 2)
+        return None
+
+    def test_position6(self):
+        self.checkcounts('position6', 2)
+        return None
+
+    def test_depthzero(self):
+        board, colour = perft.setupposition(chessboard.STARTFEN)
+        self.assertEqual(perft.perft(board, 0, colour), 1)
+        return None
+
+    def test_keepsboard(self):
+        board, colour = perft.setupposition(perft.POSITIONS[1][1])
+        before = board.duplicateboard()
+        perft.perft(board, 2, colour)
+        self.assertEqual(board, before)
+        self.assertEqual(board.key, before.key)
+        self.assertEqual(board.castlingrights, before.castlingrights)
+        return None
+
+
+class TestDivide(unittest.TestCase):
+    """Checks the per move counts add up."""
+
+    def test_divide(self):
+        board, colour = perft.setupposition(chessboard.STARTFEN)
+        results = perft.divide(board, 2, colour)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(sum(nodes for move, nodes in results), 400)
+        self.assertIn((moves.encode(12, 28, moves.DOUBLEPUSH), 20), results)
+        return None
+
+    def test_runsuite(self):
+        output = StringIO()
+        passed = perft.runsuite(2, perft.POSITIONS[:1], output)
+        self.assertTrue(passed)
+        self.assertEqual(len(output.getvalue().splitlines()), 2)
+        return None
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
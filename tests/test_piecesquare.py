@@ -0,0 +1,66 @@
+# DESCRIPTION: Tests the piece-square tables and how they are read.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from lib import core, pieces, piecesquare
+
+class TestTables(unittest.TestCase):
+    """Tests reading and using the tables."""
+
+    def tablelines(self, skip=None):
+        """The lines of a full tables file, leaving out the table skip."""
+        lines = ['# A comment.']
+        for name in ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king'):
+            for stage in (piecesquare.MIDDLEGAME, piecesquare.ENDGAME):
+                if (name, stage) == skip:
+                    continue
+                lines.append('%s %s' % (name, stage))
+                lines.extend([' '.join(['10'] * 8)] * 8)
+        return lines
+
+    def test_defaulttables(self):
+        self.assertEqual(len(piecesquare.TABLES), 12)
+        for table in piecesquare.TABLES.values():
+            self.assertEqual(len(table), 64)
+        return None
+
+    def test_readtables(self):
+        tables = piecesquare.readtables(self.tablelines())
+        self.assertEqual(
+            tables[pieces.RookPiece, piecesquare.ENDGAME], (10,) * 64)
+        return None
+
+    def test_missingtable(self):
+        with self.assertRaises(ValueError):
+            piecesquare.readtables(self.tablelines(skip=('queen', 'endgame')))
+        return None
+
+    def test_badheading(self):
+        with self.assertRaises(ValueError):
+            piecesquare.readtables(['knight opening'] + self.tablelines())
+        with self.assertRaises(ValueError):
+            piecesquare.readtables(['1 2 3'] + self.tablelines())
+        return None
+
+    def test_squarevalues(self):
+        table = tuple(range(64))  # Rank 8 first, as in the file.
+        white = piecesquare.squarevalues(table, core.COLOURS[0])
+        black = piecesquare.squarevalues(table, core.COLOURS[1])
+        self.assertEqual(white[0], 56)  # a1 is the first square of the last row.
+        self.assertEqual(black[0], 0)  # Upside down for black: a1 reads a8.
+        self.assertEqual(white[63], 7)
+        return None
+
+    def test_taper(self):
+        self.assertEqual(piecesquare.taper(100, -100, piecesquare.MAXPHASE), 100)
+        self.assertEqual(piecesquare.taper(100, -100, 0), -100)
+        self.assertEqual(piecesquare.taper(100, -100, piecesquare.MAXPHASE // 2), 0)
+        self.assertEqual(piecesquare.taper(100, -100, 40), 100)
+        return None
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,136 @@
+# DESCRIPTION: Tests the transposition table.
+
+# 4920646f6e5c2774206361726520696620697420776f726b73206f6e20796f7572206d61636869
+# 6e652120576520617265206e6f74207368697070696e6720796f7572206d616368696e6521
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from lib import moves, transposition
+
+class TestTranspositionTable(unittest.TestCase):
+    """Checks that entries are stored, found and replaced properly."""
+
+    def setUp(self):
+        self.table = transposition.TranspositionTable(sizemb=1)
+        self.key = 0x123456789ABCDEF0
+        return None
+
+    def othersinbucket(self, number):
+        """Keys that fall into the same bucket as self.key."""
+        return [self.key + self.table.buckets*(ii+1) for ii in range(number)]
+
+    def test_size(self):
+        self.assertEqual(len(self.table), 1024*1024 // 16)
+        self.table.resize(2)
+        self.assertEqual(len(self.table), 2*1024*1024 // 16)
+        with self.assertRaises(ValueError):
+            self.table.resize(0)
+        return None
+
+    def test_storeandprobe(self):
+        move = moves.encode(12, 28, moves.DOUBLEPUSH)
+        self.table.store(self.key, 5, transposition.LOWERBOUND, -1234, move)
+        self.assertEqual(
+            self.table.probe(self.key),
+            (5, transposition.LOWERBOUND, -1234, move))
+        return None
+
+    def test_promotioncapture(self):
+        promotion = moves.encode(
+            52, 61, moves.promotionflags(moves.PROMOTIONPIECES[0], capture=True))
+        self.table.store(self.key, 1, transposition.EXACT, 0, promotion)
+        self.assertEqual(self.table.probe(self.key)[3], promotion)
+        self.table.store(self.key, 2, transposition.EXACT, 0)
+        self.assertEqual(self.table.probe(self.key)[3], promotion)
+        return None
+
+    def test_counters(self):
+        self.assertIsNone(self.table.probe(self.key))
+        self.table.store(self.key, 1, transposition.EXACT, 10)
+        self.assertIsNone(self.table.probe(self.key)[3])  # No move stored.
+        self.table.probe(self.key)
+        self.assertEqual((self.table.hits, self.table.misses), (2, 1))
+        self.assertAlmostEqual(self.table.hitrate(), 2.0/3)
+        self.table.clear()
+        self.assertEqual((self.table.hits, self.table.misses), (0, 0))
+        self.assertIsNone(self.table.probe(self.key))
+        return None
+
+    def test_depthpreferred(self):
+        shallow, other = self.othersinbucket(2)
+        self.table.store(self.key, 8, transposition.EXACT, 1)
+        self.table.store(shallow, 2, transposition.EXACT, 2)
+        self.table.store(other, 3, transposition.EXACT, 3)
+
+        # The deep entry survives while the always-replace one is overwritten.
+        self.assertEqual(self.table.probe(self.key)[0], 8)
+        self.assertIsNone(self.table.probe(shallow))
+        self.assertEqual(self.table.probe(other)[2], 3)
+
+        # A deeper search takes over the depth-preferred entry.
+        self.table.store(shallow, 9, transposition.EXACT, 4)
+        self.assertEqual(self.table.probe(shallow)[0], 9)
+        return None
+
+    def test_newsearch(self):
+        shallow = self.othersinbucket(1)[0]
+        self.table.store(self.key, 8, transposition.EXACT, 1)
+        self.table.newsearch()
+        self.table.store(shallow, 1, transposition.EXACT, 2)
+        self.assertEqual(self.table.probe(shallow)[0], 1)
+        return None
+
+    def test_keepsbestmove(self):
+        move = moves.encode(8, 16)
+        self.table.store(self.key, 3, transposition.LOWERBOUND, 50, move)
+        self.table.store(self.key, 4, transposition.UPPERBOUND, 20)
+        self.assertEqual(
+            self.table.probe(self.key),
+            (4, transposition.UPPERBOUND, 20, move))
+        return None
+
+
+class TestPawnHashTable(unittest.TestCase):
+    """Checks that pawn structures are stored and found properly."""
+
+    def setUp(self):
+        self.table = transposition.PawnHashTable(sizemb=1)
+        self.key = 0x123456789ABCDEF0
+        return None
+
+    def test_size(self):
+        self.assertEqual(len(self.table), 1024*1024 // 32)
+        with self.assertRaises(ValueError):
+            self.table.resize(0)
+        return None
+
+    def test_storeandprobe(self):
+        self.assertIsNone(self.table.probe(self.key))
+        passed = (1 << 52, (1 << 8) | (1 << 15))
+        self.table.store(self.key, -475, passed, (0x81, 0x10))
+        self.assertEqual(self.table.probe(self.key), (-475, passed, (0x81, 0x10)))
+        self.assertEqual((self.table.hits, self.table.misses), (1, 1))
+        self.assertEqual(self.table.hitrate(), 0.5)
+        return None
+
+    def test_nopawns(self):
+        # A board without pawns has a pawn key of 0, as does an empty entry.
+        self.assertIsNone(self.table.probe(0))
+        self.table.store(0, 0, (0, 0), (0, 0))
+        self.assertEqual(self.table.probe(0), (0, (0, 0), (0, 0)))
+        return None
+
+    def test_replace(self):
+        other = self.key + len(self.table)
+        self.table.store(self.key, 1, (0, 0), (0, 0))
+        self.table.store(other, 2, (0, 0), (0, 0))
+        self.assertIsNone(self.table.probe(self.key))
+        self.assertEqual(self.table.probe(other)[0], 2)
+        self.table.clear()
+        self.assertIsNone(self.table.probe(other))
+        self.assertEqual(self.table.stores, 0)
+        return None
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -8,7 +8,7 @@
 # TODO: Finsih off these tests.
 
 import unittest
-from lib import core, chessboard, pieces, usercontrol
+from lib import core, chessboard, moves, pieces, usercontrol
 from tests.test_core import errormessage
 
 class BasicUICalls(unittest.TestCase):
@@ -161,6 +161,14 @@ class BasicUICalls(unittest.TestCase):
         )
         return None
 
+    def test_addmovetohistory_castlemove(self):
+        self.ui.addmovetohistory(
+            castlemove=moves.encode(4, 6, moves.CASTLERIGHT))
+        self.ui.addmovetohistory(
+            castlemove=moves.encode(60, 58, moves.CASTLELEFT))
+        self.assertEqual(self.ui.history, ['0-0', '0-0-0'])
+        return None
+
     def test_addmovetohistory_promotionto(self):
         movestring = 'Pa7>a8=Q'
         self.ui.addmovetohistory('P', 48, 56, promotionto='Q')